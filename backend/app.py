@@ -1,9 +1,25 @@
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 from routes.game import game_bp
 from routes.story import story_bp
 from routes.narrate import narrate_bp
+from routes.images import images_bp
+from routes.metrics import metrics_bp
 from database.db_manager import init_database
+from models.session_cache import session_cache
+from services.http_client import http_client
+from services.image_jobs import image_jobs
+from services.image_service import image_service
+from services.llm_cache import llm_cache
+from services.metrics import REQUEST_SECONDS, REQUESTS
+from services.opening_tree import opening_tree
+from services.rate_limiter import perplexity_limiter
+from services.resilience import perplexity_resilience
+from services.speculation import branch_speculator
+from services.singleflight import singleflight_stats
+from services.session_locks import session_locks
+from services.tracing import begin_trace, finish_trace, tracing_stats
 from config import DEBUG, SECRET_KEY
 
 app = Flask(__name__)
@@ -14,6 +30,41 @@ CORS(app)
 app.register_blueprint(game_bp, url_prefix='/api/game')
 app.register_blueprint(story_bp, url_prefix='/api/story')
 app.register_blueprint(narrate_bp, url_prefix='/api')
+app.register_blueprint(images_bp, url_prefix='/api')
+app.register_blueprint(metrics_bp, url_prefix='/api')
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.trace = begin_trace(
+        'http', trace_id=request.headers.get('X-Request-ID'), method=request.method, path=request.path
+    )
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the route's latency; streamed responses are timed to their first byte."""
+    # The URL rule (not the path) keeps session ids out of the labels
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route)
+        REQUESTS.inc(request.method, route, str(response.status_code))
+    trace = g.get('trace')
+    if trace is not None:
+        trace.set(route=route, status=response.status_code)
+        response.headers['X-Trace-Id'] = trace.trace.trace_id
+    return response
+
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    """Close the request's trace, logging it if the request was slow."""
+    if error is not None:
+        finish_trace(g.get('trace'), error=type(error).__name__)
+    else:
+        finish_trace(g.get('trace'))
 
 
 @app.route('/')
@@ -26,6 +77,8 @@ def index():
             'game': '/api/game/*',
             'story': '/api/story/*',
             'narrate': '/api/narrate',
+            'images': '/api/images/*',
+            'metrics': '/api/metrics',
             'personality': '/api/game/personality/*'
         }
     })
@@ -36,7 +89,19 @@ def health_check():
     """Health check endpoint."""
     return jsonify({
         'status': 'healthy',
-        'message': 'Interactive Story Game API is running'
+        'message': 'Interactive Story Game API is running',
+        'session_cache': session_cache.stats(),
+        'upstreams': http_client.stats(),
+        'image_jobs': image_jobs.stats(),
+        'image_cache': image_service.stats(),
+        'llm_cache': llm_cache.stats(),
+        'rate_limit': perplexity_limiter.stats(),
+        'resilience': perplexity_resilience.stats(),
+        'speculation': branch_speculator.stats(),
+        'opening_tree': opening_tree.stats(),
+        'singleflight': singleflight_stats(),
+        'session_locks': session_locks.stats(),
+        'tracing': tracing_stats()
     })
 
 
@@ -86,14 +151,19 @@ if __name__ == '__main__':
     print("API endpoints:")
     print("  - POST /api/game/start - Start new game")
     print("  - POST /api/game/choice - Make a choice")
+    print("  - POST /api/game/choice/stream - Make a choice, streaming the story (SSE)")
+    print("  - GET /api/game/image/<job_id> - Get a background scene image job")
+    print("  - GET /api/images/<filename> - Get a cached scene image")
     print("  - GET /api/game/state/<session_id> - Get game state")
     print("  - POST /api/game/save - Save game")
     print("  - POST /api/game/load/<save_id> - Load game")
+    print("  - POST /api/game/fork - Fork a session into a new one after a given turn")
     print("  - GET /api/game/saves - List saved games")
     print("  - GET /api/game/personality/<session_id> - Get cached personality profile")
     print("  - POST /api/game/personality/<session_id>/analyze - Generate personality profile")
     print("  - POST /api/story/generate - Generate story")
     print("  - POST /api/narrate - Generate narration audio")
     print("  - GET /api/health - Health check")
+    print("  - GET /api/metrics - Prometheus metrics")
     
     app.run(debug=DEBUG, host='0.0.0.0', port=5000)
@@ -0,0 +1,397 @@
+"""Async (aiohttp) execution mode for the Interactive Story Game API.
+
+    python async_app.py --port 5000
+
+The turn endpoints run natively on the event loop: `/api/game/start`,
+`/api/game/choice`, `/api/story/generate` and `/api/narrate`. Upstream calls
+go through the shared aiohttp client, and blocking work (SQLite through the
+connection pool, cache files) runs on a bounded thread pool, so a turn that
+is waiting on Perplexity or Cloudflare does not hold a thread and one
+process can keep hundreds of turns in flight.
+
+Every other route is served by the Flask app through a WSGI bridge on the
+same thread pool, so both modes expose the same API.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from app import app as flask_app
+from config import ASYNC_BLOCKING_WORKERS, DEBUG
+from database.db_manager import init_database, DEFAULT_OPENING_IMAGE_PROMPT
+from models.game_state import GameState
+from routes.game import (
+    _idempotency_key,
+    _load_choice_state,
+    _parse_choice_request,
+    _prepared_turn,
+    _record_turn,
+    _remember_choice,
+    _session_busy,
+    _stored_choice,
+)
+from services.ai_service import ai_service
+from services.async_http_client import async_http_client
+from services.deepgram_tts_service import deepgram_tts_synth
+from services.image_jobs import image_jobs
+from services.image_service import image_service
+from services.metrics import REQUEST_SECONDS, REQUESTS
+from services.session_locks import session_locks, SessionBusyError
+from services.singleflight import request_fingerprint
+from services.speculation import branch_speculator
+from services.tracing import begin_trace, finish_trace
+
+
+async def _blocking(fn, *args, **kwargs):
+    """Run a blocking call on the thread pool, inside the caller's trace."""
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+async def _read_json(request: web.Request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def _json(payload: dict, status: int = 200, headers: dict = None) -> web.Response:
+    return web.json_response(payload, status=status, headers=headers)
+
+
+async def start_game(request: web.Request) -> web.Response:
+    """Start a new game session with optional custom story."""
+    try:
+        data = await _read_json(request) or {}
+        character_name = data.get('character_name', 'Player')
+        initial_story = data.get('initial_story', '').strip()
+
+        game_state = GameState()
+        game_state.character_info['name'] = character_name
+
+        custom_choices = None
+        custom_image_prompt = None
+        if initial_story:
+            custom_choices, custom_image_prompt = await ai_service.generate_choices_for_story_async(
+                initial_story, game_state.character_info
+            )
+
+        # The starting image does not depend on the save, so run both at once
+        success, starting_image_url = await asyncio.gather(
+            _blocking(
+                game_state.save_to_database,
+                initial_story=initial_story if initial_story else None,
+                initial_choices=custom_choices,
+            ),
+            image_service.generate_image_url_async(custom_image_prompt or DEFAULT_OPENING_IMAGE_PROMPT),
+        )
+
+        if not success:
+            return _json({
+                'success': False,
+                'error': 'Failed to create game session'
+            }, 500)
+
+        await _blocking(branch_speculator.speculate, game_state)
+        return _json({
+            'success': True,
+            'session_id': game_state.session_id,
+            'current_story': game_state.current_story,
+            'choices': game_state.current_choices,
+            'character_info': game_state.character_info,
+            'image_url': starting_image_url
+        })
+
+    except Exception as e:
+        return _json({
+            'success': False,
+            'error': f'Error starting game: {str(e)}'
+        }, 500)
+
+
+async def make_choice(request: web.Request) -> web.Response:
+    """Process a player's choice; same locking and idempotency as the sync route."""
+    session_id = None
+    try:
+        session_id, choice_index, error = _parse_choice_request(await _read_json(request))
+        if error:
+            return _json(*error)
+        idempotency_key = _idempotency_key(request.headers)
+        request_hash = request_fingerprint('choice', session_id, choice_index)
+        replayed_headers = {'Idempotent-Replayed': 'true'}
+
+        stored, error = await _blocking(_stored_choice, idempotency_key, session_id, request_hash)
+        if error:
+            return _json(*error)
+        if stored:
+            return _json(stored, headers=replayed_headers)
+
+        async with session_locks.hold_async(session_id):
+            stored, error = await _blocking(_stored_choice, idempotency_key, session_id, request_hash)
+            if error:
+                return _json(*error)
+            if stored:
+                return _json(stored, headers=replayed_headers)
+
+            game_state, selected_choice, error = await _blocking(_load_choice_state, session_id, choice_index)
+            if error:
+                return _json(*error)
+
+            # A speculated branch may still be generating, so wait for it off the loop
+            prepared = await _blocking(_prepared_turn, game_state, selected_choice)
+            if prepared:
+                new_story, new_choices = prepared['story'], prepared['choices']
+                image_prompt, image_url = prepared['image_prompt'], prepared['image_url']
+            else:
+                new_story, new_choices, image_prompt = await ai_service.generate_story_continuation_async(
+                    game_state.get_recent_context(), selected_choice, game_state.character_info
+                )
+                image_url = None
+
+            if not await _blocking(_record_turn, game_state, selected_choice, new_story, new_choices):
+                return _json({
+                    'success': False,
+                    'error': 'Failed to save game state'
+                }, 500)
+
+            await _blocking(branch_speculator.speculate, game_state)
+            image_job_id = None if image_url else image_jobs.submit(image_prompt)
+            payload = {
+                'success': True,
+                'story': new_story,
+                'choices': new_choices,
+                'character_info': game_state.character_info,
+                'session_id': session_id,
+                'image_url': image_url,
+                'image_job_id': image_job_id
+            }
+            await _blocking(_remember_choice, idempotency_key, session_id, request_hash, payload)
+            return _json(payload)
+
+    except SessionBusyError:
+        return _json(*_session_busy(session_id))
+
+    except Exception as e:
+        return _json({
+            'success': False,
+            'error': f'Error processing choice: {str(e)}'
+        }, 500)
+
+
+async def generate_story(request: web.Request) -> web.Response:
+    """Generate a story continuation based on provided context and choice."""
+    try:
+        data = await _read_json(request)
+        if not data:
+            return _json({
+                'success': False,
+                'error': 'No data provided'
+            }, 400)
+
+        context = data.get('context', '')
+        player_choice = data.get('choice', '')
+        character_info = data.get('character_info', {})
+        # Set "use_cache": false to force a fresh generation
+        use_cache = data.get('use_cache', True) is not False
+
+        if not context or not player_choice:
+            return _json({
+                'success': False,
+                'error': 'context and choice are required'
+            }, 400)
+
+        story, choices, image_prompt = await ai_service.generate_story_continuation_async(
+            context, player_choice, character_info, use_cache=use_cache
+        )
+        image_url = await image_service.generate_image_url_async(image_prompt)
+
+        return _json({
+            'success': True,
+            'story': story,
+            'choices': choices,
+            'image_url': image_url
+        })
+
+    except Exception as e:
+        return _json({
+            'success': False,
+            'error': f'Error generating story: {str(e)}'
+        }, 500)
+
+
+async def narrate(request: web.Request) -> web.StreamResponse:
+    """Generate narration audio for provided story text using Deepgram Aura-2."""
+    try:
+        data = await _read_json(request) or {}
+
+        text = (data.get('text') or '').strip()
+        if not text:
+            return _json({
+                'success': False,
+                'error': 'text is required'
+            }, 400)
+
+        audio_path, mime = await deepgram_tts_synth.synthesize_async(text=text)
+        return web.FileResponse(audio_path, headers={
+            'Content-Type': mime,
+            'Cache-Control': 'public, max-age=3600',
+        })
+
+    except Exception as e:
+        return _json({
+            'success': False,
+            'error': f'TTS synthesis failed: {str(e)}'
+        }, 500)
+
+
+def _run_wsgi(environ: dict, loop: asyncio.AbstractEventLoop, started: asyncio.Future, body: asyncio.Queue) -> None:
+    """Run the Flask app for one request on a worker thread.
+
+    The whole response is produced on this one thread (Flask's streamed
+    responses keep their request context on it) and handed to the event
+    loop chunk by chunk.
+    """
+    try:
+        app_iter, status, headers = run_wsgi_app(flask_app, environ)
+    except BaseException as e:
+        loop.call_soon_threadsafe(started.set_exception, e)
+        return
+    loop.call_soon_threadsafe(started.set_result, (status, headers))
+    try:
+        for chunk in app_iter:
+            if chunk:
+                loop.call_soon_threadsafe(body.put_nowait, chunk)
+    finally:
+        close = getattr(app_iter, 'close', None)
+        if close:
+            close()
+        loop.call_soon_threadsafe(body.put_nowait, None)
+
+
+async def wsgi_bridge(request: web.Request) -> web.StreamResponse:
+    """Serve a request with the Flask app."""
+    headers = [(k, v) for k, v in request.headers.items() if k.lower() not in ('content-length', 'content-type')]
+    environ = EnvironBuilder(
+        path=request.path,
+        base_url=f"{request.scheme}://{request.host}",
+        method=request.method,
+        query_string=request.query_string,
+        headers=headers,
+        content_type=request.headers.get('Content-Type'),
+        data=await request.read(),
+    ).get_environ()
+    environ['REMOTE_ADDR'] = request.remote or ''
+
+    loop = asyncio.get_running_loop()
+    started = loop.create_future()
+    body: asyncio.Queue = asyncio.Queue()
+    loop.run_in_executor(None, _run_wsgi, environ, loop, started, body)
+
+    status, response_headers = await started
+    code, _, reason = status.partition(' ')
+    response = web.StreamResponse(status=int(code), reason=reason or None)
+    for key, value in response_headers.items():
+        response.headers.add(key, value)
+    await response.prepare(request)
+    while True:
+        chunk = await body.get()
+        if chunk is None:
+            break
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+
+@web.middleware
+async def cors_middleware(request: web.Request, handler):
+    """Match flask-cors' default behaviour for the natively served routes."""
+    response = await handler(request)
+    if request.headers.get('Origin') and not response.prepared:
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+    return response
+
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler):
+    """Record latency of the native routes; bridged ones are recorded by Flask."""
+    if request.match_info.handler is wsgi_bridge:
+        return await handler(request)
+    route = request.match_info.route.resource.canonical
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route)
+        REQUESTS.inc(request.method, route, str(status))
+
+
+@web.middleware
+async def tracing_middleware(request: web.Request, handler):
+    """Trace the native routes; bridged ones are traced by Flask."""
+    if request.match_info.handler is wsgi_bridge:
+        return await handler(request)
+    root = begin_trace(
+        'http', trace_id=request.headers.get('X-Request-ID'), method=request.method, path=request.path,
+        route=request.match_info.route.resource.canonical
+    )
+    if root is None:
+        return await handler(request)
+    try:
+        response = await handler(request)
+    except BaseException as e:
+        finish_trace(root, error=type(e).__name__)
+        raise
+    if not response.prepared:
+        response.headers['X-Trace-Id'] = root.trace.trace_id
+    finish_trace(root, status=response.status)
+    return response
+
+
+async def _on_startup(app: web.Application) -> None:
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_WORKERS, thread_name_prefix='async-blocking'))
+    print("Initializing database...")
+    if await loop.run_in_executor(None, init_database):
+        print("Database initialized successfully")
+    else:
+        print("Warning: Database initialization failed")
+
+
+async def _on_cleanup(app: web.Application) -> None:
+    await async_http_client.close()
+
+
+def create_app() -> web.Application:
+    """Build the aiohttp application."""
+    app = web.Application(middlewares=[metrics_middleware, tracing_middleware, cors_middleware], client_max_size=4 * 1024 * 1024)
+    app.router.add_post('/api/game/start', start_game)
+    app.router.add_post('/api/game/choice', make_choice)
+    app.router.add_post('/api/story/generate', generate_story)
+    app.router.add_post('/api/narrate', narrate)
+    # Everything else, including CORS preflight requests, goes to Flask
+    app.router.add_route('*', '/{tail:.*}', wsgi_bridge)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the Interactive Story Game API in async mode.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    print("Starting Interactive Story Game API (async mode)...")
+    print(f"Debug mode: {DEBUG}")
+    print(f"Server will be available at: http://localhost:{args.port}")
+    web.run_app(create_app(), host=args.host, port=args.port)
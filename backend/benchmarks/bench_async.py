@@ -0,0 +1,196 @@
+"""Load test of the async (aiohttp) server against the sync Flask server.
+
+Both servers run in their own process against a local fake Perplexity
+endpoint that answers after a fixed delay, so the numbers show how many
+turns each mode keeps in flight while waiting on the upstream. The sync
+server handles requests on a bounded thread pool, like a threaded
+production WSGI server::
+
+    python -m benchmarks.bench_async --users 200 --turns 5 --sync-threads 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from benchmarks.common import summarize
+from benchmarks.fake_upstreams import FakeUpstreams, UpstreamProfile, free_port
+
+def _serve(mode: str, port: int, threads: int) -> None:
+    """Run one server in this process (used by the spawned children)."""
+    if mode == 'async':
+        from aiohttp import web
+        from async_app import create_app
+
+        web.run_app(create_app(), host='127.0.0.1', port=port, backlog=2048, print=None, access_log=None)
+        return
+
+    import logging
+    from werkzeug.serving import BaseWSGIServer
+    from app import app
+    from database.db_manager import init_database
+
+    class PooledWSGIServer(BaseWSGIServer):
+        """WSGI server that handles requests on a fixed-size thread pool."""
+
+        request_queue_size = 2048
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self._pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    init_database()
+    PooledWSGIServer('127.0.0.1', port, app).serve_forever()
+
+
+async def wait_ready(session, base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with session.get(f'{base_url}/api/health') as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f'Server at {base_url} did not start')
+        await asyncio.sleep(0.2)
+
+
+async def _load(base_url: str, users: int, turns: int) -> Dict:
+    """Each virtual user starts a game and plays `turns` turns, one request at a time."""
+    import aiohttp
+
+    latencies: List[float] = []
+    errors = 0
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=600)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await wait_ready(session, base_url)
+
+        async def player(i: int):
+            nonlocal errors
+            async with session.post(f'{base_url}/api/game/start', json={'character_name': f'Load {i}'}) as response:
+                session_id = (await response.json())['session_id']
+            for turn in range(turns):
+                started = time.perf_counter()
+                try:
+                    async with session.post(
+                        f'{base_url}/api/game/choice',
+                        json={'session_id': session_id, 'choice_index': turn % 3},
+                    ) as response:
+                        body = await response.json()
+                        ok = response.status == 200 and body.get('success')
+                except Exception:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(player(i) for i in range(users)))
+        wall = time.perf_counter() - started
+
+    result = summarize(latencies)
+    result['errors'] = errors
+    result['turns_per_sec'] = len(latencies) / wall if wall else 0.0
+    return result
+
+
+def start_server(mode: str, env: Dict[str, str], sync_threads: int = 16) -> Tuple[subprocess.Popen, str]:
+    """Start the sync or async server in a child process; return it and its base URL."""
+    port = free_port()
+    child = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.bench_async', '--serve', mode,
+         '--port', str(port), '--sync-threads', str(sync_threads)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return child, f'http://127.0.0.1:{port}'
+
+
+def _run_mode(mode: str, args, upstream_url: str) -> Dict:
+    workdir = tempfile.mkdtemp(prefix=f'story-bench-{mode}-')
+    env = dict(
+        os.environ,
+        DATABASE_PATH=os.path.join(workdir, 'bench.sqlite'),
+        IMAGE_CACHE_DIR=os.path.join(workdir, 'images'),
+        PERPLEXITY_API_KEY='benchmark',
+        PERPLEXITY_BASE_URL=upstream_url,
+        # No image credentials: measure the story path only
+        WORKER_AI_API='',
+        CLOUDFLARE_ACC_ID='',
+        DEEPGRAM_API_KEY=os.environ.get('DEEPGRAM_API_KEY', 'benchmark'),
+        SPECULATIVE_ENABLED='false',
+        # Measure the servers, not the client-side Perplexity quota
+        PERPLEXITY_RATE_LIMIT_PER_MINUTE='0',
+        LLM_CACHE_ENABLED='false',
+    )
+    child, base_url = start_server(mode, env, args.sync_threads)
+    try:
+        return asyncio.run(_load(base_url, args.users, args.turns))
+    finally:
+        child.terminate()
+        child.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200, help='Concurrent players')
+    parser.add_argument('--turns', type=int, default=5, help='Choices per player')
+    parser.add_argument('--upstream-latency-ms', type=float, default=800)
+    parser.add_argument('--sync-threads', type=int, default=16, help='Request threads of the sync server')
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    parser.add_argument('--serve', choices=('sync', 'async'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args.serve, args.port, args.sync_threads)
+        return
+
+    upstreams = FakeUpstreams({'perplexity': UpstreamProfile(latency_ms=args.upstream_latency_ms)}).start()
+    upstream_url = upstreams.urls()['PERPLEXITY_BASE_URL']
+
+    results = {mode: _run_mode(mode, args, upstream_url) for mode in args.modes.split(',')}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f"users={args.users} turns={args.turns} upstream_latency={args.upstream_latency_ms:.0f}ms "
+        f"sync_threads={args.sync_threads}"
+    )
+    print(f"{'mode':<6} {'turns/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for mode, stats in results.items():
+        print(
+            f"{mode:<6} {stats['turns_per_sec']:>9.1f} {stats.get('p50_ms', 0):>9.1f} "
+            f"{stats.get('p95_ms', 0):>9.1f} {stats.get('p99_ms', 0):>9.1f} {stats['errors']:>7}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Decode time and stored size of each storage codec for long histories.
+
+Encodes the save snapshot (`GameState.to_dict()`) of synthetic sessions
+with every registered codec, then stores `--saves` snapshots per codec in
+a scratch database to compare the file size and the cost of loading a
+save through `DatabaseManager.load_game`::
+
+    python -m benchmarks.bench_codecs --sizes 10,100,1000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.bench_hot_paths import measure, synthetic_session
+from database import codecs
+from database.db_manager import DatabaseManager
+
+SCHEMA = os.path.join(os.path.dirname(codecs.__file__), 'init.sql')
+
+
+def _file_size(db: DatabaseManager) -> int:
+    with db.get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def _stored(snapshot: Dict, name: str, saves: int, repeat: int) -> Dict[str, float]:
+    """Store `saves` copies of the snapshot with codec `name`; time loading one back."""
+    fd, path = tempfile.mkstemp(prefix='story-codec-', suffix='.sqlite')
+    os.close(fd)
+    db = DatabaseManager(path)
+    db.snapshot_format = name
+    try:
+        with open(SCHEMA) as f, db.get_connection() as conn:
+            conn.executescript(f.read())
+        empty = _file_size(db)
+        for i in range(saves):
+            db.save_game(f'save-{i}', snapshot['session_id'], f'Save {i}', snapshot)
+        size = _file_size(db)
+
+        samples = []
+        for i in range(repeat * 20):
+            started = time.perf_counter()
+            db.load_game(f'save-{i % saves}')
+            samples.append(time.perf_counter() - started)
+        return {
+            'db_bytes_per_save': (size - empty) / saves,
+            'load_game_us': statistics.median(samples) * 1e6,
+        }
+    finally:
+        db.pool.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def run(sizes: List[int], saves: int, repeat: int, min_time: float, seed: int) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    for turns in sizes:
+        snapshot = synthetic_session(turns, seed).to_dict()
+        for name, codec in codecs.CODECS.items():
+            encoded = codec.encode(snapshot)
+            if codec.decode(encoded) != json.loads(json.dumps(snapshot)):
+                raise AssertionError(f"{name} does not round-trip the snapshot")
+            stats = {
+                'encoded_bytes': len(encoded.encode('utf-8') if isinstance(encoded, str) else encoded),
+                'encode_us': measure(lambda: codec.encode(snapshot), repeat, min_time)['min_us'],
+                'decode_us': measure(lambda: codec.decode(encoded), repeat, min_time)['min_us'],
+            }
+            stats.update(_stored(snapshot, name, saves, repeat))
+            results[f'{name}[{turns}]'] = stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000', help='Comma-separated session lengths in turns')
+    parser.add_argument('--saves', type=int, default=20, help='Snapshots stored per codec and size')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    results = run(sizes, args.saves, args.repeat, args.min_time, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'codec':<22} {'bytes':>10} {'db bytes/save':>14} {'encode us':>10} {'decode us':>10} {'load_game us':>13}")
+    for name, stats in results.items():
+        print(
+            f"{name:<22} {stats['encoded_bytes']:>10} {stats['db_bytes_per_save']:>14.0f} "
+            f"{stats['encode_us']:>10.1f} {stats['decode_us']:>10.1f} {stats['load_game_us']:>13.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Throughput of the /choice and /state endpoints with and without connection pooling.
+
+Both modes run against the Flask test client with the offline AI and image
+fallbacks, so the numbers isolate database and request-handling overhead::
+
+    python -m benchmarks.bench_db_pool --workers 8 --requests 2000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+from benchmarks.common import prepare_environment, run_concurrent
+
+# Each mode swaps in its own database file, so the import-time path is never opened
+prepare_environment(':memory:')
+
+from app import app  # noqa: E402
+from database.connection_pool import SQLiteConnectionPool  # noqa: E402
+from database.db_manager import db_manager, init_database  # noqa: E402
+from models.session_cache import session_cache  # noqa: E402
+
+# Measure the database path itself rather than in-process session cache hits
+session_cache.max_size = 0
+
+
+class UnpooledConnections:
+    """Reproduces the previous behaviour: a fresh connection for every query."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+
+def _run_mode(label: str, pooled: bool, workers: int, requests: int, sessions: int) -> dict:
+    fd, db_path = tempfile.mkstemp(prefix=f'story-bench-{label}-', suffix='.sqlite')
+    os.close(fd)
+    db_manager.db_path = db_path
+    db_manager.pool = (
+        SQLiteConnectionPool(db_path, max_size=workers) if pooled else UnpooledConnections(db_path)
+    )
+    init_database()
+
+    client = app.test_client()
+    session_ids = []
+    for _ in range(sessions):
+        response = client.post('/api/game/start', json={'character_name': 'Bench'})
+        session_ids.append(response.get_json()['session_id'])
+
+    def make_choice(i: int):
+        response = client.post('/api/game/choice', json={
+            'session_id': session_ids[i % len(session_ids)],
+            'choice_index': i % 3,
+        })
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    def get_state(i: int):
+        response = client.get(f"/api/game/state/{session_ids[i % len(session_ids)]}")
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    results = {
+        'choice': run_concurrent(make_choice, workers, requests),
+        'state': run_concurrent(get_state, workers, requests),
+    }
+
+    db_manager.pool.close()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--sessions', type=int, default=32)
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    # Route handlers print warnings for the missing image credentials; keep output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['unpooled'] = _run_mode('unpooled', False, args.workers, args.requests, args.sessions)
+        results['pooled'] = _run_mode('pooled', True, args.workers, args.requests, args.sessions)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"workers={args.workers} requests={args.requests} sessions={args.sessions}")
+    print(f"{'mode':<10} {'route':<8} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for mode, routes in results.items():
+        for route, stats in routes.items():
+            print(
+                f"{mode:<10} {route:<8} {stats['requests_per_sec']:>10.1f} "
+                f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
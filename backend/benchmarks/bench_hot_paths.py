@@ -0,0 +1,243 @@
+"""Micro-benchmarks of the per-turn hot paths over 10, 100 and 1000 turn sessions.
+
+Covers GameState serialization, story context and fingerprint rebuilds,
+the session and saved game queries, LLM JSON parsing and the personality
+prompt payload. Results can be written as JSON and compared against a
+stored baseline; the comparison exits non-zero on regressions::
+
+    python -m benchmarks.bench_hot_paths --output baseline.json
+    python -m benchmarks.bench_hot_paths --baseline baseline.json --threshold 0.15
+
+Each case is timed in `--repeat` runs long enough to be timed reliably.
+Baselines are compared on the fastest run, which is the least disturbed
+by other work on the machine.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import timeit
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.common import prepare_environment
+
+DB_PATH = prepare_environment()
+
+from database.db_manager import db_manager, init_database  # noqa: E402
+from models.game_state import GameState  # noqa: E402
+from services.ai_service import ai_service  # noqa: E402
+from services.personality_service import personality_service  # noqa: E402
+
+WORDS = (
+    "the ancient forest whispered secrets while glowing runes pulsed beneath "
+    "moss covered stones and a distant bell echoed across the silver valley"
+).split()
+
+
+def _segment(rng: random.Random) -> str:
+    sentences = []
+    for _ in range(rng.randint(8, 16)):
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize())
+    return ". ".join(sentences) + "."
+
+
+def synthetic_session(turns: int, seed: int) -> GameState:
+    """Play `turns` turns with generated story segments."""
+    rng = random.Random(seed)
+    game_state = GameState()
+    game_state.character_info = {'name': 'Bench', 'traits': ['curious', 'brave'], 'inventory': ['lantern', 'map']}
+    game_state.apply_opening()
+    for turn in range(1, turns + 1):
+        game_state.add_choice_to_history(f"Choice {turn}: {' '.join(rng.choice(WORDS) for _ in range(5))}",
+                                         _segment(rng))
+        game_state.current_choices = [f"Option {i} for turn {turn}" for i in range(1, 4)]
+    game_state.update_story_context()
+    return game_state
+
+
+def _llm_responses(seed: int) -> Dict[str, str]:
+    """Model outputs in the shapes `_parse_json_response` has to handle."""
+    rng = random.Random(seed)
+    body = json.dumps({
+        'story': ' '.join(_segment(rng) for _ in range(2)),
+        'choices': ['Wade into the lake', 'Follow the shoreline', 'Climb the watchtower'],
+        'image_prompt': 'A silent moonlit lake beside an old watchtower',
+    })
+    return {
+        'plain': body,
+        'fenced': f"```json\n{body}\n```",
+        'prose': f"Here is the next part of the story:\n\n{body}\n\nLet me know what happens next.",
+    }
+
+
+def _cases(sizes: List[int], seed: int) -> List[Tuple[str, Callable[[], object]]]:
+    """Build (name, zero-argument callable) pairs; setup happens here, not in the timed calls."""
+    cases: List[Tuple[str, Callable[[], object]]] = []
+    for turns in sizes:
+        game_state = synthetic_session(turns, seed)
+        data = game_state.to_dict()
+        history = game_state.choices_history
+
+        cold_context = game_state.clone()
+
+        def rebuild_context(state=cold_context):
+            # A freshly loaded session has no rolling context yet
+            state._rolling_context = None
+            state.update_story_context()
+
+        cold_fingerprint = game_state.clone()
+
+        def rebuild_fingerprint(state=cold_fingerprint):
+            # Sessions stored before fingerprints were persisted walk the whole history
+            state.history_fingerprint = None
+            return state.get_history_fingerprint()
+
+        _, head_node_id = db_manager.upsert_game_session(
+            game_state.session_id, game_state.story_context, game_state.current_story, history,
+            game_state.current_choices, game_state.character_info,
+            history_fingerprint=game_state.get_history_fingerprint(),
+        )
+        parent = db_manager.get_story_ancestor(head_node_id, turns - 1) if turns > 1 else None
+
+        def write_turn(state=game_state, base=parent['id'] if parent else None):
+            # Writes the latest turn only, like a save after one choice
+            return db_manager.update_game_session(
+                state.session_id, state.story_context, state.current_story, state.choices_history,
+                state.current_choices, state.character_info, base_node_id=base,
+                history_fingerprint=state.history_fingerprint,
+            )
+
+        def write_all(state=game_state):
+            # Matches the whole history against the story tree, like a restored snapshot
+            return db_manager.update_game_session(
+                state.session_id, state.story_context, state.current_story, state.choices_history,
+                state.current_choices, state.character_info, base_node_id=None,
+                history_fingerprint=state.history_fingerprint,
+            )
+
+        def save(state=game_state, data=data, base=head_node_id):
+            return db_manager.save_game(f'bench-{state.session_id}', state.session_id, 'Bench', data,
+                                        base_node_id=base)
+
+        save()
+        cases += [
+            (f'game_state.to_dict[{turns}]', game_state.to_dict),
+            (f'game_state.from_dict[{turns}]', lambda data=data: GameState.from_dict(data)),
+            (f'game_state.update_story_context.cold[{turns}]', rebuild_context),
+            (f'game_state.get_history_fingerprint.cold[{turns}]', rebuild_fingerprint),
+            (f'db.get_game_session[{turns}]', lambda sid=game_state.session_id: db_manager.get_game_session(sid)),
+            (f'db.update_game_session.turn[{turns}]', write_turn),
+            (f'db.update_game_session.replace[{turns}]', write_all),
+            (f'db.save_game[{turns}]', save),
+            (f'db.load_game[{turns}]', lambda sid=game_state.session_id: db_manager.load_game(f'bench-{sid}')),
+            (f'personality.format_history_payload[{turns}]',
+             lambda history=history: personality_service._format_history_payload(history)),
+        ]
+
+    for shape, content in _llm_responses(seed).items():
+        cases.append((f'ai.parse_json_response[{shape}]',
+                      lambda content=content: ai_service._parse_json_response(content)))
+    return cases
+
+
+def measure(fn: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    """Time `fn` in loops of at least `min_time` seconds; return per-call microseconds."""
+    timer = timeit.Timer(fn)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    samples = [elapsed / number * 1e6 for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'median_us': statistics.median(samples),
+        'min_us': min(samples),
+        'max_us': max(samples),
+        'loops': number,
+    }
+
+
+def run(sizes: List[int], repeat: int, min_time: float, seed: int, only: str = None) -> Dict:
+    # Migration and fallback messages would interleave with the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database()
+        cases = _cases(sizes, seed)
+    results = {}
+    for name, fn in cases:
+        if only and only not in name:
+            continue
+        results[name] = measure(fn, repeat, min_time)
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'sizes': sizes,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> Tuple[Dict[str, float], List[str]]:
+    """Return the current/baseline ratio per case and the cases slower than `1 + threshold`."""
+    ratios = {}
+    regressions = []
+    for name, stats in current['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous.get('min_us'):
+            continue
+        ratio = stats['min_us'] / previous['min_us']
+        ratios[name] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return ratios, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000', help='Comma-separated session lengths in turns')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Minimum seconds per timed run')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--only', help='Run only cases whose name contains this text')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against results previously written with --output')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Allowed slowdown against the baseline before a case counts as a regression')
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    current = run(sizes, args.repeat, args.min_time, args.seed, args.only)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    ratios, regressions = {}, []
+    if args.baseline:
+        with open(args.baseline) as f:
+            ratios, regressions = compare(current, json.load(f), args.threshold)
+
+    if args.json:
+        print(json.dumps(dict(current, vs_baseline=ratios, regressions=regressions), indent=2))
+    else:
+        print(f"{'case':<50} {'median us':>12} {'min us':>12} {'vs baseline':>12}")
+        for name, stats in current['results'].items():
+            delta = f"{(ratios[name] - 1) * 100:+.1f}%" if name in ratios else ''
+            flag = ' !' if name in regressions else ''
+            print(f"{name:<50} {stats['median_us']:>12.2f} {stats['min_us']:>12.2f} {delta:>12}{flag}")
+        if args.baseline:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
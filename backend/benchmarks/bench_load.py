@@ -0,0 +1,251 @@
+"""Scripted load test of whole play sessions against local fake upstreams.
+
+Every virtual user plays one session the way the frontend does:
+``/start`` -> N x ``/choice`` (polling each scene image, optionally
+narrating each turn) -> ``/save`` -> ``/personality/<id>/analyze``. The
+backend runs in a child process with its Perplexity, Cloudflare and
+Deepgram base URLs pointed at `benchmarks.fake_upstreams`, so the real
+request, rate limiting, retry and caching paths are exercised offline
+and the results are reproducible with ``--seed``::
+
+    python -m benchmarks.bench_load --users 50 --turns 5 --mode async --narrate
+
+Throughput and p50/p95/p99 latency are reported per route. With
+``--target`` an already running server is driven instead; start
+``python -m benchmarks.fake_upstreams`` and point that server at it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.bench_async import start_server, wait_ready
+from benchmarks.common import summarize
+from benchmarks.fake_upstreams import FakeUpstreams, add_profile_arguments, profiles_from_args
+
+ROUTES = ('start', 'choice', 'image', 'narrate', 'save', 'personality')
+
+# Backend settings the harness changes unless they are set in the environment
+TUNABLE_DEFAULTS = {
+    'SPECULATIVE_ENABLED': 'false',
+    # Measure the server, not the client-side Perplexity quota
+    'PERPLEXITY_RATE_LIMIT_PER_MINUTE': '0',
+    'LLM_CACHE_ENABLED': 'false',
+}
+
+
+class _Recorder:
+    """Per-route latency samples, errors and status codes."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, started: float, status: int, ok: bool) -> None:
+        self.statuses[route][str(status)] += 1
+        if ok:
+            self.latencies[route].append(time.perf_counter() - started)
+        else:
+            self.errors[route] += 1
+
+    def report(self, wall: float) -> Dict[str, Dict]:
+        routes = {}
+        for route in ROUTES:
+            if route not in self.statuses:
+                continue
+            stats = summarize(self.latencies[route])
+            stats['errors'] = self.errors[route]
+            stats['statuses'] = dict(self.statuses[route])
+            stats['requests_per_sec'] = sum(self.statuses[route].values()) / wall if wall else 0.0
+            routes[route] = stats
+        return routes
+
+
+async def _call(session, recorder: _Recorder, route: str, method: str, url: str, **kwargs):
+    """Make one request and record it; return the JSON body, or None on failure."""
+    started = time.perf_counter()
+    status = 0
+    try:
+        async with session.request(method, url, **kwargs) as response:
+            status = response.status
+            if response.content_type == 'application/json':
+                body = await response.json()
+            else:
+                await response.read()
+                body = {'success': response.status == 200}
+    except Exception:
+        body = None
+    ok = body is not None and 200 <= status < 300 and body.get('success', True)
+    recorder.record(route, started, status, ok)
+    return body if ok else None
+
+
+async def _poll_image(session, recorder: _Recorder, base_url: str, job_id: str,
+                      interval: float, timeout: float) -> None:
+    """Poll a scene image job like the frontend; record the time until it finished."""
+    started = time.perf_counter()
+    deadline = started + timeout
+    status = 0
+    while time.perf_counter() < deadline:
+        try:
+            async with session.get(f'{base_url}/api/game/image/{job_id}') as response:
+                status = response.status
+                body = await response.json()
+        except Exception:
+            break
+        if status != 202:
+            recorder.record('image', started, status, status == 200 and body.get('status') == 'completed')
+            return
+        await asyncio.sleep(interval)
+    recorder.record('image', started, status, False)
+
+
+async def _play(session, recorder: _Recorder, base_url: str, user: int, args) -> bool:
+    """Play one scripted session; return whether every step succeeded."""
+    api = f'{base_url}/api/game'
+    image_polls = []
+
+    body = await _call(session, recorder, 'start', 'POST', f'{api}/start',
+                       json={'character_name': f'Load {user}'})
+    if body is None:
+        return False
+    session_id = body['session_id']
+    completed = True
+
+    for turn in range(args.turns):
+        await asyncio.sleep(args.think_ms / 1000)
+        body = await _call(session, recorder, 'choice', 'POST', f'{api}/choice',
+                           json={'session_id': session_id, 'choice_index': turn % 3})
+        if body is None:
+            completed = False
+            continue
+        if body.get('image_job_id') and not args.no_images:
+            image_polls.append(asyncio.ensure_future(_poll_image(
+                session, recorder, base_url, body['image_job_id'], args.image_poll_ms / 1000, args.image_timeout
+            )))
+        if args.narrate:
+            narrated = await _call(session, recorder, 'narrate', 'POST', f'{base_url}/api/narrate',
+                                   json={'text': body['story'][:2000]})
+            completed = completed and narrated is not None
+
+    saved = await _call(session, recorder, 'save', 'POST', f'{api}/save',
+                        json={'session_id': session_id, 'save_name': f'Load {user}'})
+    analyzed = await _call(session, recorder, 'personality', 'POST', f'{api}/personality/{session_id}/analyze',
+                           json={})
+    await asyncio.gather(*image_polls)
+    return completed and saved is not None and analyzed is not None
+
+
+async def _load(base_url: str, args) -> Dict:
+    import aiohttp
+
+    recorder = _Recorder()
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=600)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await wait_ready(session, base_url)
+
+        async def user(i: int) -> bool:
+            # Spread session starts over the ramp-up period
+            await asyncio.sleep(args.ramp_seconds * i / max(args.users, 1))
+            return await _play(session, recorder, base_url, i, args)
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(user(i) for i in range(args.users)))
+        wall = time.perf_counter() - started
+
+    completed = sum(outcomes)
+    return {
+        'wall_seconds': wall,
+        'sessions_completed': completed,
+        'sessions_failed': len(outcomes) - completed,
+        'sessions_per_sec': completed / wall if wall else 0.0,
+        'routes': recorder.report(wall),
+    }
+
+
+def _backend_env(workdir: str, upstreams: FakeUpstreams, images: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    for name, value in TUNABLE_DEFAULTS.items():
+        env.setdefault(name, value)
+    env.update(upstreams.urls())
+    env.update(
+        DATABASE_PATH=os.path.join(workdir, 'bench.sqlite'),
+        IMAGE_CACHE_DIR=os.path.join(workdir, 'images'),
+        TTS_CACHE_DIR=os.path.join(workdir, 'tts'),
+        PERPLEXITY_API_KEY='benchmark',
+        WORKER_AI_API='benchmark' if images else '',
+        CLOUDFLARE_ACC_ID='benchmark' if images else '',
+        DEEPGRAM_API_KEY='benchmark',
+    )
+    return env
+
+
+def _print_report(result: Dict, args) -> None:
+    print(
+        f"mode={args.mode} users={args.users} turns={args.turns} "
+        f"perplexity={args.perplexity_latency_ms:.0f}ms cloudflare={args.cloudflare_latency_ms:.0f}ms "
+        f"deepgram={args.deepgram_latency_ms:.0f}ms ({args.latency_distribution})"
+    )
+    print(
+        f"sessions: {result['sessions_completed']} completed, {result['sessions_failed']} failed, "
+        f"{result['sessions_per_sec']:.2f}/s over {result['wall_seconds']:.1f}s"
+    )
+    print(f"{'route':<12} {'count':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for route, stats in result['routes'].items():
+        print(
+            f"{route:<12} {stats['count']:>6} {stats['requests_per_sec']:>8.1f} {stats.get('p50_ms', 0):>9.1f} "
+            f"{stats.get('p95_ms', 0):>9.1f} {stats.get('p99_ms', 0):>9.1f} {stats['errors']:>7}"
+        )
+    if 'upstream_calls' in result:
+        calls = ', '.join(
+            f"{name} {counts['requests']} ({counts['errors']} errors)" for name, counts in result['upstream_calls'].items()
+        )
+        print(f"upstream calls: {calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50, help='Concurrent players')
+    parser.add_argument('--turns', type=int, default=5, help='Choices per session')
+    parser.add_argument('--mode', choices=('sync', 'async'), default='sync', help='Server to start')
+    parser.add_argument('--sync-threads', type=int, default=16, help='Request threads of the sync server')
+    parser.add_argument('--target', help='Drive an already running server at this URL instead')
+    parser.add_argument('--ramp-seconds', type=float, default=0.0, help='Spread session starts over this period')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='Pause before each choice')
+    parser.add_argument('--narrate', action='store_true', help='Request narration audio for every turn')
+    parser.add_argument('--no-images', action='store_true', help='Run without Cloudflare credentials')
+    parser.add_argument('--image-poll-ms', type=float, default=250)
+    parser.add_argument('--image-timeout', type=float, default=60)
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    add_profile_arguments(parser, {'perplexity': 800, 'cloudflare': 2000, 'deepgram': 400})
+    args = parser.parse_args()
+
+    if args.target:
+        result = asyncio.run(_load(args.target.rstrip('/'), args))
+    else:
+        upstreams = FakeUpstreams(profiles_from_args(args), seed=args.seed).start()
+        workdir = tempfile.mkdtemp(prefix=f'story-load-{args.mode}-')
+        child, base_url = start_server(args.mode, _backend_env(workdir, upstreams, not args.no_images),
+                                       args.sync_threads)
+        try:
+            result = asyncio.run(_load(base_url, args))
+        finally:
+            child.terminate()
+            child.wait(timeout=10)
+        result['upstream_calls'] = upstreams.counts
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    _print_report(result, args)
+
+
+if __name__ == '__main__':
+    main()
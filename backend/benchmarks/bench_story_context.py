@@ -0,0 +1,121 @@
+"""Per-turn cost of GameState.update_story_context over long sessions.
+
+Plays a synthetic session turn by turn and times the previous full-rebuild
+implementation against the incremental rolling context. Every turn checks
+that both produce the same `story_context`::
+
+    python -m benchmarks.bench_story_context --turns 1000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from benchmarks.common import prepare_environment
+
+prepare_environment(':memory:')
+
+from config import MAX_CONTEXT_LENGTH  # noqa: E402
+from models.game_state import GameState  # noqa: E402
+
+WORDS = (
+    "the ancient forest whispered secrets while glowing runes pulsed beneath "
+    "moss covered stones and a distant bell echoed across the silver valley"
+).split()
+
+
+def legacy_story_context(game_state: GameState, max_length: int = MAX_CONTEXT_LENGTH) -> str:
+    """The previous implementation: rebuild and trim the whole story every turn."""
+    segments: List[str] = []
+    if not game_state.choices_history:
+        if game_state.current_story:
+            segments.append(game_state.current_story)
+    else:
+        last_segment = game_state.choices_history[-1].get('story_segment', '').strip()
+        if game_state.current_story and game_state.current_story.strip() != last_segment:
+            segments.append(game_state.current_story)
+        for entry in game_state.choices_history:
+            seg = entry.get('story_segment', '')
+            if seg:
+                segments.append(seg)
+
+    full_context = " ".join(segments).strip()
+
+    if len(full_context) > max_length:
+        sentences = full_context.split('. ')
+        trimmed_story = ""
+        for sentence in reversed(sentences):
+            test_story = (sentence + '. ' + trimmed_story).strip()
+            if len(test_story) <= max_length:
+                trimmed_story = test_story
+            else:
+                break
+        return trimmed_story.strip() if trimmed_story else full_context[-max_length:]
+    return full_context
+
+
+def _segment(rng: random.Random) -> str:
+    """Build a story segment of roughly STORY_LENGTH_WORDS words in short sentences."""
+    sentences = []
+    for _ in range(rng.randint(8, 16)):
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize())
+    return ". ".join(sentences) + "."
+
+
+def run(turns: int, window: int, seed: int) -> Dict[int, Dict[str, float]]:
+    """Play `turns` turns and average the per-turn cost over the `window` turns ending at each checkpoint."""
+    rng = random.Random(seed)
+    game_state = GameState()
+    game_state.apply_opening()
+    checkpoints = sorted({t for t in (10, 100, 250, 500, 1000, turns) if t <= turns})
+    legacy_samples: List[float] = []
+    incremental_samples: List[float] = []
+    results: Dict[int, Dict[str, float]] = {}
+
+    for turn in range(1, turns + 1):
+        game_state.add_choice_to_history(f"Choice {turn}", _segment(rng))
+
+        started = time.perf_counter()
+        game_state.update_story_context()
+        incremental_samples.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        expected = legacy_story_context(game_state)
+        legacy_samples.append(time.perf_counter() - started)
+
+        if game_state.story_context != expected:
+            raise AssertionError(f"Context mismatch at turn {turn}")
+
+        if turn in checkpoints:
+            recent = slice(max(turn - window, 0), turn)
+            results[turn] = {
+                'legacy_us': statistics.fmean(legacy_samples[recent]) * 1e6,
+                'incremental_us': statistics.fmean(incremental_samples[recent]) * 1e6,
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--turns', type=int, default=1000)
+    parser.add_argument('--window', type=int, default=10, help='Turns averaged per checkpoint')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.turns, args.window, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"outputs identical for all {args.turns} turns")
+    print(f"{'turn':>6} {'legacy us':>12} {'incremental us':>16}")
+    for turn, stats in sorted(results.items()):
+        print(f"{turn:>6} {stats['legacy_us']:>12.1f} {stats['incremental_us']:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Shared helpers for the backend benchmark scripts.
+
+Benchmarks are run from the `backend` directory, for example::
+
+    python -m benchmarks.bench_db_pool
+
+`prepare_environment` must be called before importing any backend module so
+that `config` picks up the temporary database and the offline API settings.
+"""
+
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+
+def prepare_environment(db_path: str = None) -> str:
+    """Point the backend at a scratch database and disable live upstream APIs."""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='story-bench-', suffix='.sqlite')
+        os.close(fd)
+    os.environ['DATABASE_PATH'] = db_path
+    # Empty values stop python-dotenv from loading real keys from .env
+    os.environ['PERPLEXITY_API_KEY'] = ''
+    os.environ['WORKER_AI_API'] = ''
+    os.environ['CLOUDFLARE_ACC_ID'] = ''
+    os.environ.setdefault('DEEPGRAM_API_KEY', 'benchmark')
+    return db_path
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Return the nearest-rank percentile of `samples`."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples (seconds) in milliseconds."""
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000,
+    }
+
+
+def run_concurrent(task: Callable[[int], None], workers: int, requests: int) -> Dict[str, float]:
+    """Run `task(i)` `requests` times across `workers` threads.
+
+    Returns throughput and latency statistics for the whole run.
+    """
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def timed(i: int):
+        started = time.perf_counter()
+        task(i)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - started
+
+    result = summarize(latencies)
+    result['requests_per_sec'] = requests / wall if wall else 0.0
+    return result
@@ -0,0 +1,252 @@
+"""Local stand-in for the Perplexity, Cloudflare and Deepgram APIs.
+
+One aiohttp server answers the three endpoints the backend calls:
+
+- ``POST /chat/completions`` (Perplexity; JSON or SSE when ``stream`` is set)
+- ``POST /client/v4/accounts/{account}/ai/run/{model}`` (Cloudflare FLUX)
+- ``POST /v1/speak`` (Deepgram Aura)
+
+Each upstream has its own latency distribution and error rate, so a load
+test can exercise the real request, retry and fallback paths offline.
+Point the backend at it with::
+
+    PERPLEXITY_BASE_URL=http://127.0.0.1:8900/chat/completions
+    CLOUDFLARE_BASE_URL=http://127.0.0.1:8900/client/v4
+    DEEPGRAM_BASE_URL=http://127.0.0.1:8900/v1
+
+It can also be run on its own::
+
+    python -m benchmarks.fake_upstreams --port 8900 --perplexity-latency-ms 800
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import socket
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+FAKE_STORY = {
+    'story': 'The lantern light flickers as the path bends toward a silent lake. ' * 6,
+    'choices': ['Wade into the lake', 'Follow the shoreline', 'Climb the watchtower'],
+    'image_prompt': 'A silent moonlit lake beside an old watchtower',
+}
+
+FAKE_PERSONALITY = {
+    'archetype': 'The Curious Wanderer',
+    'summary': 'You follow every path to see where it leads, weighing risk against discovery. ' * 8,
+    'trait_scores': {'bravery': 62, 'empathy': 55, 'cunning': 40, 'honor': 58, 'curiosity': 81, 'caution': 37},
+    'evidence': [
+        {'choice': 'Wade into the lake', 'signal': 'Chose the unknown over the safe path', 'trait': 'curiosity'},
+        {'choice': 'Climb the watchtower', 'signal': 'Sought a wider view before acting', 'trait': 'caution'},
+    ],
+}
+
+# A 1x1 PNG; the backend only decodes and stores the bytes
+FAKE_IMAGE_B64 = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+)
+
+# About the size of a few seconds of narration; the backend only stores the bytes
+FAKE_AUDIO = b'\xff\xf3\x14\xc4' + b'\x00' * 40 * 1024
+
+DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+
+@dataclass
+class UpstreamProfile:
+    """Latency and failure behaviour of one fake upstream.
+
+    `latency_ms` is the median. `jitter_ms` is the spread: the half-width
+    for `uniform`, the standard deviation for `normal`, and `jitter/latency`
+    is used as sigma for `lognormal` (a long right tail, like real LLM APIs).
+    """
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    distribution: str = 'fixed'
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    def delay(self, rng: random.Random) -> float:
+        """Sample one response delay in seconds."""
+        if self.distribution == 'uniform':
+            value = rng.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+        elif self.distribution == 'normal':
+            value = rng.gauss(self.latency_ms, self.jitter_ms)
+        elif self.distribution == 'lognormal' and self.latency_ms > 0:
+            value = rng.lognormvariate(math.log(self.latency_ms), self.jitter_ms / self.latency_ms)
+        else:
+            value = self.latency_ms
+        return max(value, 0.0) / 1000
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class FakeUpstreams:
+    """The fake API server and its per-upstream request counters."""
+
+    def __init__(self, profiles: Optional[Dict[str, UpstreamProfile]] = None, seed: Optional[int] = None):
+        self.profiles = {name: UpstreamProfile() for name in ('perplexity', 'cloudflare', 'deepgram')}
+        self.profiles.update(profiles or {})
+        self._rng = random.Random(seed)
+        self.counts = {name: {'requests': 0, 'errors': 0} for name in self.profiles}
+        self._scenes = itertools.count(1)
+        self.port: Optional[int] = None
+
+    def urls(self) -> Dict[str, str]:
+        """Return the backend settings that point it at this server."""
+        base = f'http://127.0.0.1:{self.port}'
+        return {
+            'PERPLEXITY_BASE_URL': f'{base}/chat/completions',
+            'CLOUDFLARE_BASE_URL': f'{base}/client/v4',
+            'DEEPGRAM_BASE_URL': f'{base}/v1',
+        }
+
+    async def _respond(self, upstream: str, request) -> Optional[object]:
+        """Wait out the sampled latency; return an error response if one is drawn."""
+        from aiohttp import web
+
+        profile = self.profiles[upstream]
+        self.counts[upstream]['requests'] += 1
+        await request.read()
+        await asyncio.sleep(profile.delay(self._rng))
+        if profile.error_rate and self._rng.random() < profile.error_rate:
+            self.counts[upstream]['errors'] += 1
+            return web.json_response({'error': f'fake {upstream} error'}, status=profile.error_status)
+        return None
+
+    async def _completions(self, request):
+        from aiohttp import web
+
+        scene = next(self._scenes)
+        error = await self._respond('perplexity', request)
+        if error is not None:
+            return error
+        payload = await request.json()
+        system_prompt = next(
+            (message['content'] for message in payload.get('messages', []) if message.get('role') == 'system'), ''
+        )
+        if 'decision-making style' in system_prompt:
+            body = FAKE_PERSONALITY
+        else:
+            # Vary every scene so the image and TTS caches miss as they would live
+            body = dict(FAKE_STORY, story=f"{FAKE_STORY['story']}Scene {scene}.",
+                        image_prompt=f"{FAKE_STORY['image_prompt']}, scene {scene}")
+        content = json.dumps(body)
+        if not payload.get('stream'):
+            return web.json_response({'choices': [{'message': {'content': content}}]})
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for start in range(0, len(content), 32):
+            event = {'choices': [{'delta': {'content': content[start:start + 32]}}]}
+            await response.write(f'data: {json.dumps(event)}\n\n'.encode())
+        await response.write(b'data: [DONE]\n\n')
+        await response.write_eof()
+        return response
+
+    async def _image(self, request):
+        from aiohttp import web
+
+        error = await self._respond('cloudflare', request)
+        if error is not None:
+            return error
+        return web.json_response({'success': True, 'result': {'image': FAKE_IMAGE_B64}})
+
+    async def _speak(self, request):
+        from aiohttp import web
+
+        error = await self._respond('deepgram', request)
+        if error is not None:
+            return error
+        return web.Response(body=FAKE_AUDIO, content_type='audio/mpeg')
+
+    async def _stats(self, request):
+        from aiohttp import web
+
+        return web.json_response(self.counts)
+
+    def _app(self):
+        from aiohttp import web
+
+        app = web.Application(client_max_size=4 * 1024 * 1024)
+        app.router.add_post('/chat/completions', self._completions)
+        app.router.add_post('/client/v4/accounts/{account}/ai/run/{model:.+}', self._image)
+        app.router.add_post('/v1/speak', self._speak)
+        app.router.add_get('/_stats', self._stats)
+        return app
+
+    def start(self, port: Optional[int] = None) -> 'FakeUpstreams':
+        """Serve on a background thread and return once the port is bound."""
+        from aiohttp import web
+
+        self.port = port or free_port()
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            runner = web.AppRunner(self._app(), access_log=None)
+            loop.run_until_complete(runner.setup())
+            loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', self.port, backlog=2048).start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True, name='fake-upstreams').start()
+        ready.wait(timeout=10)
+        return self
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser, defaults: Dict[str, float]) -> None:
+    """Add --<upstream>-latency-ms/-jitter-ms/-error-rate options and --latency-distribution."""
+    for name in ('perplexity', 'cloudflare', 'deepgram'):
+        parser.add_argument(f'--{name}-latency-ms', type=float, default=defaults.get(name, 0.0),
+                            help=f'Median {name} response time')
+        parser.add_argument(f'--{name}-jitter-ms', type=float, default=defaults.get(name, 0.0) / 4,
+                            help=f'Spread of the {name} response time')
+        parser.add_argument(f'--{name}-error-rate', type=float, default=0.0,
+                            help=f'Fraction of {name} calls answered with an error status')
+    parser.add_argument('--latency-distribution', choices=DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--error-status', type=int, default=503, help='Status code of injected errors')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible latency and errors')
+
+
+def profiles_from_args(args: argparse.Namespace) -> Dict[str, UpstreamProfile]:
+    return {
+        name: UpstreamProfile(
+            latency_ms=getattr(args, f'{name}_latency_ms'),
+            jitter_ms=getattr(args, f'{name}_jitter_ms'),
+            distribution=args.latency_distribution,
+            error_rate=getattr(args, f'{name}_error_rate'),
+            error_status=args.error_status,
+        )
+        for name in ('perplexity', 'cloudflare', 'deepgram')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8900)
+    add_profile_arguments(parser, {'perplexity': 800, 'cloudflare': 2000, 'deepgram': 400})
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(profiles_from_args(args), seed=args.seed).start(args.port)
+    for setting, url in upstreams.urls().items():
+        print(f'{setting}={url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -5,22 +5,93 @@ load_dotenv()
 
 PERPLEXITY_API_KEY = os.getenv('PERPLEXITY_API_KEY')
 DATABASE_PATH = os.getenv('DATABASE_PATH', './database.sqlite')
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '8'))
+DATABASE_BUSY_TIMEOUT_MS = int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', '5000'))
+DATABASE_CACHE_SIZE_KB = int(os.getenv('DATABASE_CACHE_SIZE_KB', '8192'))
+# Encodings of stored session fields and save snapshots (see database/codecs.py)
+DATABASE_SESSION_FORMAT = os.getenv('DATABASE_SESSION_FORMAT', 'msgpack')
+DATABASE_SNAPSHOT_FORMAT = os.getenv('DATABASE_SNAPSHOT_FORMAT', 'msgpack+zlib')
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '512'))
+SESSION_CACHE_TTL_SECONDS = float(os.getenv('SESSION_CACHE_TTL_SECONDS', '300'))
+# 'memory' locks sessions within one process; 'sqlite' also locks across worker processes
+SESSION_LOCK_BACKEND = os.getenv('SESSION_LOCK_BACKEND', 'memory')
+SESSION_LOCK_TIMEOUT_SECONDS = float(os.getenv('SESSION_LOCK_TIMEOUT_SECONDS', '45'))
+SESSION_LOCK_LEASE_SECONDS = float(os.getenv('SESSION_LOCK_LEASE_SECONDS', '120'))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
 SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
+# Request tracing; traces slower than TRACE_SLOW_REQUEST_MS are logged as JSON
+# to TRACE_LOG_PATH (stderr when empty)
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'True').lower() == 'true'
+TRACE_SLOW_REQUEST_MS = float(os.getenv('TRACE_SLOW_REQUEST_MS', '5000'))
+TRACE_LOG_PATH = os.getenv('TRACE_LOG_PATH', '')
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '500'))
 DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
 QWEN_TTS_DEFAULT_SPEAKER = os.getenv('QWEN_TTS_DEFAULT_SPEAKER', 'uncle_fu')
 
+# Outbound HTTP Configuration (shared keep-alive pool for all upstream APIs)
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '16'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+# Async (aiohttp) server: concurrent upstream connections and threads for blocking work such as SQLite
+ASYNC_HTTP_LIMIT = int(os.getenv('ASYNC_HTTP_LIMIT', '256'))
+ASYNC_HTTP_LIMIT_PER_HOST = int(os.getenv('ASYNC_HTTP_LIMIT_PER_HOST', '128'))
+ASYNC_BLOCKING_WORKERS = int(os.getenv('ASYNC_BLOCKING_WORKERS', '16'))
+
 # AI Configuration
-PERPLEXITY_BASE_URL = "https://api.perplexity.ai/chat/completions"
+PERPLEXITY_BASE_URL = os.getenv('PERPLEXITY_BASE_URL', 'https://api.perplexity.ai/chat/completions')
 PERPLEXITY_MODEL = os.getenv('PERPLEXITY_MODEL', 'sonar')
+PERPLEXITY_READ_TIMEOUT = float(os.getenv('PERPLEXITY_READ_TIMEOUT', '30'))
+# Client-side token bucket shared by all Perplexity calls (0 disables it); callers queue
+# by priority class, at most PERPLEXITY_QUEUE_SIZE per class, for up to their max wait
+PERPLEXITY_RATE_LIMIT_PER_MINUTE = float(os.getenv('PERPLEXITY_RATE_LIMIT_PER_MINUTE', '50'))
+PERPLEXITY_RATE_LIMIT_BURST = int(os.getenv('PERPLEXITY_RATE_LIMIT_BURST', '10'))
+PERPLEXITY_QUEUE_SIZE = int(os.getenv('PERPLEXITY_QUEUE_SIZE', '64'))
+PERPLEXITY_MAX_WAIT_INTERACTIVE = float(os.getenv('PERPLEXITY_MAX_WAIT_INTERACTIVE', '15'))
+PERPLEXITY_MAX_WAIT_CUSTOM_START = float(os.getenv('PERPLEXITY_MAX_WAIT_CUSTOM_START', '20'))
+PERPLEXITY_MAX_WAIT_PERSONALITY = float(os.getenv('PERPLEXITY_MAX_WAIT_PERSONALITY', '120'))
+PERPLEXITY_MAX_WAIT_SPECULATIVE = float(os.getenv('PERPLEXITY_MAX_WAIT_SPECULATIVE', '2'))
+# Retries with jittered backoff inside a total latency budget, optional hedged requests
+# after the recent p95 latency, and a circuit breaker that fails fast to the fallback
+PERPLEXITY_LATENCY_BUDGET_SECONDS = float(os.getenv('PERPLEXITY_LATENCY_BUDGET_SECONDS', '30'))
+PERPLEXITY_MAX_RETRIES = int(os.getenv('PERPLEXITY_MAX_RETRIES', '2'))
+PERPLEXITY_RETRY_BASE_SECONDS = float(os.getenv('PERPLEXITY_RETRY_BASE_SECONDS', '0.25'))
+PERPLEXITY_RETRY_MAX_SECONDS = float(os.getenv('PERPLEXITY_RETRY_MAX_SECONDS', '2'))
+PERPLEXITY_HEDGE_ENABLED = os.getenv('PERPLEXITY_HEDGE_ENABLED', 'False').lower() == 'true'
+PERPLEXITY_HEDGE_PERCENTILE = float(os.getenv('PERPLEXITY_HEDGE_PERCENTILE', '95'))
+PERPLEXITY_HEDGE_MIN_DELAY_SECONDS = float(os.getenv('PERPLEXITY_HEDGE_MIN_DELAY_SECONDS', '1'))
+PERPLEXITY_HEDGE_WORKERS = int(os.getenv('PERPLEXITY_HEDGE_WORKERS', '16'))
+PERPLEXITY_BREAKER_FAILURES = int(os.getenv('PERPLEXITY_BREAKER_FAILURES', '5'))
+PERPLEXITY_BREAKER_RESET_SECONDS = float(os.getenv('PERPLEXITY_BREAKER_RESET_SECONDS', '30'))
 MAX_CONTEXT_LENGTH = 1000
 STORY_LENGTH_WORDS = 200
 PERSONALITY_ANALYSIS_MODEL = os.getenv('PERSONALITY_ANALYSIS_MODEL', 'sonar')
 PERSONALITY_ANALYSIS_MAX_INPUT_CHARS = int(os.getenv('PERSONALITY_ANALYSIS_MAX_INPUT_CHARS', '12000'))
 PERSONALITY_ANALYSIS_VERSION = int(os.getenv('PERSONALITY_ANALYSIS_VERSION', '1'))
+# Persistent cache of parsed LLM responses keyed by model + system prompt + prompt
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True').lower() == 'true'
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', '604800'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+
+# Speculative pre-generation of the next turn's branches
+SPECULATIVE_ENABLED = os.getenv('SPECULATIVE_ENABLED', 'False').lower() == 'true'
+SPECULATIVE_IMAGES = os.getenv('SPECULATIVE_IMAGES', 'False').lower() == 'true'
+SPECULATIVE_WORKERS = int(os.getenv('SPECULATIVE_WORKERS', '3'))
+SPECULATIVE_MAX_CALLS_PER_MINUTE = int(os.getenv('SPECULATIVE_MAX_CALLS_PER_MINUTE', '60'))
+SPECULATIVE_MAX_SESSIONS = int(os.getenv('SPECULATIVE_MAX_SESSIONS', '256'))
+SPECULATIVE_TTL_SECONDS = float(os.getenv('SPECULATIVE_TTL_SECONDS', '600'))
 
 # Cloudflare Configuration
 CLOUDFLARE_API_TOKEN = os.getenv('WORKER_AI_API')
 CLOUDFLARE_ACCOUNT_ID = os.getenv('CLOUDFLARE_ACC_ID')
+CLOUDFLARE_BASE_URL = os.getenv('CLOUDFLARE_BASE_URL', 'https://api.cloudflare.com/client/v4')
+CLOUDFLARE_READ_TIMEOUT = float(os.getenv('CLOUDFLARE_READ_TIMEOUT', '60'))
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache'))
+IMAGE_JOB_WORKERS = int(os.getenv('IMAGE_JOB_WORKERS', '4'))
+IMAGE_JOB_QUEUE_SIZE = int(os.getenv('IMAGE_JOB_QUEUE_SIZE', '32'))
+IMAGE_JOB_TTL_SECONDS = float(os.getenv('IMAGE_JOB_TTL_SECONDS', '600'))
 
 # Deepgram Configuration
 DEEPGRAM_API_KEY = os.getenv('DEEPGRAM_API_KEY')
+DEEPGRAM_BASE_URL = os.getenv('DEEPGRAM_BASE_URL', 'https://api.deepgram.com/v1')
+DEEPGRAM_READ_TIMEOUT = float(os.getenv('DEEPGRAM_READ_TIMEOUT', '60'))
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tts_cache'))
@@ -0,0 +1,137 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class SQLiteConnectionPool:
+    """Bounded checkout/checkin pool of configured SQLite connections.
+
+    Connections are created lazily up to `max_size`. Each one is tuned once
+    when it is opened (WAL journal, NORMAL sync, page cache, busy timeout)
+    instead of on every query. Callers that find the pool exhausted wait up to
+    `checkout_timeout` seconds for a connection to be returned.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_size: int = 8,
+        busy_timeout_ms: int = 5000,
+        cache_size_kb: int = 8192,
+        checkout_timeout: float = 30.0,
+    ):
+        self.db_path = db_path
+        self.max_size = max(1, max_size)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.checkout_timeout = checkout_timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection:
+        """Open a new connection and apply the per-connection PRAGMAs."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Negative cache_size is interpreted by SQLite as KiB rather than pages
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out a connection, opening a new one while under the size limit."""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"Timed out after {self.checkout_timeout}s waiting for a database connection"
+            )
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False) -> None:
+        """Return a connection to the pool, closing it if it is no longer usable."""
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        if discard or self._closed:
+            try:
+                conn.close()
+            finally:
+                with self._lock:
+                    self._created -= 1
+            return
+
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Check out a connection for the duration of a `with` block.
+
+        The block runs as a transaction: it is committed when the block exits
+        normally and rolled back if it raises.
+        """
+        conn = self.acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close all idle connections and refuse further checkouts."""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self) -> dict:
+        """Return current pool occupancy."""
+        with self._lock:
+            created = self._created
+        idle = self._idle.qsize()
+        return {
+            'max_size': self.max_size,
+            'open': created,
+            'idle': idle,
+            'in_use': created - idle,
+        }
@@ -1,22 +1,92 @@
+import hashlib
 import sqlite3
 import json
 import os
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from config import DATABASE_PATH
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config import (
+    DATABASE_PATH,
+    DATABASE_POOL_SIZE,
+    DATABASE_BUSY_TIMEOUT_MS,
+    DATABASE_CACHE_SIZE_KB,
+    DATABASE_SESSION_FORMAT,
+    DATABASE_SNAPSHOT_FORMAT,
+)
+from database import codecs
+from database.connection_pool import SQLiteConnectionPool
+from database.migrations import run_migrations
+from services.tracing import span
+
+
+DEFAULT_OPENING_STORY = (
+    "You wake up in a mysterious place with no memory of how you got there. "
+    "The air is thick with an otherworldly energy, and three paths stretch before you, "
+    "each leading into the unknown. Your adventure begins now..."
+)
+
+DEFAULT_OPENING_CHOICES = (
+    "Take the left path through the shadowy forest",
+    "Follow the middle path toward the glowing light",
+    "Choose the right path up the rocky mountain trail",
+)
+
+DEFAULT_OPENING_IMAGE_PROMPT = (
+    "A mystical crossroads at the edge of an enchanted forest, with three diverging paths, "
+    "one leading to shadowy trees, one towards a mysterious light, and one up a rocky mountain, "
+    "fantasy digital art, cinematic lighting"
+)
+
+EMPTY_HISTORY_FINGERPRINT = hashlib.sha256(b'').hexdigest()
+
+
+def chain_history_fingerprint(previous: str, entry: Dict[str, Any]) -> str:
+    """Extend a history fingerprint with one appended choice entry.
+
+    fingerprint(n) = sha256(fingerprint(n - 1) + canonical_json(entry n)),
+    starting from EMPTY_HISTORY_FINGERPRINT, so appending a turn costs O(1).
+    """
+    serialized = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256((previous + serialized).encode('utf-8')).hexdigest()
+
+
+DEFAULT_CHARACTER_INFO = {
+    "name": "Player",
+    "traits": [],
+    "inventory": []
+}
 
 
 class DatabaseManager:
     """Manages database operations for the interactive story game."""
     
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, pool_size: int = None):
         self.db_path = db_path or DATABASE_PATH
+        self.pool = SQLiteConnectionPool(
+            self.db_path,
+            max_size=pool_size or DATABASE_POOL_SIZE,
+            busy_timeout_ms=DATABASE_BUSY_TIMEOUT_MS,
+            cache_size_kb=DATABASE_CACHE_SIZE_KB,
+        )
+        self.session_format = self._resolve_format(DATABASE_SESSION_FORMAT)
+        self.snapshot_format = self._resolve_format(DATABASE_SNAPSHOT_FORMAT)
+
+    @staticmethod
+    def _resolve_format(name: str) -> str:
+        """Fall back to JSON when a configured codec is unknown or not installed."""
+        try:
+            return codecs.get_codec(name).name
+        except ValueError as e:
+            print(f"Warning: {e}; storing JSON instead")
+            return codecs.DEFAULT_FORMAT
         
-    def get_connection(self) -> sqlite3.Connection:
-        """Get a database connection with row factory."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    @contextmanager
+    def get_connection(self) -> Iterator[sqlite3.Connection]:
+        """Check out a pooled connection as a transactional context manager."""
+        with span('db'):
+            with self.pool.connection() as conn:
+                yield conn
     
     def execute_query(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
         """Execute a SELECT query and return results."""
@@ -30,145 +100,297 @@ class DatabaseManager:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            conn.commit()
             return cursor.rowcount
     
-    def create_game_session(self, session_id: str, character_info: Dict = None, 
-                            initial_story: str = None, initial_choices: List[str] = None) -> bool:
-        """Create a new game session with optional custom starting story."""
+    def upsert_game_session(self, session_id: str, story_context: str, current_story: str,
+                            choices_history: List, current_choices: List, character_info: Dict = None,
+                            base_node_id: Optional[int] = None,
+                            history_fingerprint: Optional[str] = None) -> Optional[Tuple[str, Optional[int]]]:
+        """Insert or update a game session in a single statement.
+
+        Returns ('created' or 'updated', head story node id), or None on
+        failure. New history turns are written in the same transaction (see
+        `update_game_session` for the meaning of `base_node_id`).
+        """
         try:
-            # Use custom story or default
-            if initial_story and initial_story.strip():
-                starting_story = initial_story.strip()
-            else:
-                starting_story = ("You wake up in a mysterious place with no memory of how you got there. "
-                                "The air is thick with an otherworldly energy, and three paths stretch before you, "
-                                "each leading into the unknown. Your adventure begins now...")
-            
-            # Use provided choices or defaults
-            if initial_choices and len(initial_choices) >= 3:
-                starting_choices = initial_choices[:3]
-            else:
-                starting_choices = [
-                    "Take the left path through the shadowy forest",
-                    "Follow the middle path toward the glowing light", 
-                    "Choose the right path up the rocky mountain trail"
-                ]
-            
-            default_character = {
-                "name": "Player",
-                "traits": [],
-                "inventory": []
-            }
-            
-            character_info = character_info or default_character
-            
+            timestamp = datetime.now().isoformat()
             query = """
-                INSERT INTO game_sessions 
-                (id, story_context, current_story, choices_history, character_info, current_choices)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT INTO game_sessions
+                (id, story_context, current_story, choices_history, character_info,
+                 current_choices, history_fingerprint, head_node_id, state_format, created_at, updated_at)
+                VALUES (?, ?, ?, '[]', ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    story_context = excluded.story_context,
+                    current_story = excluded.current_story,
+                    character_info = excluded.character_info,
+                    current_choices = excluded.current_choices,
+                    history_fingerprint = excluded.history_fingerprint,
+                    head_node_id = excluded.head_node_id,
+                    state_format = excluded.state_format,
+                    updated_at = excluded.updated_at
+                RETURNING created_at
             """
-            
-            params = (
-                session_id,
-                starting_story,  # story_context
-                starting_story,  # current_story
-                json.dumps([]),  # choices_history
-                json.dumps(character_info),  # character_info
-                json.dumps(starting_choices)  # current_choices
-            )
-            
-            result = self.execute_update(query, params)
-            return result > 0
-            
+
+            with self.get_connection() as conn:
+                head_node_id = self._append_story_nodes(conn, choices_history, base_node_id, current_choices)
+                params = (
+                    session_id,
+                    story_context,
+                    current_story,
+                    codecs.encode(character_info if character_info is not None else DEFAULT_CHARACTER_INFO,
+                                  self.session_format),
+                    codecs.encode(current_choices, self.session_format),
+                    history_fingerprint,
+                    head_node_id,
+                    self.session_format,
+                    timestamp,
+                    timestamp,
+                )
+                row = conn.execute(query, params).fetchone()
+
+            # created_at is only set by the INSERT branch, so it matches this
+            # write's timestamp exactly when the row did not exist before
+            return ('created' if row and row['created_at'] == timestamp else 'updated'), head_node_id
+
         except Exception as e:
-            print(f"Error creating game session: {e}")
-            return False
-    
+            print(f"Error upserting game session: {e}")
+            return None
+
+    def _append_story_nodes(self, conn: sqlite3.Connection, choices_history: List,
+                            base_node_id: Optional[int], current_choices: Optional[List] = None) -> Optional[int]:
+        """Store the turns of `choices_history` past `base_node_id` and return the head node.
+
+        `base_node_id` is the node whose path is a stored prefix of the
+        history (None for the root); only the turns after it are written,
+        so appending one turn is a single statement. Nodes are content
+        addressed by their history fingerprint, so turns that already exist
+        (a shared prefix, a retried write) resolve to the existing node.
+        The options offered after the last turn are recorded on its node.
+        """
+        depth, fingerprint, head = 0, EMPTY_HISTORY_FINGERPRINT, None
+        if base_node_id is not None:
+            row = conn.execute(
+                "SELECT depth, fingerprint FROM story_nodes WHERE id = ?", (base_node_id,)
+            ).fetchone()
+            # An unknown or deeper base cannot be a prefix; rebuild from the root
+            if row and row['depth'] <= len(choices_history):
+                depth, fingerprint, head = row['depth'], row['fingerprint'], base_node_id
+
+        new_entries = choices_history[depth:]
+        for offset, entry in enumerate(new_entries):
+            fingerprint = chain_history_fingerprint(fingerprint, entry)
+            is_last = offset == len(new_entries) - 1
+            head = conn.execute(
+                """
+                    INSERT INTO story_nodes
+                    (parent_id, depth, choice, story_segment, timestamp, fingerprint, choices)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(fingerprint) DO UPDATE SET
+                        choices = COALESCE(story_nodes.choices, excluded.choices)
+                    RETURNING id
+                """,
+                (
+                    head,
+                    depth + offset + 1,
+                    entry.get('choice', ''),
+                    entry.get('story_segment', ''),
+                    entry.get('timestamp'),
+                    fingerprint,
+                    json.dumps(current_choices) if is_last and current_choices is not None else None,
+                ),
+            ).fetchone()[0]
+        return head
+
+    def _fetch_story_path(self, conn: sqlite3.Connection, node_id: Optional[int]) -> List[Dict]:
+        """Read the choice history ending at `node_id`, oldest turn first."""
+        if node_id is None:
+            return []
+        rows = conn.execute(
+            """
+                WITH RECURSIVE path(id, parent_id, depth, choice, story_segment, timestamp) AS (
+                    SELECT id, parent_id, depth, choice, story_segment, timestamp
+                    FROM story_nodes WHERE id = ?
+                    UNION ALL
+                    SELECT node.id, node.parent_id, node.depth, node.choice, node.story_segment, node.timestamp
+                    FROM story_nodes AS node JOIN path ON node.id = path.parent_id
+                )
+                SELECT choice, story_segment, timestamp FROM path ORDER BY depth
+            """,
+            (node_id,),
+        ).fetchall()
+        return [
+            {
+                'choice': row['choice'],
+                'story_segment': row['story_segment'],
+                'timestamp': row['timestamp']
+            }
+            for row in rows
+        ]
+
+    def get_story_ancestor(self, node_id: int, depth: int) -> Optional[Dict]:
+        """Return the node at `depth` on the path ending at `node_id`.
+
+        Walks parent pointers from `node_id`, so the cost is the distance
+        between the two nodes, not the length of the story.
+        """
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute(
+                    """
+                        WITH RECURSIVE up(id, parent_id, depth) AS (
+                            SELECT id, parent_id, depth FROM story_nodes WHERE id = ?
+                            UNION ALL
+                            SELECT node.id, node.parent_id, node.depth
+                            FROM story_nodes AS node JOIN up ON node.id = up.parent_id
+                            WHERE up.depth > ?
+                        )
+                        SELECT node.* FROM up JOIN story_nodes AS node ON node.id = up.id
+                        WHERE up.depth = ?
+                    """,
+                    (node_id, depth, depth),
+                ).fetchone()
+            if not row:
+                return None
+            return {
+                'id': row['id'],
+                'parent_id': row['parent_id'],
+                'depth': row['depth'],
+                'choice': row['choice'],
+                'story_segment': row['story_segment'],
+                'timestamp': row['timestamp'],
+                'fingerprint': row['fingerprint'],
+                'choices': json.loads(row['choices']) if row['choices'] else None
+            }
+
+        except Exception as e:
+            print(f"Error retrieving story node: {e}")
+            return None
+
     def get_game_session(self, session_id: str) -> Optional[Dict]:
         """Retrieve a game session by ID."""
         try:
-            query = "SELECT * FROM game_sessions WHERE id = ?"
-            results = self.execute_query(query, (session_id,))
-            
-            if results:
-                row = results[0]
-                return {
-                    'id': row['id'],
-                    'story_context': row['story_context'],
-                    'current_story': row['current_story'],
-                    'choices_history': json.loads(row['choices_history']),
-                    'character_info': json.loads(row['character_info']),
-                    'current_choices': json.loads(row['current_choices']),
-                    'created_at': row['created_at'],
-                    'updated_at': row['updated_at']
-                }
-            return None
+            with self.get_connection() as conn:
+                row = conn.execute(
+                    "SELECT * FROM game_sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                if not row:
+                    return None
+                choices_history = self._fetch_story_path(conn, row['head_node_id'])
+
+            return {
+                'id': row['id'],
+                'story_context': row['story_context'],
+                'current_story': row['current_story'],
+                'choices_history': choices_history,
+                'character_info': codecs.decode(row['character_info'], row['state_format'], {}),
+                'current_choices': codecs.decode(row['current_choices'], row['state_format'], []),
+                'history_fingerprint': row['history_fingerprint'],
+                'head_node_id': row['head_node_id'],
+                'created_at': row['created_at'],
+                'updated_at': row['updated_at']
+            }
             
         except Exception as e:
             print(f"Error retrieving game session: {e}")
             return None
     
     def update_game_session(self, session_id: str, story_context: str, current_story: str, 
-                          choices_history: List, current_choices: List, character_info: Dict = None) -> bool:
-        """Update an existing game session."""
+                          choices_history: List, current_choices: List, character_info: Dict = None,
+                          base_node_id: Optional[int] = None,
+                          history_fingerprint: Optional[str] = None) -> bool:
+        """Update an existing game session.
+
+        Only the turns after `base_node_id` (the story node of an already
+        stored prefix of `choices_history`) are written. Pass None when the
+        caller does not know what is stored (e.g. a restored snapshot); the
+        history is then matched against the tree from the root.
+        """
         try:
             query = """
                 UPDATE game_sessions 
-                SET story_context = ?, current_story = ?, choices_history = ?, 
-                    current_choices = ?, character_info = ?, updated_at = ?
+                SET story_context = ?, current_story = ?, 
+                    current_choices = ?, character_info = ?, history_fingerprint = ?, head_node_id = ?,
+                    state_format = ?, updated_at = ?
                 WHERE id = ?
             """
             
-            params = (
-                story_context,
-                current_story,
-                json.dumps(choices_history),
-                json.dumps(current_choices),
-                json.dumps(character_info) if character_info is not None else json.dumps({"name": "Player", "traits": [], "inventory": []}),
-                datetime.now().isoformat(),
-                session_id
-            )
-            
-            result = self.execute_update(query, params)
+            with self.get_connection() as conn:
+                head_node_id = self._append_story_nodes(conn, choices_history, base_node_id, current_choices)
+                params = (
+                    story_context,
+                    current_story,
+                    codecs.encode(current_choices, self.session_format),
+                    codecs.encode(character_info if character_info is not None else DEFAULT_CHARACTER_INFO,
+                                  self.session_format),
+                    history_fingerprint,
+                    head_node_id,
+                    self.session_format,
+                    datetime.now().isoformat(),
+                    session_id
+                )
+                result = conn.execute(query, params).rowcount
             return result > 0
             
         except Exception as e:
             print(f"Error updating game session: {e}")
             return False
     
-    def save_game(self, save_id: str, session_id: str, save_name: str, game_state: Dict) -> bool:
-        """Save a game state."""
+    def save_game(self, save_id: str, session_id: str, save_name: str, game_state: Dict,
+                  base_node_id: Optional[int] = None) -> Optional[int]:
+        """Save a game state as a pointer into the story tree.
+
+        The history is stored as story nodes (only the turns past
+        `base_node_id` are written, see `update_game_session`) and the save
+        keeps the head node plus the other fields, so saving a fully stored
+        session costs the same at any story length. Returns the head node
+        id (0 for an empty history), or None on failure.
+        """
         try:
             query = """
-                INSERT OR REPLACE INTO saved_games (id, session_id, save_name, game_state)
-                VALUES (?, ?, ?, ?)
+                INSERT OR REPLACE INTO saved_games
+                (id, session_id, save_name, game_state, game_state_format, head_node_id)
+                VALUES (?, ?, ?, ?, ?, ?)
             """
-            
-            params = (save_id, session_id, save_name, json.dumps(game_state))
-            result = self.execute_update(query, params)
-            return result > 0
+
+            with self.get_connection() as conn:
+                head_node_id = self._append_story_nodes(
+                    conn, game_state.get('choices_history', []), base_node_id, game_state.get('current_choices')
+                )
+                fields = {key: value for key, value in game_state.items() if key != 'choices_history'}
+                params = (
+                    save_id, session_id, save_name,
+                    codecs.encode(fields, self.snapshot_format), self.snapshot_format, head_node_id
+                )
+                conn.execute(query, params)
+            return head_node_id or 0
             
         except Exception as e:
             print(f"Error saving game: {e}")
-            return False
+            return None
     
     def load_game(self, save_id: str) -> Optional[Dict]:
-        """Load a saved game state."""
+        """Load a saved game state, rebuilding its history from the story tree.
+
+        `head_node_id` in the result is the story node of the returned
+        history (None for an empty history).
+        """
         try:
-            query = "SELECT * FROM saved_games WHERE id = ?"
-            results = self.execute_query(query, (save_id,))
-            
-            if results:
-                row = results[0]
-                return {
-                    'id': row['id'],
-                    'session_id': row['session_id'],
-                    'save_name': row['save_name'],
-                    'game_state': json.loads(row['game_state']),
-                    'saved_at': row['saved_at']
-                }
-            return None
+            with self.get_connection() as conn:
+                row = conn.execute("SELECT * FROM saved_games WHERE id = ?", (save_id,)).fetchone()
+                if not row:
+                    return None
+                game_state = codecs.decode(row['game_state'], row['game_state_format'])
+                if row['head_node_id'] is not None:
+                    game_state['choices_history'] = self._fetch_story_path(conn, row['head_node_id'])
+
+            return {
+                'id': row['id'],
+                'session_id': row['session_id'],
+                'save_name': row['save_name'],
+                'game_state': game_state,
+                'head_node_id': row['head_node_id'],
+                'saved_at': row['saved_at']
+            }
             
         except Exception as e:
             print(f"Error loading game: {e}")
@@ -195,7 +417,7 @@ class DatabaseManager:
         """List all game sessions ordered by most recent."""
         try:
             query = """
-                SELECT id, character_info, current_story, created_at, updated_at 
+                SELECT id, character_info, state_format, current_story, created_at, updated_at 
                 FROM game_sessions 
                 ORDER BY updated_at DESC 
                 LIMIT ?
@@ -204,7 +426,7 @@ class DatabaseManager:
             
             sessions = []
             for row in results:
-                char_info = json.loads(row['character_info']) if row['character_info'] else {}
+                char_info = codecs.decode(row['character_info'], row['state_format'], {})
                 sessions.append({
                     'id': row['id'],
                     'character_name': char_info.get('name', 'Player'),
@@ -357,11 +579,178 @@ class DatabaseManager:
             print(f"Error upserting personality profile: {e}")
             return False
 
+    def get_opening_tree(self) -> List[Dict]:
+        """Return every node of the precomputed opening tree."""
+        try:
+            results = self.execute_query(
+                "SELECT path, story, choices, image_prompt, image_url FROM opening_tree ORDER BY path"
+            )
+            return [
+                {
+                    'path': row['path'],
+                    'story': row['story'],
+                    'choices': json.loads(row['choices']),
+                    'image_prompt': row['image_prompt'],
+                    'image_url': row['image_url'],
+                }
+                for row in results
+            ]
+
+        except Exception as e:
+            print(f"Error loading opening tree: {e}")
+            return []
+
+    def replace_opening_tree(self, nodes: List[Dict]) -> bool:
+        """Replace the whole opening tree in one transaction."""
+        try:
+            with self.get_connection() as conn:
+                conn.execute("DELETE FROM opening_tree")
+                conn.executemany(
+                    """
+                        INSERT INTO opening_tree (path, story, choices, image_prompt, image_url)
+                        VALUES (?, ?, ?, ?, ?)
+                    """,
+                    [
+                        (
+                            node['path'],
+                            node['story'],
+                            json.dumps(node['choices']),
+                            node.get('image_prompt'),
+                            node.get('image_url'),
+                        )
+                        for node in nodes
+                    ],
+                )
+            return True
+
+        except Exception as e:
+            print(f"Error replacing opening tree: {e}")
+            return False
+
+    def try_acquire_session_lock(self, session_id: str, owner: str, lease_seconds: float) -> bool:
+        """Take the session's lock lease unless another owner holds an unexpired one."""
+        try:
+            now = time.time()
+            query = """
+                INSERT INTO session_locks (session_id, owner, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    owner = excluded.owner,
+                    expires_at = excluded.expires_at
+                WHERE session_locks.expires_at < ?
+            """
+            return self.execute_update(query, (session_id, owner, now + lease_seconds, now)) > 0
+
+        except Exception as e:
+            print(f"Error acquiring session lock: {e}")
+            return False
+
+    def release_session_lock(self, session_id: str, owner: str) -> bool:
+        """Release the session's lock lease if `owner` still holds it."""
+        try:
+            query = "DELETE FROM session_locks WHERE session_id = ? AND owner = ?"
+            return self.execute_update(query, (session_id, owner)) > 0
+
+        except Exception as e:
+            print(f"Error releasing session lock: {e}")
+            return False
+
+    def get_idempotency_record(self, session_id: str, idempotency_key: str, ttl_seconds: float) -> Optional[Dict]:
+        """Return the stored response for an Idempotency-Key, if it has not expired."""
+        try:
+            query = """
+                SELECT request_hash, status_code, response FROM idempotency_keys
+                WHERE session_id = ? AND idempotency_key = ? AND created_at >= ?
+            """
+            results = self.execute_query(query, (session_id, idempotency_key, time.time() - ttl_seconds))
+            if results:
+                row = results[0]
+                return {
+                    'request_hash': row['request_hash'],
+                    'status_code': row['status_code'],
+                    'response': json.loads(row['response']),
+                }
+            return None
+
+        except Exception as e:
+            print(f"Error loading idempotency record: {e}")
+            return None
+
+    def store_idempotency_record(self, session_id: str, idempotency_key: str, request_hash: str,
+                                 status_code: int, response: Dict, ttl_seconds: float) -> bool:
+        """Store a response for an Idempotency-Key and drop expired records."""
+        try:
+            now = time.time()
+            with self.get_connection() as conn:
+                conn.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (now - ttl_seconds,))
+                conn.execute(
+                    """
+                        INSERT OR REPLACE INTO idempotency_keys
+                        (session_id, idempotency_key, request_hash, status_code, response, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (session_id, idempotency_key, request_hash, status_code, json.dumps(response), now),
+                )
+            return True
+
+        except Exception as e:
+            print(f"Error storing idempotency record: {e}")
+            return False
+
+    def get_llm_cache_entry(self, cache_key: str, ttl_seconds: float) -> Optional[Dict]:
+        """Return a cached LLM response younger than the TTL and mark it as recently used."""
+        try:
+            now = time.time()
+            with self.get_connection() as conn:
+                row = conn.execute(
+                    "SELECT response FROM llm_response_cache WHERE cache_key = ? AND created_at >= ?",
+                    (cache_key, now - ttl_seconds),
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE llm_response_cache SET last_used_at = ? WHERE cache_key = ?",
+                    (now, cache_key),
+                )
+            return json.loads(row['response'])
+
+        except Exception as e:
+            print(f"Error loading cached LLM response: {e}")
+            return None
+
+    def store_llm_cache_entry(self, cache_key: str, model: str, response: Dict,
+                              ttl_seconds: float, max_entries: int) -> bool:
+        """Store an LLM response, then drop expired and least recently used entries."""
+        try:
+            now = time.time()
+            with self.get_connection() as conn:
+                conn.execute(
+                    """
+                        INSERT OR REPLACE INTO llm_response_cache
+                        (cache_key, model, response, created_at, last_used_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (cache_key, model, json.dumps(response), now, now),
+                )
+                conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?", (now - ttl_seconds,))
+                conn.execute(
+                    """
+                        DELETE FROM llm_response_cache WHERE cache_key IN (
+                            SELECT cache_key FROM llm_response_cache
+                            ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                        )
+                    """,
+                    (max_entries,),
+                )
+            return True
+
+        except Exception as e:
+            print(f"Error storing cached LLM response: {e}")
+            return False
+
 
 def init_database():
     """Initialize the database with required tables."""
-    db_manager = DatabaseManager()
-    
     # Read and execute the SQL initialization script
     script_dir = os.path.dirname(os.path.abspath(__file__))
     sql_file = os.path.join(script_dir, 'init.sql')
@@ -372,7 +761,7 @@ def init_database():
         
         with db_manager.get_connection() as conn:
             conn.executescript(sql_script)
-            conn.commit()
+            run_migrations(conn)
         
         print("Database initialized successfully")
         return True
@@ -4,18 +4,52 @@ CREATE TABLE IF NOT EXISTS game_sessions (
     id TEXT PRIMARY KEY,
     story_context TEXT NOT NULL DEFAULT '',
     current_story TEXT NOT NULL DEFAULT '',
-    choices_history TEXT NOT NULL DEFAULT '[]', -- JSON array
-    character_info TEXT NOT NULL DEFAULT '{}',   -- JSON object
-    current_choices TEXT NOT NULL DEFAULT '[]', -- JSON array
+    choices_history TEXT NOT NULL DEFAULT '[]', -- legacy JSON array, migrated to session_choices
+    character_info TEXT NOT NULL DEFAULT '{}',   -- object, encoded as state_format
+    current_choices TEXT NOT NULL DEFAULT '[]', -- array, encoded as state_format
+    history_fingerprint TEXT,                   -- hash chain over the choice history
+    head_node_id INTEGER,                       -- story node of the latest turn (NULL before the first)
+    state_format TEXT NOT NULL DEFAULT 'json',  -- codec of the encoded columns
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Legacy per-session turn rows, migrated to story_nodes
+CREATE TABLE IF NOT EXISTS session_choices (
+    session_id TEXT NOT NULL,
+    turn_index INTEGER NOT NULL,
+    choice TEXT NOT NULL,
+    story_segment TEXT NOT NULL DEFAULT '',
+    timestamp TEXT,
+    PRIMARY KEY (session_id, turn_index),
+    FOREIGN KEY (session_id) REFERENCES game_sessions (id)
+) WITHOUT ROWID;
+
+-- One row per turn, shared by every session and save whose history passes
+-- through it; a history is the path from its head node up to the root.
+-- fingerprint is the history fingerprint of that path, so an identical
+-- history always resolves to the same node
+CREATE TABLE IF NOT EXISTS story_nodes (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER,      -- NULL for a first turn
+    depth INTEGER NOT NULL, -- 1 for a first turn
+    choice TEXT NOT NULL,
+    story_segment TEXT NOT NULL DEFAULT '',
+    timestamp TEXT,
+    fingerprint TEXT NOT NULL UNIQUE,
+    choices TEXT,           -- JSON array offered after this turn, NULL if unknown
+    FOREIGN KEY (parent_id) REFERENCES story_nodes (id)
+);
+
 CREATE TABLE IF NOT EXISTS saved_games (
     id TEXT PRIMARY KEY,
     session_id TEXT NOT NULL,
     save_name TEXT NOT NULL,
-    game_state TEXT NOT NULL, -- JSON
+    game_state TEXT NOT NULL, -- encoded as game_state_format
+    game_state_format TEXT NOT NULL DEFAULT 'json',
+    history_turns INTEGER, -- legacy, migrated to head_node_id
+    -- game_state omits choices_history, which is the path ending at this node
+    head_node_id INTEGER,
     saved_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (session_id) REFERENCES game_sessions (id)
 );
@@ -38,9 +72,52 @@ CREATE TABLE IF NOT EXISTS personality_profiles (
     FOREIGN KEY (session_id) REFERENCES game_sessions (id)
 );
 
+-- Precomputed opening turns shared by every default start; path is the
+-- dot-separated choice indexes leading to the node ('' is the opening)
+CREATE TABLE IF NOT EXISTS opening_tree (
+    path TEXT PRIMARY KEY,
+    story TEXT NOT NULL,
+    choices TEXT NOT NULL DEFAULT '[]', -- JSON array
+    image_prompt TEXT,
+    image_url TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+-- Cross-process session locks (SESSION_LOCK_BACKEND=sqlite); a lease whose
+-- expires_at (unix time) has passed may be taken over
+CREATE TABLE IF NOT EXISTS session_locks (
+    session_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
+-- Stored responses replayed for retried requests with the same Idempotency-Key
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    session_id TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    response TEXT NOT NULL, -- JSON
+    created_at REAL NOT NULL, -- unix time
+    PRIMARY KEY (session_id, idempotency_key)
+) WITHOUT ROWID;
+
+-- Parsed LLM responses keyed by a hash of model + system prompt + prompt;
+-- times are unix time, last_used_at drives LRU eviction
+CREATE TABLE IF NOT EXISTS llm_response_cache (
+    cache_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL, -- JSON
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+) WITHOUT ROWID;
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_game_sessions_created_at ON game_sessions(created_at);
 CREATE INDEX IF NOT EXISTS idx_saved_games_session_id ON saved_games(session_id);
 CREATE INDEX IF NOT EXISTS idx_saved_games_saved_at ON saved_games(saved_at);
 CREATE INDEX IF NOT EXISTS idx_personality_profiles_status ON personality_profiles(status);
 CREATE INDEX IF NOT EXISTS idx_personality_profiles_updated_at ON personality_profiles(updated_at);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys(created_at);
+CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used_at ON llm_response_cache(last_used_at);
+CREATE INDEX IF NOT EXISTS idx_llm_response_cache_created_at ON llm_response_cache(created_at);
@@ -0,0 +1,232 @@
+"""Versioned data migrations applied after `init.sql`.
+
+`init.sql` only creates missing tables and indexes. Changes that have to
+rewrite existing rows live here and are tracked with SQLite's `user_version`
+pragma so each one runs exactly once per database file.
+"""
+
+import hashlib
+import json
+import sqlite3
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database import codecs
+
+
+def _split_choices_history(conn: sqlite3.Connection) -> None:
+    """Move `game_sessions.choices_history` blobs into `session_choices` rows."""
+    rows = conn.execute(
+        "SELECT id, choices_history FROM game_sessions "
+        "WHERE choices_history IS NOT NULL AND choices_history NOT IN ('', '[]')"
+    ).fetchall()
+
+    for session_id, blob in rows:
+        try:
+            history = json.loads(blob)
+        except (TypeError, ValueError) as e:
+            print(f"Skipping unreadable choice history for session {session_id}: {e}")
+            continue
+        if not isinstance(history, list):
+            continue
+
+        conn.executemany(
+            """
+                INSERT OR IGNORE INTO session_choices
+                (session_id, turn_index, choice, story_segment, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    session_id,
+                    turn_index,
+                    entry.get('choice', ''),
+                    entry.get('story_segment', ''),
+                    entry.get('timestamp'),
+                )
+                for turn_index, entry in enumerate(history)
+                if isinstance(entry, dict)
+            ],
+        )
+        conn.execute("UPDATE game_sessions SET choices_history = '[]' WHERE id = ?", (session_id,))
+
+
+def _add_history_fingerprint(conn: sqlite3.Connection) -> None:
+    """Add `game_sessions.history_fingerprint` and backfill the hash chain.
+
+    Mirrors `database.db_manager.chain_history_fingerprint`; it is duplicated
+    here so migrations never import application models. Personality profiles
+    store the fingerprint they were analyzed for, so profiles matching the
+    previous flat hash of the whole history are moved to the chained value
+    and stay fresh.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(game_sessions)")}
+    if 'history_fingerprint' not in columns:
+        conn.execute("ALTER TABLE game_sessions ADD COLUMN history_fingerprint TEXT")
+
+    session_ids = [row[0] for row in conn.execute("SELECT id FROM game_sessions")]
+    for session_id in session_ids:
+        fingerprint = hashlib.sha256(b'').hexdigest()
+        rows = conn.execute(
+            """
+                SELECT choice, story_segment, timestamp FROM session_choices
+                WHERE session_id = ? ORDER BY turn_index
+            """,
+            (session_id,),
+        )
+        history = []
+        for choice, story_segment, timestamp in rows:
+            entry = {'choice': choice, 'story_segment': story_segment, 'timestamp': timestamp}
+            history.append(entry)
+            serialized = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+            fingerprint = hashlib.sha256((fingerprint + serialized).encode('utf-8')).hexdigest()
+        conn.execute(
+            "UPDATE game_sessions SET history_fingerprint = ? WHERE id = ?",
+            (fingerprint, session_id),
+        )
+
+        flat = json.dumps(history, sort_keys=True, separators=(',', ':'))
+        conn.execute(
+            "UPDATE personality_profiles SET history_fingerprint = ? "
+            "WHERE session_id = ? AND history_fingerprint = ?",
+            (fingerprint, session_id, hashlib.sha256(flat.encode('utf-8')).hexdigest()),
+        )
+
+
+def _add_storage_formats(conn: sqlite3.Connection) -> None:
+    """Add the per-row codec tags; existing rows keep their JSON encoding."""
+    for table, column in (('game_sessions', 'state_format'), ('saved_games', 'game_state_format')):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT NOT NULL DEFAULT 'json'")
+
+
+def _add_save_history_turns(conn: sqlite3.Connection) -> None:
+    """Add `saved_games.history_turns`; existing saves stay full snapshots (NULL)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(saved_games)")}
+    if 'history_turns' not in columns:
+        conn.execute("ALTER TABLE saved_games ADD COLUMN history_turns INTEGER")
+
+
+def _insert_story_path(conn: sqlite3.Connection, history: List[Dict],
+                       choices: Optional[List] = None) -> Optional[int]:
+    """Insert `history` as story nodes and return the id of the last one.
+
+    Mirrors `DatabaseManager._append_story_nodes` from the root.
+    """
+    fingerprint, head = hashlib.sha256(b'').hexdigest(), None
+    for depth, entry in enumerate(history, start=1):
+        serialized = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+        fingerprint = hashlib.sha256((fingerprint + serialized).encode('utf-8')).hexdigest()
+        head = conn.execute(
+            """
+                INSERT INTO story_nodes
+                (parent_id, depth, choice, story_segment, timestamp, fingerprint, choices)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(fingerprint) DO UPDATE SET
+                    choices = COALESCE(story_nodes.choices, excluded.choices)
+                RETURNING id
+            """,
+            (
+                head,
+                depth,
+                entry.get('choice', ''),
+                entry.get('story_segment', ''),
+                entry.get('timestamp'),
+                fingerprint,
+                json.dumps(choices) if depth == len(history) and choices is not None else None,
+            ),
+        ).fetchone()[0]
+    return head
+
+
+def _build_story_tree(conn: sqlite3.Connection) -> None:
+    """Move session histories and saves onto shared `story_nodes`.
+
+    Each session's `session_choices` rows become a path of nodes ending at
+    its `head_node_id`. Delta saves point at the node of their last turn;
+    full snapshots have their history moved into nodes as well, so every
+    save becomes a pointer. The emptied `session_choices` table is kept.
+    """
+    for table in ('game_sessions', 'saved_games'):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if 'head_node_id' not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN head_node_id INTEGER")
+
+    paths: Dict[str, List[int]] = {}
+    sessions = conn.execute("SELECT id, current_choices, state_format FROM game_sessions").fetchall()
+    for session_id, current_choices, state_format in sessions:
+        history = [
+            {'choice': choice, 'story_segment': story_segment, 'timestamp': timestamp}
+            for choice, story_segment, timestamp in conn.execute(
+                """
+                    SELECT choice, story_segment, timestamp FROM session_choices
+                    WHERE session_id = ? ORDER BY turn_index
+                """,
+                (session_id,),
+            )
+        ]
+        try:
+            choices = codecs.decode(current_choices, state_format)
+        except Exception:
+            choices = None
+        head = _insert_story_path(conn, history, choices)
+        conn.execute("UPDATE game_sessions SET head_node_id = ? WHERE id = ?", (head, session_id))
+
+        # Node ids along the path, for the delta saves of this session
+        path: List[int] = []
+        node_id = head
+        while node_id is not None:
+            path.append(node_id)
+            node_id = conn.execute("SELECT parent_id FROM story_nodes WHERE id = ?", (node_id,)).fetchone()[0]
+        paths[session_id] = path[::-1]
+
+    saves = conn.execute(
+        "SELECT id, session_id, game_state, game_state_format, history_turns FROM saved_games"
+    ).fetchall()
+    for save_id, session_id, blob, state_format, history_turns in saves:
+        if history_turns is not None:
+            path = paths.get(session_id, [])
+            head = path[history_turns - 1] if 0 < history_turns <= len(path) else None
+            conn.execute("UPDATE saved_games SET head_node_id = ? WHERE id = ?", (head, save_id))
+            continue
+
+        try:
+            game_state = codecs.decode(blob, state_format)
+        except Exception as e:
+            print(f"Skipping unreadable saved game {save_id}: {e}")
+            continue
+        history = game_state.pop('choices_history', None) if isinstance(game_state, dict) else None
+        if not isinstance(history, list) or not all(isinstance(entry, dict) for entry in history):
+            continue
+        head = _insert_story_path(conn, history, game_state.get('current_choices'))
+        conn.execute(
+            "UPDATE saved_games SET game_state = ?, head_node_id = ? WHERE id = ?",
+            (codecs.encode(game_state, state_format or codecs.DEFAULT_FORMAT), head, save_id),
+        )
+
+    conn.execute("DELETE FROM session_choices")
+
+
+# (version, migration) pairs in the order they must be applied
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _split_choices_history),
+    (2, _add_history_fingerprint),
+    (3, _add_storage_formats),
+    (4, _add_save_history_turns),
+    (5, _build_story_tree),
+]
+
+
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations and return the resulting schema version."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        migration(conn)
+        # PRAGMA does not accept bound parameters
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+        conn.commit()
+        print(f"Applied database migration {version}: {migration.__name__}")
+        current = version
+    return current
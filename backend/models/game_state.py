@@ -1,12 +1,82 @@
 import uuid
-import json
-import hashlib
+import copy
 from datetime import datetime
 from typing import Dict, List, Optional, Any
-from database.db_manager import db_manager
+from database.db_manager import (
+    db_manager,
+    chain_history_fingerprint,
+    DEFAULT_OPENING_STORY,
+    DEFAULT_OPENING_CHOICES,
+    EMPTY_HISTORY_FINGERPRINT,
+)
+from models.session_cache import session_cache
+from services.metrics import timed
 from config import MAX_CONTEXT_LENGTH
 
 
+def trim_context(full_context: str, max_length: int) -> str:
+    """Trim story text to `max_length`, preferring sentence boundaries from the end."""
+    if len(full_context) <= max_length:
+        return full_context
+
+    sentences = full_context.split('. ')
+    trimmed_story = ""
+    for sentence in reversed(sentences):
+        test_story = (sentence + '. ' + trimmed_story).strip()
+        if len(test_story) <= max_length:
+            trimmed_story = test_story
+        else:
+            break
+    return trimmed_story.strip() if trimmed_story else full_context[-max_length:]
+
+
+class RollingContext:
+    """Bounded tail of the space-joined story segments of a choice history.
+
+    Only the last `2 * max_length` characters (plus slack) are retained, which
+    is more than `trim_context` can ever keep, so trimming the tail gives the
+    same result as trimming the full concatenation. Instances are immutable:
+    `extend` returns a new object, which keeps cloned GameStates independent.
+    """
+
+    SLACK = 64
+
+    def __init__(self, max_length: int, text: str = "", turns: int = 0,
+                 truncated: bool = False, last_entry: Optional[Dict] = None):
+        self.max_length = max_length
+        self.capacity = 2 * max_length + self.SLACK
+        self.text = text
+        self.turns = turns
+        self.truncated = truncated
+        self.last_entry = last_entry
+
+    def is_prefix_of(self, history: List[Dict], max_length: int) -> bool:
+        """Return whether this tail was built from the start of `history`."""
+        if max_length != self.max_length or self.turns > len(history):
+            return False
+        # History entries are never replaced in place, so identity of the last
+        # folded entry detects a swapped or rewritten history list
+        return self.turns == 0 or history[self.turns - 1] is self.last_entry
+
+    def extend(self, history: List[Dict]) -> 'RollingContext':
+        """Fold the entries of `history` past `turns` into a new tail."""
+        if self.turns == len(history):
+            return self
+
+        text = self.text
+        truncated = self.truncated
+        for entry in history[self.turns:]:
+            segment = entry.get('story_segment', '')
+            if not segment:
+                continue
+            text = f"{text} {segment}" if text else segment
+            if len(text) > self.capacity:
+                text = text[-self.capacity:]
+                truncated = True
+
+        return RollingContext(self.max_length, text, len(history), truncated, history[-1])
+
+
 class GameState:
     """Manages the state of an interactive story game session."""
     
@@ -23,6 +93,15 @@ class GameState:
         self.current_choices = kwargs.get('current_choices', [])
         self.created_at = kwargs.get('created_at', datetime.now().isoformat())
         self.updated_at = kwargs.get('updated_at', datetime.now().isoformat())
+        self.history_fingerprint = kwargs.get('history_fingerprint')
+        # History length the stored fingerprint was computed for; a mismatch
+        # (e.g. legacy rows or snapshots without one) forces a full recompute
+        self._fingerprint_turns = len(self.choices_history) if self.history_fingerprint else -1
+        # Story node whose path is the stored prefix of the history; None
+        # means nothing is known to be stored, so the next save matches the
+        # history against the story tree from the root.
+        self._history_node_id: Optional[int] = None
+        self._rolling_context: Optional['RollingContext'] = None
     
     @staticmethod
     def generate_session_id() -> str:
@@ -43,10 +122,24 @@ class GameState:
             'choices_history': self.choices_history,
             'character_info': self.character_info,
             'current_choices': self.current_choices,
+            'history_fingerprint': self.get_history_fingerprint(),
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
     
+    def clone(self) -> 'GameState':
+        """Return an independent copy that can be mutated without touching this one.
+
+        History entries are never modified in place, so the history list is
+        copied shallowly; character info is small and mutated in place, so it
+        is deep-copied.
+        """
+        clone = copy.copy(self)
+        clone.choices_history = list(self.choices_history)
+        clone.current_choices = list(self.current_choices)
+        clone.character_info = copy.deepcopy(self.character_info)
+        return clone
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'GameState':
         """Create a GameState instance from a dictionary."""
@@ -61,55 +154,91 @@ class GameState:
                 "inventory": []
             }),
             current_choices=data.get('current_choices', []),
+            history_fingerprint=data.get('history_fingerprint'),
             created_at=data.get('created_at'),
             updated_at=data.get('updated_at')
         )
     
-    def save_to_database(self, initial_story: str = None, initial_choices: list = None) -> bool:
-        """Save the current game state to the database."""
+    @timed('save_to_database')
+    def save_to_database(self, initial_story: str = None, initial_choices: list = None) -> Optional[str]:
+        """Save the current game state to the database with a single upsert.
+
+        A state that has no story yet (a freshly started session) is first
+        given its opening, using the optional custom story and choices.
+        Returns 'created' or 'updated', or None if the save failed.
+        """
         try:
-            # Check if session exists
-            existing_session = db_manager.get_game_session(self.session_id)
-            
-            if existing_session:
-                # Update existing session
-                return db_manager.update_game_session(
-                    self.session_id,
-                    self.story_context,
-                    self.current_story,
-                    self.choices_history,
-                    self.current_choices,
-                    self.character_info
-                )
+            if not self.current_story and not self.choices_history:
+                self.apply_opening(initial_story, initial_choices)
+
+            result = db_manager.upsert_game_session(
+                self.session_id,
+                self.story_context,
+                self.current_story,
+                self.choices_history,
+                self.current_choices,
+                self.character_info,
+                base_node_id=self._history_node_id,
+                history_fingerprint=self.get_history_fingerprint()
+            )
+            if result:
+                result, self._history_node_id = result
+                # Write-through so the next load is served from memory
+                session_cache.put(self.session_id, self.clone())
             else:
-                # Create new session (with optional custom story)
-                return db_manager.create_game_session(
-                    self.session_id, 
-                    self.character_info,
-                    initial_story=initial_story,
-                    initial_choices=initial_choices
-                )
+                session_cache.invalidate(self.session_id)
+            return result
                 
         except Exception as e:
             print(f"Error saving game state to database: {e}")
-            return False
+            session_cache.invalidate(self.session_id)
+            return None
+
+    def apply_opening(self, initial_story: str = None, initial_choices: list = None):
+        """Set the opening story and choices, falling back to the default start."""
+        if initial_story and initial_story.strip():
+            starting_story = initial_story.strip()
+        else:
+            starting_story = DEFAULT_OPENING_STORY
+
+        if initial_choices and len(initial_choices) >= 3:
+            starting_choices = list(initial_choices[:3])
+        else:
+            starting_choices = list(DEFAULT_OPENING_CHOICES)
+
+        self.story_context = starting_story
+        self.current_story = starting_story
+        self.current_choices = starting_choices
     
     @classmethod
-    def load_from_database(cls, session_id: str) -> Optional['GameState']:
-        """Load a game state from the database."""
+    @timed('load_from_database')
+    def load_from_database(cls, session_id: str, use_cache: bool = True) -> Optional['GameState']:
+        """Load a game state, serving hot sessions from the in-process cache.
+
+        `use_cache=False` always reads the database (and refreshes the cache),
+        for callers that must see writes made by other processes.
+        """
+        cached = session_cache.get(session_id) if use_cache else None
+        if cached is not None:
+            return cached.clone()
+
         try:
             session_data = db_manager.get_game_session(session_id)
             if session_data:
-                return cls.from_dict({
+                game_state = cls.from_dict({
                     'session_id': session_data['id'],
                     'story_context': session_data['story_context'],
                     'current_story': session_data['current_story'],
                     'choices_history': session_data['choices_history'],
                     'character_info': session_data['character_info'],
                     'current_choices': session_data['current_choices'],
+                    'history_fingerprint': session_data.get('history_fingerprint'),
                     'created_at': session_data['created_at'],
                     'updated_at': session_data['updated_at']
                 })
+                game_state._history_node_id = session_data.get('head_node_id')
+                session_cache.put(session_id, game_state.clone())
+                return game_state
             return None
             
         except Exception as e:
@@ -117,13 +246,20 @@ class GameState:
             return None
     
     def add_choice_to_history(self, choice: str, story_segment: str):
-        """Add a player choice and resulting story to the history."""
+        """Add a player choice and resulting story to the history.
+
+        The entry is appended as a single story node on the next
+        `save_to_database` call; earlier turns are not rewritten.
+        """
         choice_entry = {
             'choice': choice,
             'story_segment': story_segment,
             'timestamp': datetime.now().isoformat()
         }
+        previous_fingerprint = self.get_history_fingerprint()
         self.choices_history.append(choice_entry)
+        self.history_fingerprint = chain_history_fingerprint(previous_fingerprint, choice_entry)
+        self._fingerprint_turns = len(self.choices_history)
         self.updated_at = datetime.now().isoformat()
         # Keep current_story aligned with the latest segment
         self.current_story = story_segment
@@ -135,38 +271,35 @@ class GameState:
         last element of `choices_history`. To avoid duplication, build context
         primarily from history segments and only include `current_story` when
         it's not already the most recent history entry (e.g., initial state).
+
+        History segments are folded into a bounded `RollingContext` tail, so
+        each turn only processes the newly appended segment instead of the
+        whole story.
         """
-        segments: List[str] = []
         if not self.choices_history:
             # Initial state: no history yet, use current_story only
-            if self.current_story:
-                segments.append(self.current_story)
-        else:
-            last_segment = self.choices_history[-1].get('story_segment', '').strip()
-            # Include current_story only if it differs from the last history segment
-            if self.current_story and self.current_story.strip() != last_segment:
-                segments.append(self.current_story)
-            # Append all history segments in order
-            for entry in self.choices_history:
-                seg = entry.get('story_segment', '')
-                if seg:
-                    segments.append(seg)
-
-        full_context = " ".join(segments).strip()
-
-        if len(full_context) > max_length:
-            # Prefer trimming on sentence boundaries from the end
-            sentences = full_context.split('. ')
-            trimmed_story = ""
-            for sentence in reversed(sentences):
-                test_story = (sentence + '. ' + trimmed_story).strip()
-                if len(test_story) <= max_length:
-                    trimmed_story = test_story
-                else:
-                    break
-            self.story_context = trimmed_story.strip() if trimmed_story else full_context[-max_length:]
-        else:
-            self.story_context = full_context
+            self.story_context = trim_context(self.current_story.strip() if self.current_story else "", max_length)
+            return
+
+        rolling = self._rolling_context
+        if rolling is None or not rolling.is_prefix_of(self.choices_history, max_length):
+            rolling = RollingContext(max_length)
+        self._rolling_context = rolling = rolling.extend(self.choices_history)
+
+        if rolling.truncated:
+            # Anything before the retained tail, including a leading
+            # current_story, can no longer influence the trimmed result
+            self.story_context = trim_context(rolling.text.rstrip(), max_length)
+            return
+
+        segments: List[str] = []
+        last_segment = self.choices_history[-1].get('story_segment', '').strip()
+        # Include current_story only if it differs from the last history segment
+        if self.current_story and self.current_story.strip() != last_segment:
+            segments.append(self.current_story)
+        if rolling.text:
+            segments.append(rolling.text)
+        self.story_context = trim_context(" ".join(segments).strip(), max_length)
     
     def update_character_trait(self, trait: str):
         """Add a character trait if it doesn't already exist."""
@@ -180,13 +313,21 @@ class GameState:
         self.updated_at = datetime.now().isoformat()
     
     def save_game(self, save_name: str) -> Optional[str]:
-        """Save the current game state with a custom name."""
+        """Save the current game state with a custom name.
+
+        The save points at the story node of the latest turn instead of
+        copying the history (see `DatabaseManager.save_game`).
+        """
         try:
             save_id = self.generate_save_id()
             game_state = self.to_dict()
             
-            success = db_manager.save_game(save_id, self.session_id, save_name, game_state)
-            return save_id if success else None
+            head_node_id = db_manager.save_game(save_id, self.session_id, save_name, game_state,
+                                                base_node_id=self._history_node_id)
+            if head_node_id is None:
+                return None
+            self._history_node_id = head_node_id or None
+            return save_id
             
         except Exception as e:
             print(f"Error saving game: {e}")
@@ -198,14 +339,52 @@ class GameState:
         try:
             saved_game = db_manager.load_game(save_id)
             if saved_game:
-                game_state = saved_game['game_state']
-                return cls.from_dict(game_state)
+                game_state = cls.from_dict(saved_game['game_state'])
+                # The restored history is already in the story tree, so saving
+                # it only moves the session's head node
+                game_state._history_node_id = saved_game.get('head_node_id')
+                return game_state
             return None
             
         except Exception as e:
             print(f"Error loading saved game: {e}")
             return None
     
+    def fork(self, turn: Optional[int] = None) -> Optional['GameState']:
+        """Return a new, unsaved session that continues this story after `turn`.
+
+        The fork shares the first `turn` history entries (all of them by
+        default) and their story nodes with this session, so saving it
+        writes no history. `current_choices` is empty when the options
+        offered at that turn were never stored. Returns None if the turn
+        cannot be found in the story tree.
+        """
+        if turn is None:
+            turn = len(self.choices_history)
+        if not 1 <= turn <= len(self.choices_history):
+            raise ValueError(f"turn must be between 1 and {len(self.choices_history)}")
+
+        if turn == len(self.choices_history):
+            node_id = self._history_node_id
+            fingerprint = self.get_history_fingerprint()
+            choices = list(self.current_choices)
+        else:
+            node = db_manager.get_story_ancestor(self._history_node_id, turn) if self._history_node_id else None
+            if node is None:
+                return None
+            node_id, fingerprint, choices = node['id'], node['fingerprint'], node['choices'] or []
+
+        forked = GameState(
+            choices_history=self.choices_history[:turn],
+            character_info=copy.deepcopy(self.character_info),
+            current_story=self.choices_history[turn - 1].get('story_segment', ''),
+            current_choices=choices,
+            history_fingerprint=fingerprint,
+        )
+        forked._history_node_id = node_id
+        forked.update_story_context()
+        return forked
+    
     def get_recent_context(self, num_choices: int = 3) -> str:
         """Get recent story context for AI prompts without duplication.
 
@@ -223,9 +402,19 @@ class GameState:
         return len(self.choices_history) > 0
 
     def get_history_fingerprint(self) -> str:
-        """Generate a stable fingerprint for the current choice history."""
-        serialized = json.dumps(self.choices_history, sort_keys=True, separators=(',', ':'))
-        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+        """Return the chained fingerprint of the current choice history.
+
+        The fingerprint is maintained by `add_choice_to_history` and persisted
+        with the session, so this only walks the history when no fingerprint
+        is known for its current length.
+        """
+        if self.history_fingerprint is None or self._fingerprint_turns != len(self.choices_history):
+            fingerprint = EMPTY_HISTORY_FINGERPRINT
+            for entry in self.choices_history:
+                fingerprint = chain_history_fingerprint(fingerprint, entry)
+            self.history_fingerprint = fingerprint
+            self._fingerprint_turns = len(self.choices_history)
+        return self.history_fingerprint
 
 
 class SavedGame:
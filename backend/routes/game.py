@@ -1,18 +1,147 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from models.game_state import GameState
 from services.ai_service import ai_service
 from services.image_service import image_service
+from services.image_jobs import image_jobs
+from services.opening_tree import opening_tree
+from services.session_locks import session_locks, SessionBusyError
+from services.singleflight import request_fingerprint
+from services.speculation import branch_speculator
 from services.personality_service import (
     personality_service,
     PersonalityAnalysisError,
     AnalysisInProgressError,
     AIAnalysisUnavailableError,
 )
-from database.db_manager import db_manager
+from database.db_manager import db_manager, DEFAULT_OPENING_IMAGE_PROMPT
+from config import CLOUDFLARE_READ_TIMEOUT, IDEMPOTENCY_TTL_SECONDS
 
 game_bp = Blueprint('game', __name__)
 
 
+def _record_turn(game_state: GameState, selected_choice: str, new_story: str, new_choices: list):
+    """Apply a generated turn to the game state and persist it."""
+    game_state.add_choice_to_history(selected_choice, new_story)
+    game_state.current_story = new_story
+    game_state.current_choices = new_choices
+    game_state.update_story_context()
+    return game_state.save_to_database()
+
+
+def _prepared_turn(game_state: GameState, selected_choice: str):
+    """Return the turn for `selected_choice` if it was generated ahead of time.
+
+    The shared opening tree is checked first, then this session's
+    speculated branches.
+    """
+    return (
+        opening_tree.next_turn(game_state, selected_choice)
+        or branch_speculator.take(game_state, selected_choice)
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _parse_choice_request(data):
+    """Validate a choice request body.
+
+    Returns (session_id, choice_index, None) on success or
+    (None, None, (error_payload, status_code)) when the request must be rejected.
+    """
+    if not data:
+        return None, None, ({
+            'success': False,
+            'error': 'No data provided'
+        }, 400)
+    
+    session_id = data.get('session_id')
+    choice_index = data.get('choice_index')
+    
+    if not session_id or choice_index is None:
+        return None, None, ({
+            'success': False,
+            'error': 'session_id and choice_index are required'
+        }, 400)
+    
+    return session_id, choice_index, None
+
+
+def _load_choice_state(session_id: str, choice_index: int):
+    """Load the session a choice applies to and resolve the chosen option.
+
+    Returns (game_state, selected_choice, None) on success or
+    (None, None, (error_payload, status_code)) when the request must be rejected.
+    """
+    # Another worker may have committed a turn since this process cached the
+    # session; appending to a stale head would silently drop that turn
+    game_state = GameState.load_from_database(session_id, use_cache=not session_locks.shared)
+    if not game_state:
+        return None, None, ({
+            'success': False,
+            'error': 'Game session not found'
+        }, 404)
+    
+    # Validate choice index
+    if choice_index < 0 or choice_index >= len(game_state.current_choices):
+        return None, None, ({
+            'success': False,
+            'error': 'Invalid choice index'
+        }, 400)
+    
+    return game_state, game_state.current_choices[choice_index], None
+
+
+def _idempotency_key(headers):
+    """Return the request's Idempotency-Key header, if any."""
+    key = headers.get('Idempotency-Key', '').strip()
+    return key[:255] or None
+
+
+def _stored_choice(idempotency_key, session_id: str, request_hash: str):
+    """Look up the stored turn for a retried choice request.
+
+    Returns (payload, None) when there is a turn to replay, (None, error)
+    when the key was already used for a different request and (None, None)
+    otherwise.
+    """
+    if not idempotency_key:
+        return None, None
+    record = db_manager.get_idempotency_record(session_id, idempotency_key, IDEMPOTENCY_TTL_SECONDS)
+    if not record:
+        return None, None
+    if record['request_hash'] != request_hash:
+        return None, ({
+            'success': False,
+            'error': 'Idempotency-Key was already used for a different request'
+        }, 422)
+    return record['response'], None
+
+
+def _remember_choice(idempotency_key, session_id: str, request_hash: str, payload: dict) -> None:
+    """Store a completed turn so retries with the same Idempotency-Key replay it."""
+    if idempotency_key:
+        db_manager.store_idempotency_record(
+            session_id, idempotency_key, request_hash, 200, payload, IDEMPOTENCY_TTL_SECONDS
+        )
+
+
+def _replayed(payload: dict):
+    response = jsonify(payload)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response, 200
+
+
+def _session_busy(session_id: str) -> tuple:
+    return {
+        'success': False,
+        'error': f'Another choice for session {session_id} is still being processed'
+    }, 409
+
+
 @game_bp.route('/start', methods=['POST'])
 def start_game():
     """Start a new game session with optional custom story."""
@@ -34,37 +163,29 @@ def start_game():
                 initial_story, game_state.character_info
             )
         
-        # Save initial state to database (with custom story if provided)
+        # Save initial state to database (with custom story if provided).
+        # The upsert leaves the opening on game_state, so no reload is needed.
         success = game_state.save_to_database(
             initial_story=initial_story if initial_story else None,
             initial_choices=custom_choices
         )
         
         if success:
-            # Reload the game state from database
-            game_state = GameState.load_from_database(game_state.session_id)
+            branch_speculator.speculate(game_state)
+            # Generate a starting image; the default opening prompt is served
+            # from the image cache after the first game
+            starting_image_url = image_service.generate_image_url(
+                custom_image_prompt or DEFAULT_OPENING_IMAGE_PROMPT
+            )
             
-            if game_state:
-                # Generate a starting image
-                if custom_image_prompt:
-                    starting_image = image_service.generate_image(custom_image_prompt)
-                else:
-                    starting_image_prompt = "A mystical crossroads at the edge of an enchanted forest, with three diverging paths, one leading to shadowy trees, one towards a mysterious light, and one up a rocky mountain, fantasy digital art, cinematic lighting"
-                    starting_image = image_service.generate_image(starting_image_prompt)
-                
-                return jsonify({
-                    'success': True,
-                    'session_id': game_state.session_id,
-                    'current_story': game_state.current_story,
-                    'choices': game_state.current_choices,
-                    'character_info': game_state.character_info,
-                    'image': starting_image
-                }), 200
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': 'Failed to load created game session'
-                }), 500
+            return jsonify({
+                'success': True,
+                'session_id': game_state.session_id,
+                'current_story': game_state.current_story,
+                'choices': game_state.current_choices,
+                'character_info': game_state.character_info,
+                'image_url': starting_image_url
+            }), 200
         else:
             return jsonify({
                 'success': False,
@@ -80,74 +201,78 @@ def start_game():
 
 @game_bp.route('/choice', methods=['POST'])
 def make_choice():
-    """Process a player's choice and generate story continuation."""
+    """Process a player's choice and generate story continuation.
+
+    Requests for the same session are serialized. A retried request with
+    the same `Idempotency-Key` header replays the stored turn instead of
+    generating a new one.
+    """
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'No data provided'
-            }), 400
-        
-        session_id = data.get('session_id')
-        choice_index = data.get('choice_index')
-        
-        if not session_id or choice_index is None:
-            return jsonify({
-                'success': False,
-                'error': 'session_id and choice_index are required'
-            }), 400
-        
-        # Load game state
-        game_state = GameState.load_from_database(session_id)
-        if not game_state:
-            return jsonify({
-                'success': False,
-                'error': 'Game session not found'
-            }), 404
-        
-        # Validate choice index
-        if choice_index < 0 or choice_index >= len(game_state.current_choices):
-            return jsonify({
-                'success': False,
-                'error': 'Invalid choice index'
-            }), 400
-        
-        # Get the selected choice
-        selected_choice = game_state.current_choices[choice_index]
-        
-        # Generate story continuation using AI
-        context = game_state.get_recent_context()
-        new_story, new_choices, image_prompt = ai_service.generate_story_continuation(
-            context, selected_choice, game_state.character_info
-        )
-        
-        # Generate image based on the scene
-        image_base64 = image_service.generate_image(image_prompt)
-        
-        # Update game state
-        game_state.add_choice_to_history(selected_choice, new_story)
-        game_state.current_story = new_story
-        game_state.current_choices = new_choices
-        game_state.update_story_context()
-        
-        # Save updated state
-        success = game_state.save_to_database()
-        
-        if success:
-            return jsonify({
+        session_id, choice_index, error = _parse_choice_request(request.get_json())
+        if error:
+            return jsonify(error[0]), error[1]
+        idempotency_key = _idempotency_key(request.headers)
+        request_hash = request_fingerprint('choice', session_id, choice_index)
+
+        stored, error = _stored_choice(idempotency_key, session_id, request_hash)
+        if error:
+            return jsonify(error[0]), error[1]
+        if stored:
+            return _replayed(stored)
+
+        with session_locks.hold(session_id):
+            # A retry may have completed while this request waited for the lock
+            stored, error = _stored_choice(idempotency_key, session_id, request_hash)
+            if error:
+                return jsonify(error[0]), error[1]
+            if stored:
+                return _replayed(stored)
+
+            game_state, selected_choice, error = _load_choice_state(session_id, choice_index)
+            if error:
+                return jsonify(error[0]), error[1]
+            
+            # Use the prepared turn when there is one, otherwise generate the
+            # story continuation using AI
+            prepared = _prepared_turn(game_state, selected_choice)
+            if prepared:
+                new_story, new_choices = prepared['story'], prepared['choices']
+                image_prompt, image_url = prepared['image_prompt'], prepared['image_url']
+            else:
+                context = game_state.get_recent_context()
+                new_story, new_choices, image_prompt = ai_service.generate_story_continuation(
+                    context, selected_choice, game_state.character_info
+                )
+                image_url = None
+            
+            # Update game state and save it
+            success = _record_turn(game_state, selected_choice, new_story, new_choices)
+            
+            if not success:
+                return jsonify({
+                    'success': False,
+                    'error': 'Failed to save game state'
+                }), 500
+
+            branch_speculator.speculate(game_state)
+            # Generate the scene image in the background; clients fetch it
+            # from /image/<image_job_id> instead of waiting for it here
+            image_job_id = None if image_url else image_jobs.submit(image_prompt)
+            payload = {
                 'success': True,
                 'story': new_story,
                 'choices': new_choices,
                 'character_info': game_state.character_info,
                 'session_id': session_id,
-                'image': image_base64
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to save game state'
-            }), 500
+                'image_url': image_url,
+                'image_job_id': image_job_id
+            }
+            _remember_choice(idempotency_key, session_id, request_hash, payload)
+            return jsonify(payload), 200
+
+    except SessionBusyError:
+        error = _session_busy(session_id)
+        return jsonify(error[0]), error[1]
             
     except Exception as e:
         return jsonify({
@@ -156,6 +281,139 @@ def make_choice():
         }), 500
 
 
+@game_bp.route('/choice/stream', methods=['POST'])
+def make_choice_stream():
+    """Process a player's choice and stream the continuation as server-sent events.
+
+    Events:
+      - story: {"delta": "..."} for each chunk of story text as it arrives
+      - turn: the persisted turn (same fields as /choice)
+      - image: the image job status once the scene image is generated
+      - error: {"error": "..."} if the turn could not be completed
+
+    Locking and `Idempotency-Key` replay work as for /choice; a replayed
+    turn is sent as a single turn event.
+    """
+    try:
+        session_id, choice_index, error = _parse_choice_request(request.get_json())
+        if not error:
+            idempotency_key = _idempotency_key(request.headers)
+            request_hash = request_fingerprint('choice', session_id, choice_index)
+            stored, error = _stored_choice(idempotency_key, session_id, request_hash)
+        if not error and not stored:
+            # Validate up front so bad requests get a plain HTTP error
+            _, _, error = _load_choice_state(session_id, choice_index)
+        if error:
+            return jsonify(error[0]), error[1]
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error processing choice: {str(e)}'
+        }), 500
+
+    def generate():
+        try:
+            if stored:
+                yield _sse('turn', stored)
+                return
+
+            with session_locks.hold(session_id):
+                replay, error = _stored_choice(idempotency_key, session_id, request_hash)
+                if replay or error:
+                    yield _sse('turn', replay) if replay else _sse('error', error[0])
+                    return
+
+                # Reload under the lock: another choice may have landed meanwhile
+                game_state, selected_choice, error = _load_choice_state(session_id, choice_index)
+                if error:
+                    yield _sse('error', error[0])
+                    return
+
+                final = _prepared_turn(game_state, selected_choice)
+                if final:
+                    # Already generated: send the whole story as one chunk
+                    yield _sse('story', {'delta': final['story']})
+                else:
+                    context = game_state.get_recent_context()
+                    for event in ai_service.stream_story_continuation(
+                        context, selected_choice, game_state.character_info
+                    ):
+                        if event['type'] == 'delta':
+                            yield _sse('story', {'delta': event['text']})
+                        else:
+                            final = event
+
+                new_story, new_choices = final['story'], final['choices']
+                if not _record_turn(game_state, selected_choice, new_story, new_choices):
+                    yield _sse('error', {'success': False, 'error': 'Failed to save game state'})
+                    return
+
+                branch_speculator.speculate(game_state)
+                image_url = final.get('image_url')
+                image_job_id = None if image_url else image_jobs.submit(final['image_prompt'])
+                payload = {
+                    'success': True,
+                    'story': new_story,
+                    'choices': new_choices,
+                    'character_info': game_state.character_info,
+                    'session_id': game_state.session_id,
+                    'image_url': image_url,
+                    'image_job_id': image_job_id
+                }
+                _remember_choice(idempotency_key, session_id, request_hash, payload)
+            yield _sse('turn', payload)
+
+            # The turn is already saved; push the image when the job finishes
+            if image_job_id:
+                job = image_jobs.wait(image_job_id, timeout=CLOUDFLARE_READ_TIMEOUT)
+                if job:
+                    yield _sse('image', job)
+
+        except SessionBusyError:
+            yield _sse('error', _session_busy(session_id)[0])
+
+        except Exception as e:
+            yield _sse('error', {'success': False, 'error': f'Error processing choice: {str(e)}'})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop reverse proxies such as nginx from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@game_bp.route('/image/<job_id>', methods=['GET'])
+def get_image_job(job_id):
+    """Get the status of a background scene image job.
+
+    Returns 202 while the job is queued or running and 200 once it has
+    completed (with the image URL) or failed.
+    """
+    try:
+        job = image_jobs.get(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Image job not found'
+            }), 404
+
+        status_code = 200 if job['status'] in ('completed', 'failed') else 202
+        return jsonify({
+            'success': True,
+            **job
+        }), status_code
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error retrieving image job: {str(e)}'
+        }), 500
+
+
 @game_bp.route('/state/<session_id>', methods=['GET'])
 def get_game_state(session_id):
     """Get current game state for a session."""
@@ -239,16 +497,25 @@ def save_game():
 
 @game_bp.route('/load/<save_id>', methods=['POST'])
 def load_game(save_id):
-    """Load a saved game state."""
+    """Load a saved game state.
+
+    With {"fork": true} the save is restored into a new session and the
+    session it was saved from is left as it is.
+    """
     try:
+        data = request.get_json(silent=True) or {}
+
         # Load the saved game
         game_state = GameState.load_saved_game(save_id)
         
         if game_state:
-            # Save the loaded state as current session
+            if data.get('fork'):
+                game_state.session_id = GameState.generate_session_id()
+            # Save the loaded state as current session (single upsert, no prior read)
             success = game_state.save_to_database()
             
             if success:
+                branch_speculator.speculate(game_state)
                 return jsonify({
                     'success': True,
                     'session_id': game_state.session_id,
@@ -275,6 +542,79 @@ def load_game(save_id):
         }), 500
 
 
+@game_bp.route('/fork', methods=['POST'])
+def fork_game():
+    """Start a new session that branches off an existing one after a given turn."""
+    try:
+        data = request.get_json() or {}
+        session_id = data.get('session_id')
+        turn = data.get('turn')
+
+        if not session_id:
+            return jsonify({
+                'success': False,
+                'error': 'session_id is required'
+            }), 400
+        if turn is not None and (not isinstance(turn, int) or isinstance(turn, bool)):
+            return jsonify({
+                'success': False,
+                'error': 'turn must be an integer'
+            }), 400
+
+        game_state = GameState.load_from_database(session_id)
+        if not game_state:
+            return jsonify({
+                'success': False,
+                'error': 'Game session not found'
+            }), 404
+
+        try:
+            forked = game_state.fork(turn)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        if not forked:
+            return jsonify({
+                'success': False,
+                'error': 'Story turn not found'
+            }), 404
+
+        # Options offered at a turn are stored with it; only turns from
+        # before that have to be asked for again
+        image_url = None
+        if not forked.current_choices:
+            forked.current_choices, image_prompt = ai_service.generate_choices_for_story(
+                forked.current_story, forked.character_info
+            )
+            image_url = image_service.generate_image_url(image_prompt) if image_prompt else None
+
+        if forked.save_to_database():
+            branch_speculator.speculate(forked)
+            return jsonify({
+                'success': True,
+                'session_id': forked.session_id,
+                'forked_from': session_id,
+                'turn': len(forked.choices_history),
+                'current_story': forked.current_story,
+                'choices': forked.current_choices,
+                'character_info': forked.character_info,
+                'image_url': image_url
+            }), 200
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to create forked session'
+            }), 500
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error forking game: {str(e)}'
+        }), 500
+
+
 @game_bp.route('/saves', methods=['GET'])
 def list_saves():
     """List all saved games."""
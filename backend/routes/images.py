@@ -0,0 +1,41 @@
+from flask import Blueprint, jsonify, send_file, make_response
+from services.image_service import image_service
+
+
+images_bp = Blueprint('images', __name__)
+
+# Cache entries are content-addressed, so a URL never changes what it serves
+IMMUTABLE_MAX_AGE = 31536000
+
+
+@images_bp.route('/images/<filename>', methods=['GET'])
+def get_image(filename):
+    """Serve a generated scene image from the on-disk image cache.
+
+    The file name is the image's cache key, which doubles as a strong ETag,
+    so browsers and CDNs may cache the response indefinitely.
+    """
+    try:
+        cached = image_service.cached_image(filename)
+        if not cached:
+            return jsonify({
+                'success': False,
+                'error': 'Image not found'
+            }), 404
+
+        resp = make_response(send_file(
+            cached['path'],
+            mimetype=cached['mimetype'],
+            as_attachment=False,
+            conditional=True,
+            etag=cached['etag'],
+            max_age=IMMUTABLE_MAX_AGE,
+        ))
+        resp.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return resp
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error serving image: {str(e)}'
+        }), 500
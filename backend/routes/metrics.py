@@ -0,0 +1,71 @@
+from flask import Blueprint, Response
+from models.session_cache import session_cache
+from services.http_client import http_client
+from services.image_jobs import image_jobs
+from services.image_service import image_service
+from services.llm_cache import llm_cache
+from services.metrics import register_collector, render
+from services.rate_limiter import perplexity_limiter
+from services.resilience import perplexity_resilience
+from services.singleflight import singleflight_stats
+from services.speculation import branch_speculator
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _service_metrics():
+    """Translate the services' own stats() counters into metric families."""
+    upstreams = http_client.stats()
+    yield ('story_upstream_requests_total', 'counter', 'Calls made to each upstream API',
+           [({'upstream': name}, stats['requests']) for name, stats in upstreams.items()])
+    yield ('story_upstream_errors_total', 'counter', 'Upstream calls that failed at the transport level',
+           [({'upstream': name}, stats['errors']) for name, stats in upstreams.items()])
+    yield ('story_upstream_connections_opened_total', 'counter', 'New upstream connections (not reused from the pool)',
+           [({'upstream': name}, stats['connections_opened']) for name, stats in upstreams.items()])
+
+    caches = {
+        'session': session_cache.stats(),
+        'llm': llm_cache.stats(),
+        'image': image_service.stats(),
+        'speculation': branch_speculator.stats(),
+    }
+    yield ('story_cache_hits_total', 'counter', 'Cache lookups answered from the cache',
+           [({'cache': name}, stats['hits']) for name, stats in caches.items()])
+    yield ('story_cache_misses_total', 'counter', 'Cache lookups that missed',
+           [({'cache': name}, stats['misses']) for name, stats in caches.items()])
+
+    groups = singleflight_stats()
+    yield ('story_singleflight_coalesced_total', 'counter', 'Calls that shared an identical in-flight call',
+           [({'group': name}, stats['coalesced']) for name, stats in groups.items()])
+
+    limiter = perplexity_limiter.stats()['classes']
+    yield ('story_rate_limit_admitted_total', 'counter', 'Perplexity calls admitted by the rate limiter',
+           [({'priority': name}, stats['admitted']) for name, stats in limiter.items()])
+    yield ('story_rate_limit_dropped_total', 'counter', 'Perplexity calls dropped by the rate limiter',
+           [({'priority': name, 'reason': 'queue_full'}, stats['rejected_queue_full']) for name, stats in limiter.items()]
+           + [({'priority': name, 'reason': 'deadline'}, stats['dropped_deadline']) for name, stats in limiter.items()])
+    yield ('story_rate_limit_queue_depth', 'gauge', 'Perplexity calls waiting for a rate limiter token',
+           [({'priority': name}, stats['queue_depth']) for name, stats in limiter.items()])
+
+    resilience = perplexity_resilience.stats()
+    yield ('story_upstream_retries_total', 'counter', 'Retried Perplexity attempts',
+           [({'upstream': 'perplexity'}, resilience['retries'])])
+    yield ('story_upstream_hedges_total', 'counter', 'Hedged Perplexity requests sent',
+           [({'upstream': 'perplexity'}, resilience['hedges'])])
+    yield ('story_circuit_open', 'gauge', '1 while the circuit breaker is not closed',
+           [({'upstream': 'perplexity'}, int(resilience['breaker']['state'] != 'closed'))])
+
+    yield ('story_image_jobs_queue_depth', 'gauge', 'Image jobs waiting for a worker',
+           [({}, image_jobs.stats()['queue_depth'])])
+
+
+register_collector(_service_metrics)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose request, stage and service metrics in the Prometheus text format."""
+    return Response(render(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
@@ -20,6 +20,8 @@ def generate_story():
         context = data.get('context', '')
         player_choice = data.get('choice', '')
         character_info = data.get('character_info', {})
+        # Set "use_cache": false to force a fresh generation
+        use_cache = data.get('use_cache', True) is not False
         
         if not context or not player_choice:
             return jsonify({
@@ -29,17 +31,17 @@ def generate_story():
         
         # Generate story continuation
         story, choices, image_prompt = ai_service.generate_story_continuation(
-            context, player_choice, character_info
+            context, player_choice, character_info, use_cache=use_cache
         )
         
         # Generate image based on the scene
-        image_base64 = image_service.generate_image(image_prompt)
+        image_url = image_service.generate_image_url(image_prompt)
         
         return jsonify({
             'success': True,
             'story': story,
             'choices': choices,
-            'image': image_base64
+            'image_url': image_url
         }), 200
         
     except Exception as e:
@@ -1,7 +1,8 @@
+import asyncio
 import requests
 import json
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from config import (
     PERPLEXITY_API_KEY,
     PERPLEXITY_BASE_URL,
@@ -10,10 +11,87 @@ from config import (
     MAX_CONTEXT_LENGTH,
     PERSONALITY_ANALYSIS_MODEL,
 )
+import aiohttp
+from services.async_http_client import async_http_client
+from services.http_client import http_client
+from services.llm_cache import llm_cache
+from services.metrics import AI_FALLBACKS, timed
+from services.tracing import span
+from services.rate_limiter import (
+    PRIORITY_CUSTOM_START,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_PERSONALITY,
+    RateLimitExceeded,
+)
+from services.resilience import CircuitOpenError, perplexity_resilience
+from services.singleflight import SingleFlight, request_fingerprint
 
 UNSET = object()
 
 
+class StoryFieldExtractor:
+    """Incrementally decode the "story" string value from streamed JSON text.
+
+    The model streams a JSON object, so the raw tokens are not presentable.
+    `feed` takes each raw chunk and returns whatever new characters of the
+    "story" value can be decoded so far, handling escapes split across
+    chunks. Everything outside that value is ignored.
+    """
+
+    _FIELD = re.compile(r'"story"\s*:\s*"')
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._started = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> str:
+        if self.complete:
+            return ''
+        self._buffer += chunk
+
+        if not self._started:
+            match = self._FIELD.search(self._buffer)
+            if not match:
+                return ''
+            self._started = True
+            self._pos = match.end()
+
+        out: List[str] = []
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self.complete = True
+                pos += 1
+                break
+            if char != '\\':
+                out.append(char)
+                pos += 1
+                continue
+            # Escape sequence; wait for the rest of it if it was split
+            if pos + 1 >= len(buffer):
+                break
+            code = buffer[pos + 1]
+            if code == 'u':
+                if pos + 6 > len(buffer):
+                    break
+                try:
+                    out.append(chr(int(buffer[pos + 2:pos + 6], 16)))
+                except ValueError:
+                    pass
+                pos += 6
+            else:
+                out.append(self._ESCAPES.get(code, code))
+                pos += 2
+
+        self._pos = pos
+        return ''.join(out)
+
+
 class AIStoryService:
     """Service for generating story content using Perplexity AI."""
     
@@ -21,6 +99,7 @@ class AIStoryService:
         self.api_key = PERPLEXITY_API_KEY
         self.base_url = PERPLEXITY_BASE_URL
         self.story_prompt_template = self._get_story_prompt_template()
+        self._inflight = SingleFlight('perplexity')
     
     def _get_story_prompt_template(self) -> str:
         """Get the base prompt template for story generation."""
@@ -54,18 +133,19 @@ Format response as JSON:
   "image_prompt": "A vivid, artistic description of the scene for image generation, focusing on atmosphere and key visual elements"
 }}"""
 
-    def _make_api_request(
-        self,
-        prompt: str,
-        system_prompt: str = "You are a creative interactive fiction storyteller. Always respond with valid JSON.",
-        model: str = PERPLEXITY_MODEL,
-        fallback_response: Any = UNSET,
-    ) -> Optional[Dict]:
-        """Make a request to the Perplexity API."""
-        if not self.api_key or self.api_key == "your_api_key_here":
-            # Return mock response for demo purposes
-            return self._get_mock_response(prompt) if fallback_response is UNSET else fallback_response
-        
+    def _uses_mock(self) -> bool:
+        return not self.api_key or self.api_key == "your_api_key_here"
+
+    def _request_key(self, prompt: str, system_prompt: str, model: str, fallback_response: Any) -> str:
+        return request_fingerprint(
+            model,
+            system_prompt,
+            prompt,
+            'unset' if fallback_response is UNSET else ['fallback', fallback_response],
+        )
+
+    def _completion_request(self, prompt: str, system_prompt: str, model: str) -> Tuple[Dict, Dict]:
+        """Return the (headers, body) of a chat completion request."""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -84,24 +164,173 @@ Format response as JSON:
                 }
             ],
         }
+        return headers, data
+
+    def _fallback(self, fallback_response: Any, reason: str) -> Any:
+        """Count a fallback and return the caller's fallback response."""
+        AI_FALLBACKS.inc(reason)
+        return self._get_fallback_response() if fallback_response is UNSET else fallback_response
+
+    def _completion_content(self, result: Dict) -> Tuple[Dict, bool]:
+        """Parse the JSON object out of a chat completion response.
+
+        Also returns whether the response may be cached: only content that
+        parsed as JSON and has the expected shape is, never a response
+        salvaged from unstructured text.
+        """
+        content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+        response = self._parse_json_response(content, strict=True)
+        if response is None:
+            return self._extract_story_and_choices(content), False
+        return response, self._cacheable_response(response)
+
+    def _cacheable_response(self, response: Any) -> bool:
+        """Return whether a strictly parsed response is complete enough to replay."""
+        if not isinstance(response, dict):
+            return False
+        if 'story' in response:
+            return self.validate_response(response)
+        if 'choices' in response:
+            # Choices generated for a custom opening carry no story
+            choices = response['choices']
+            return (
+                isinstance(choices, list) and
+                len(choices) == 3 and
+                all(isinstance(choice, str) for choice in choices)
+            )
+        return True
+
+    def _make_api_request(
+        self,
+        prompt: str,
+        system_prompt: str = "You are a creative interactive fiction storyteller. Always respond with valid JSON.",
+        model: str = PERPLEXITY_MODEL,
+        fallback_response: Any = UNSET,
+        use_cache: bool = True,
+        priority: str = PRIORITY_INTERACTIVE,
+    ) -> Optional[Dict]:
+        """Make a request to the Perplexity API.
+
+        Responses are served from the persistent LLM cache when possible;
+        `use_cache=False` skips the lookup but still refreshes the entry.
+        Identical requests made while one is already in flight share its
+        response instead of calling the API again. Calls that do reach the
+        API wait for the rate limiter in their `priority` class and are
+        retried, hedged and circuit-broken by `perplexity_resilience`; the
+        fallback is returned once that gives up.
+        """
+        if self._uses_mock():
+            # Return mock response for demo purposes
+            return self._get_mock_response(prompt) if fallback_response is UNSET else fallback_response
+
+        cached = llm_cache.get(llm_cache.key(model, system_prompt, prompt), use_cache)
+        if cached is not None:
+            return cached
         
-        try:
-            response = requests.post(self.base_url, headers=headers, json=data, timeout=30)
+        key = self._request_key(prompt, system_prompt, model, fallback_response)
+        return self._inflight.do(
+            key, self._send_api_request, prompt, system_prompt, model, fallback_response, priority
+        )
+
+    def _send_api_request(self, prompt: str, system_prompt: str, model: str, fallback_response: Any,
+                          priority: str = PRIORITY_INTERACTIVE) -> Optional[Dict]:
+        """Send one chat completion request to the Perplexity API."""
+        headers, data = self._completion_request(prompt, system_prompt, model)
+
+        def send(read_timeout: float) -> requests.Response:
+            response = http_client.post(
+                self.base_url,
+                upstream='perplexity',
+                headers=headers,
+                json=data,
+                read_timeout=read_timeout,
+            )
             response.raise_for_status()
-            
-            result = response.json()
-            content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+            return response
+        
+        try:
+            response = perplexity_resilience.call(send, priority, hedge=priority != PRIORITY_PERSONALITY)
             
             # Parse JSON from the content
-            return self._parse_json_response(content)
+            result, cacheable = self._completion_content(response.json())
+            if cacheable:
+                llm_cache.put(llm_cache.key(model, system_prompt, prompt), model, result)
+            return result
+
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            print(f"Perplexity request not sent: {e}")
+            return self._fallback(fallback_response, 'rate_limited' if isinstance(e, RateLimitExceeded) else 'circuit_open')
             
         except requests.exceptions.RequestException as e:
             print(f"API request error: {e}")
-            return self._get_fallback_response() if fallback_response is UNSET else fallback_response
+            return self._fallback(fallback_response, 'upstream_error')
         
         except Exception as e:
             print(f"Error processing API response: {e}")
-            return self._get_fallback_response() if fallback_response is UNSET else fallback_response
+            return self._fallback(fallback_response, 'bad_response')
+
+    async def _make_api_request_async(
+        self,
+        prompt: str,
+        system_prompt: str = "You are a creative interactive fiction storyteller. Always respond with valid JSON.",
+        model: str = PERPLEXITY_MODEL,
+        fallback_response: Any = UNSET,
+        use_cache: bool = True,
+        priority: str = PRIORITY_INTERACTIVE,
+    ) -> Optional[Dict]:
+        """Coroutine version of `_make_api_request` for the async server."""
+        if self._uses_mock():
+            return self._get_mock_response(prompt) if fallback_response is UNSET else fallback_response
+
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(
+            None, llm_cache.get, llm_cache.key(model, system_prompt, prompt), use_cache
+        )
+        if cached is not None:
+            return cached
+
+        key = self._request_key(prompt, system_prompt, model, fallback_response)
+        return await self._inflight.do_async(
+            key, self._send_api_request_async, prompt, system_prompt, model, fallback_response, priority
+        )
+
+    async def _send_api_request_async(self, prompt: str, system_prompt: str, model: str,
+                                      fallback_response: Any,
+                                      priority: str = PRIORITY_INTERACTIVE) -> Optional[Dict]:
+        """Send one chat completion request without blocking the event loop."""
+        headers, data = self._completion_request(prompt, system_prompt, model)
+
+        async def send(read_timeout: float):
+            response = await async_http_client.post(
+                self.base_url,
+                upstream='perplexity',
+                headers=headers,
+                json=data,
+                read_timeout=read_timeout,
+            )
+            response.raise_for_status()
+            return response
+
+        try:
+            response = await perplexity_resilience.call_async(send, priority, hedge=priority != PRIORITY_PERSONALITY)
+            result, cacheable = self._completion_content(response.json())
+            if cacheable:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, llm_cache.put, llm_cache.key(model, system_prompt, prompt), model, result
+                )
+            return result
+
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            print(f"Perplexity request not sent: {e}")
+            return self._fallback(fallback_response, 'rate_limited' if isinstance(e, RateLimitExceeded) else 'circuit_open')
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"API request error: {e}")
+            return self._fallback(fallback_response, 'upstream_error')
+
+        except Exception as e:
+            print(f"Error processing API response: {e}")
+            return self._fallback(fallback_response, 'bad_response')
 
     def request_structured_json(
         self,
@@ -110,6 +339,8 @@ Format response as JSON:
         user_prompt: str,
         fallback: Optional[Dict] = None,
         model: str = PERSONALITY_ANALYSIS_MODEL,
+        use_cache: bool = True,
+        priority: str = PRIORITY_PERSONALITY,
     ) -> Optional[Dict]:
         """Request structured JSON from the configured AI service."""
         result = self._make_api_request(
@@ -117,13 +348,82 @@ Format response as JSON:
             system_prompt=system_prompt,
             model=model,
             fallback_response=fallback,
+            use_cache=use_cache,
+            priority=priority,
         )
         if result is None:
             return fallback
         return result
     
-    def _parse_json_response(self, content: str) -> Optional[Dict]:
-        """Parse JSON response from AI, handling various formats."""
+    def _stream_api_request(
+        self,
+        prompt: str,
+        system_prompt: str = "You are a creative interactive fiction storyteller. Always respond with valid JSON.",
+        model: str = PERPLEXITY_MODEL,
+        fallback_response: Any = UNSET,
+    ) -> Iterator[str]:
+        """Stream completion content deltas from the Perplexity API.
+
+        Without an API key the same demo response as `_make_api_request` is
+        replayed in small chunks. Request errors are raised to the caller,
+        which decides how to fall back.
+        """
+        if self._uses_mock():
+            demo = json.dumps(self._get_mock_response(prompt) if fallback_response is UNSET else fallback_response)
+            for start in range(0, len(demo), 24):
+                yield demo[start:start + 24]
+            return
+
+        headers, data = self._completion_request(prompt, system_prompt, model)
+        headers["Accept"] = "text/event-stream"
+        data["stream"] = True
+
+        def send(read_timeout: float) -> requests.Response:
+            response = http_client.post(
+                self.base_url,
+                upstream='perplexity',
+                headers=headers,
+                json=data,
+                read_timeout=read_timeout,
+                stream=True,
+            )
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                response.close()
+                raise
+            return response
+
+        # Retried until the response headers arrive; a hedge would leave a
+        # second stream open, so none is sent
+        response = perplexity_resilience.call(send, PRIORITY_INTERACTIVE, hedge=False)
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = line[len('data:'):].strip()
+                if payload == '[DONE]':
+                    break
+                try:
+                    event = json.loads(payload)
+                except json.JSONDecodeError:
+                    continue
+                delta = event.get('choices', [{}])[0].get('delta', {}).get('content')
+                if delta:
+                    yield delta
+        finally:
+            response.close()
+
+    def _parse_json_response(self, content: str, strict: bool = False) -> Optional[Dict]:
+        """Parse JSON response from AI, handling various formats.
+
+        With `strict`, content that holds no JSON object returns None instead
+        of a response extracted from the unstructured text.
+        """
+        with span('parse_json', chars=len(content or '')):
+            return self._parse_json_content(content, strict)
+
+    def _parse_json_content(self, content: str, strict: bool = False) -> Optional[Dict]:
         try:
             # Try to parse as direct JSON
             return json.loads(content)
@@ -154,6 +454,8 @@ Format response as JSON:
         except json.JSONDecodeError:
             pass
         
+        if strict:
+            return None
         # If all parsing fails, create a structured response
         return self._extract_story_and_choices(content)
     
@@ -260,8 +562,53 @@ Format response as JSON:
             "image_prompt": "A mysterious fantasy landscape with ancient ruins and magical aura, cinematic lighting, digital art"
         }
     
+    def _build_story_prompt(self, context: str, player_choice: str, character_info: Dict = None) -> str:
+        """Render the story continuation prompt for a player choice."""
+        # Prepare character information
+        char_info = character_info or {"name": "Player", "traits": [], "inventory": []}
+        char_summary = f"Character: {char_info.get('name', 'Player')}"
+        
+        if char_info.get('traits'):
+            char_summary += f", Traits: {', '.join(char_info['traits'])}"
+        
+        if char_info.get('inventory'):
+            char_summary += f", Inventory: {', '.join(char_info['inventory'])}"
+        
+        # Format the prompt
+        return self.story_prompt_template.format(
+            context=context[-MAX_CONTEXT_LENGTH:],
+            player_choice=player_choice,
+            character_info=char_summary,
+            word_goal=STORY_LENGTH_WORDS
+        )
+
+    def _normalize_story_response(self, response: Optional[Dict]) -> Tuple[str, List[str], str]:
+        """Validate a parsed story response, falling back when it is unusable."""
+        if response and 'story' in response and 'choices' in response:
+            story = response['story']
+            choices = response['choices']
+            image_prompt = response.get('image_prompt', 'A mystical fantasy scene with magical atmosphere')
+            
+            # Validate and clean up response
+            if len(choices) != 3:
+                choices = choices[:3] if len(choices) > 3 else choices + ["Continue the adventure"] * (3 - len(choices))
+            
+            # Ensure story is reasonable length
+            if len(story) > MAX_CONTEXT_LENGTH:
+                story = story[: MAX_CONTEXT_LENGTH - 3] + "..."
+            
+            return story, choices, image_prompt
+        else:
+            # Use fallback response
+            AI_FALLBACKS.inc('invalid_response')
+            fallback = self._get_fallback_response()
+            return fallback['story'], fallback['choices'], fallback['image_prompt']
+
+    @timed('generate_story_continuation')
     def generate_story_continuation(self, context: str, player_choice: str, 
-                                  character_info: Dict = None) -> Tuple[str, List[str], str]:
+                                  character_info: Dict = None,
+                                  use_cache: bool = True,
+                                  priority: str = PRIORITY_INTERACTIVE) -> Tuple[str, List[str], str]:
         """
         Generate story continuation based on context and player choice.
         
@@ -269,28 +616,14 @@ Format response as JSON:
             context: Current story context
             player_choice: The choice made by the player
             character_info: Information about the player character
+            use_cache: Whether a cached response for the same prompt may be returned
+            priority: Rate limiter priority class of the request
         
         Returns:
             Tuple of (story_text, list_of_choices, image_prompt)
         """
         try:
-            # Prepare character information
-            char_info = character_info or {"name": "Player", "traits": [], "inventory": []}
-            char_summary = f"Character: {char_info.get('name', 'Player')}"
-            
-            if char_info.get('traits'):
-                char_summary += f", Traits: {', '.join(char_info['traits'])}"
-            
-            if char_info.get('inventory'):
-                char_summary += f", Inventory: {', '.join(char_info['inventory'])}"
-            
-            # Format the prompt
-            prompt = self.story_prompt_template.format(
-                context=context[-MAX_CONTEXT_LENGTH:],
-                player_choice=player_choice,
-                character_info=char_summary,
-                word_goal=STORY_LENGTH_WORDS
-            )
+            prompt = self._build_story_prompt(context, player_choice, character_info)
             
             # Make API request
             response = self._make_api_request(
@@ -298,31 +631,91 @@ Format response as JSON:
                 system_prompt="You are a creative interactive fiction storyteller. Always respond with valid JSON.",
                 model=PERPLEXITY_MODEL,
                 fallback_response=self._get_fallback_response(),
+                use_cache=use_cache,
+                priority=priority,
             )
             
-            if response and 'story' in response and 'choices' in response:
-                story = response['story']
-                choices = response['choices']
-                image_prompt = response.get('image_prompt', 'A mystical fantasy scene with magical atmosphere')
-                
-                # Validate and clean up response
-                if len(choices) != 3:
-                    choices = choices[:3] if len(choices) > 3 else choices + ["Continue the adventure"] * (3 - len(choices))
-                
-                # Ensure story is reasonable length
-                if len(story) > MAX_CONTEXT_LENGTH:
-                    story = story[: MAX_CONTEXT_LENGTH - 3] + "..."
-                
-                return story, choices, image_prompt
-            else:
-                # Use fallback response
-                fallback = self._get_fallback_response()
-                return fallback['story'], fallback['choices'], fallback['image_prompt']
+            return self._normalize_story_response(response)
                 
         except Exception as e:
             print(f"Error in story generation: {e}")
             fallback = self._get_fallback_response()
             return fallback['story'], fallback['choices'], fallback['image_prompt']
+
+    @timed('generate_story_continuation')
+    async def generate_story_continuation_async(self, context: str, player_choice: str,
+                                                character_info: Dict = None,
+                                                use_cache: bool = True,
+                                                priority: str = PRIORITY_INTERACTIVE) -> Tuple[str, List[str], str]:
+        """Coroutine version of `generate_story_continuation` for the async server."""
+        try:
+            prompt = self._build_story_prompt(context, player_choice, character_info)
+            response = await self._make_api_request_async(
+                prompt,
+                system_prompt="You are a creative interactive fiction storyteller. Always respond with valid JSON.",
+                model=PERPLEXITY_MODEL,
+                fallback_response=self._get_fallback_response(),
+                use_cache=use_cache,
+                priority=priority,
+            )
+            return self._normalize_story_response(response)
+
+        except Exception as e:
+            print(f"Error in story generation: {e}")
+            fallback = self._get_fallback_response()
+            return fallback['story'], fallback['choices'], fallback['image_prompt']
+
+    def stream_story_continuation(self, context: str, player_choice: str,
+                                  character_info: Dict = None,
+                                  use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a story continuation as it is generated.
+
+        Yields {'type': 'delta', 'text': ...} events carrying decoded story
+        text as soon as it arrives, followed by one final
+        {'type': 'done', 'story': ..., 'choices': [...], 'image_prompt': ...}
+        event parsed from the complete response. The final story is
+        authoritative; it can differ from the streamed text when the model
+        response had to be repaired or replaced by the fallback. A cached
+        response is replayed as a single delta.
+        """
+        system_prompt = "You are a creative interactive fiction storyteller. Always respond with valid JSON."
+        prompt = self._build_story_prompt(context, player_choice, character_info)
+        cache_key = llm_cache.key(PERPLEXITY_MODEL, system_prompt, prompt)
+        cached = None if self._uses_mock() else llm_cache.get(cache_key, use_cache)
+        if cached is not None:
+            story, choices, image_prompt = self._normalize_story_response(cached)
+            yield {'type': 'delta', 'text': story}
+            yield {'type': 'done', 'story': story, 'choices': choices, 'image_prompt': image_prompt}
+            return
+
+        extractor = StoryFieldExtractor()
+        chunks: List[str] = []
+
+        try:
+            for chunk in self._stream_api_request(
+                prompt,
+                system_prompt=system_prompt,
+                model=PERPLEXITY_MODEL,
+                fallback_response=self._get_fallback_response(),
+            ):
+                chunks.append(chunk)
+                text = extractor.feed(chunk)
+                if text:
+                    yield {'type': 'delta', 'text': text}
+            content = ''.join(chunks)
+            response = self._parse_json_response(content, strict=True) if content else None
+            if response is None and content:
+                response = self._extract_story_and_choices(content)
+            elif not self._uses_mock() and self._cacheable_response(response):
+                llm_cache.put(cache_key, PERPLEXITY_MODEL, response)
+            
+        except Exception as e:
+            print(f"Error in streamed story generation: {e}")
+            response = self._parse_json_response(''.join(chunks)) if extractor.complete else None
+
+        story, choices, image_prompt = self._normalize_story_response(response)
+        yield {'type': 'done', 'story': story, 'choices': choices, 'image_prompt': image_prompt}
     
     def validate_response(self, response: Dict) -> bool:
         """Validate that the AI response has the required structure."""
@@ -336,22 +729,12 @@ Format response as JSON:
             all(isinstance(choice, str) for choice in response['choices'])
         )
 
-    def generate_choices_for_story(self, story_text: str, character_info: Dict = None) -> Tuple[List[str], str]:
-        """
-        Generate choices for a user-provided initial story.
+    def _build_choices_prompt(self, story_text: str, character_info: Dict = None) -> str:
+        """Render the prompt that asks for choices for a user-provided opening."""
+        char_info = character_info or {"name": "Player", "traits": [], "inventory": []}
+        char_summary = f"Character: {char_info.get('name', 'Player')}"
         
-        Args:
-            story_text: The user's custom starting story
-            character_info: Information about the player character
-            
-        Returns:
-            Tuple of (list_of_choices, image_prompt)
-        """
-        try:
-            char_info = character_info or {"name": "Player", "traits": [], "inventory": []}
-            char_summary = f"Character: {char_info.get('name', 'Player')}"
-            
-            prompt = f"""You are an interactive fiction storyteller. A player has started a story with their own beginning.
+        return f"""You are an interactive fiction storyteller. A player has started a story with their own beginning.
 
 STORY START:
 {story_text[:MAX_CONTEXT_LENGTH]}
@@ -378,43 +761,81 @@ Format response as JSON:
   "image_prompt": "A vivid, artistic description of the scene for image generation"
 }}"""
 
+    def _get_choices_fallback(self) -> Dict:
+        """Choices used when none can be generated for a custom opening."""
+        return {
+            "choices": [
+                "Explore your surroundings",
+                "Look for clues about what to do next",
+                "Continue forward with determination"
+            ],
+            "image_prompt": "A mystical fantasy scene with magical atmosphere"
+        }
+
+    def _normalize_choices_response(self, response: Optional[Dict]) -> Tuple[List[str], str]:
+        """Coerce a choices response into exactly three choices and an image prompt."""
+        if response and 'choices' in response:
+            choices = response['choices']
+            image_prompt = response.get('image_prompt', 'A mystical fantasy scene with magical atmosphere')
+            
+            # Ensure exactly 3 choices
+            if len(choices) != 3:
+                choices = choices[:3] if len(choices) > 3 else choices + ["Continue the adventure"] * (3 - len(choices))
+            
+            return choices, image_prompt
+        AI_FALLBACKS.inc('invalid_response')
+        fallback = self._get_choices_fallback()
+        return fallback['choices'], fallback['image_prompt']
+
+    @timed('generate_choices')
+    def generate_choices_for_story(self, story_text: str, character_info: Dict = None,
+                                   use_cache: bool = True) -> Tuple[List[str], str]:
+        """
+        Generate choices for a user-provided initial story.
+        
+        Args:
+            story_text: The user's custom starting story
+            character_info: Information about the player character
+            use_cache: Whether a cached response for the same prompt may be returned
+            
+        Returns:
+            Tuple of (list_of_choices, image_prompt)
+        """
+        try:
             response = self._make_api_request(
-                prompt,
+                self._build_choices_prompt(story_text, character_info),
                 system_prompt="You are a creative interactive fiction storyteller. Always respond with valid JSON.",
                 model=PERPLEXITY_MODEL,
-                fallback_response={
-                    "choices": [
-                        "Explore your surroundings",
-                        "Look for clues about what to do next",
-                        "Continue forward with determination"
-                    ],
-                    "image_prompt": "A mystical fantasy scene with magical atmosphere"
-                },
+                fallback_response=self._get_choices_fallback(),
+                use_cache=use_cache,
+                priority=PRIORITY_CUSTOM_START,
             )
-            
-            if response and 'choices' in response:
-                choices = response['choices']
-                image_prompt = response.get('image_prompt', 'A mystical fantasy scene with magical atmosphere')
-                
-                # Ensure exactly 3 choices
-                if len(choices) != 3:
-                    choices = choices[:3] if len(choices) > 3 else choices + ["Continue the adventure"] * (3 - len(choices))
-                
-                return choices, image_prompt
-            else:
-                return [
-                    "Explore your surroundings",
-                    "Look for clues about what to do next",
-                    "Continue forward with determination"
-                ], "A mystical fantasy scene with magical atmosphere"
+            return self._normalize_choices_response(response)
                 
         except Exception as e:
             print(f"Error generating choices for story: {e}")
-            return [
-                "Explore your surroundings",
-                "Look for clues about what to do next",
-                "Continue forward with determination"
-            ], "A mystical fantasy scene with magical atmosphere"
+            fallback = self._get_choices_fallback()
+            return fallback['choices'], fallback['image_prompt']
+
+    @timed('generate_choices')
+    async def generate_choices_for_story_async(self, story_text: str, character_info: Dict = None,
+                                               use_cache: bool = True) -> Tuple[List[str], str]:
+        """Coroutine version of `generate_choices_for_story` for the async server."""
+        try:
+            response = await self._make_api_request_async(
+                self._build_choices_prompt(story_text, character_info),
+                system_prompt="You are a creative interactive fiction storyteller. Always respond with valid JSON.",
+                model=PERPLEXITY_MODEL,
+                fallback_response=self._get_choices_fallback(),
+                use_cache=use_cache,
+                priority=PRIORITY_CUSTOM_START,
+            )
+            return self._normalize_choices_response(response)
+
+        except Exception as e:
+            print(f"Error generating choices for story: {e}")
+            fallback = self._get_choices_fallback()
+            return fallback['choices'], fallback['image_prompt']
 
 
 # Singleton instance
@@ -0,0 +1,123 @@
+"""Shared aiohttp client for the upstream APIs in the async server.
+
+The async counterpart of `services.http_client`: one keep-alive connector
+shared by every coroutine on the event loop, so hundreds of upstream calls
+can be in flight without a thread each. Latency is recorded into the sync
+client's stats, so `/api/health` reports both modes the same way.
+"""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from config import ASYNC_HTTP_LIMIT, ASYNC_HTTP_LIMIT_PER_HOST, HTTP_CONNECT_TIMEOUT
+from services.http_client import http_client
+from services.tracing import span
+
+
+class AsyncResponse:
+    """Fully read upstream response."""
+
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise aiohttp.ClientResponseError(
+                request_info=None, history=(), status=self.status_code, message=self.text[:200]
+            )
+
+
+async def _on_connection_create_start(session, trace_ctx, params) -> None:
+    trace_ctx.connect_started = time.perf_counter()
+
+
+async def _on_connection_create_end(session, trace_ctx, params) -> None:
+    timing = trace_ctx.trace_request_ctx
+    timing['connections'] += 1
+    timing['connect_seconds'] += time.perf_counter() - trace_ctx.connect_started
+
+
+class AsyncPooledHTTPClient:
+    """aiohttp session with a bounded, shared keep-alive connector."""
+
+    def __init__(
+        self,
+        limit: int = ASYNC_HTTP_LIMIT,
+        limit_per_host: int = ASYNC_HTTP_LIMIT_PER_HOST,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.connect_timeout = connect_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created on first use, inside the running event loop
+        if self._session is None or self._session.closed:
+            trace_config = aiohttp.TraceConfig(trace_config_ctx_factory=SimpleNamespace)
+            trace_config.on_connection_create_start.append(_on_connection_create_start)
+            trace_config.on_connection_create_end.append(_on_connection_create_end)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host),
+                trace_configs=[trace_config],
+            )
+        return self._session
+
+    async def post(
+        self,
+        url: str,
+        *,
+        upstream: str,
+        read_timeout: float,
+        headers: Optional[Dict[str, str]] = None,
+        json: Any = None,
+    ) -> AsyncResponse:
+        """POST to `url`, read the whole body and record the call's latency."""
+        timing = {'connections': 0, 'connect_seconds': 0.0}
+        timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=read_timeout)
+        started = time.perf_counter()
+
+        with span('http', upstream=upstream) as current:
+            try:
+                async with self._get_session().post(
+                    url, headers=headers, json=json, timeout=timeout, trace_request_ctx=timing
+                ) as response:
+                    ttfb = time.perf_counter() - started
+                    content = await response.read()
+                    status_code = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                http_client.record(
+                    upstream, time.perf_counter() - started, error=True,
+                    connections=timing['connections'], connect_seconds=timing['connect_seconds'],
+                )
+                raise
+
+            http_client.record(
+                upstream, time.perf_counter() - started, ttfb=ttfb,
+                connections=timing['connections'], connect_seconds=timing['connect_seconds'],
+            )
+            if current:
+                current.set(status=status_code, ttfb_ms=round(ttfb * 1000, 3), new_connections=timing['connections'])
+        return AsyncResponse(status_code, content)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+# Singleton instance
+async_http_client = AsyncPooledHTTPClient()
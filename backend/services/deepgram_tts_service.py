@@ -13,7 +13,11 @@ import os
 import threading
 from typing import Optional, Tuple
 
-import requests
+from config import DEEPGRAM_BASE_URL, DEEPGRAM_READ_TIMEOUT, TTS_CACHE_DIR
+from services.async_http_client import async_http_client
+from services.http_client import http_client
+from services.metrics import timed
+from services.singleflight import SingleFlight
 
 
 class DeepgramTTSSynthesizer:
@@ -22,7 +26,7 @@ class DeepgramTTSSynthesizer:
     _instance_lock = threading.Lock()
 
     def __init__(self, cache_dir: Optional[str] = None, api_key: Optional[str] = None):
-        self.cache_dir = cache_dir or os.path.join(os.path.dirname(__file__), "..", "tts_cache")
+        self.cache_dir = cache_dir or TTS_CACHE_DIR
         self.cache_dir = os.path.abspath(self.cache_dir)
         os.makedirs(self.cache_dir, exist_ok=True)
         
@@ -31,8 +35,9 @@ class DeepgramTTSSynthesizer:
             raise ValueError("DEEPGRAM_API_KEY environment variable is required")
         
         # Deepgram API configuration
-        self._base_url = "https://api.deepgram.com/v1/speak"
+        self._base_url = f"{DEEPGRAM_BASE_URL.rstrip('/')}/speak"
         self._model = "aura-2-orpheus-en"  # Aura-2 with Orpheus voice
+        self._inflight = SingleFlight('deepgram')
 
     def _hash_key(self, text: str, model: Optional[str] = None) -> str:
         """Generate a cache key based on text and model."""
@@ -41,6 +46,7 @@ class DeepgramTTSSynthesizer:
         h.update((model or self._model).encode("utf-8"))
         return h.hexdigest()
 
+    @timed('tts_synthesize')
     def synthesize(
         self,
         *,
@@ -56,6 +62,35 @@ class DeepgramTTSSynthesizer:
         Returns:
             Tuple of (absolute_file_path, mime_type).
         """
+        text, resolved_model, cache_key, out_path = self._resolve(text, model)
+
+        # Return cached file if exists
+        if os.path.exists(out_path) and os.path.getsize(out_path) > 0:
+            return out_path, "audio/mpeg"
+
+        # Concurrent requests for the same text share one synthesis (and one
+        # temp file) instead of racing to write it
+        return self._inflight.do(cache_key, self._synthesize_to_file, text, resolved_model, out_path)
+
+    @timed('tts_synthesize')
+    async def synthesize_async(
+        self,
+        *,
+        text: str,
+        model: Optional[str] = None,
+    ) -> Tuple[str, str]:
+        """Coroutine version of `synthesize` for the async server."""
+        text, resolved_model, cache_key, out_path = self._resolve(text, model)
+
+        if os.path.exists(out_path) and os.path.getsize(out_path) > 0:
+            return out_path, "audio/mpeg"
+
+        return await self._inflight.do_async(
+            cache_key, self._synthesize_to_file_async, text, resolved_model, out_path
+        )
+
+    def _resolve(self, text: str, model: Optional[str]) -> Tuple[str, str, str, str]:
+        """Validate the input and return (text, model, cache_key, out_path)."""
         if not text or not text.strip():
             raise ValueError("Text is required for TTS")
 
@@ -68,28 +103,40 @@ class DeepgramTTSSynthesizer:
         resolved_model = model or self._model
         cache_key = self._hash_key(text, resolved_model)
         out_path = os.path.join(self.cache_dir, f"{cache_key}.mp3")
+        return text, resolved_model, cache_key, out_path
 
-        # Return cached file if exists
-        if os.path.exists(out_path) and os.path.getsize(out_path) > 0:
-            return out_path, "audio/mpeg"
+    def _speak_request(self, text: str, resolved_model: str) -> Tuple[str, dict, dict]:
+        """Return the (url, headers, body) of a speak request."""
+        url = f"{self._base_url}?model={resolved_model}"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Token {self._api_key}",
+        }
+        payload = {"text": text}
+        return url, headers, payload
 
-        # Generate fresh audio via Deepgram API
-        tmp_path = out_path + ".tmp"
+    def _remove_stale_tmp(self, tmp_path: str) -> None:
         if os.path.exists(tmp_path):
             try:
                 os.remove(tmp_path)
             except OSError:
                 pass
 
-        url = f"{self._base_url}?model={resolved_model}"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Token {self._api_key}",
-        }
-        payload = {"text": text}
+    def _synthesize_to_file(self, text: str, resolved_model: str, out_path: str) -> Tuple[str, str]:
+        """Generate fresh audio via the Deepgram API and write it to `out_path`."""
+        tmp_path = out_path + ".tmp"
+        self._remove_stale_tmp(tmp_path)
+        url, headers, payload = self._speak_request(text, resolved_model)
+
+        response = http_client.post(
+            url,
+            upstream='deepgram',
+            headers=headers,
+            json=payload,
+            read_timeout=DEEPGRAM_READ_TIMEOUT,
+            stream=True,
+        )
 
-        response = requests.post(url, headers=headers, json=payload, stream=True)
-        
         if response.status_code != 200:
             error_msg = response.text
             raise RuntimeError(f"Deepgram TTS failed with status {response.status_code}: {error_msg}")
@@ -104,6 +151,30 @@ class DeepgramTTSSynthesizer:
         os.replace(tmp_path, out_path)
         return out_path, "audio/mpeg"
 
+    async def _synthesize_to_file_async(self, text: str, resolved_model: str, out_path: str) -> Tuple[str, str]:
+        """Generate fresh audio without blocking the event loop and write it to `out_path`."""
+        tmp_path = out_path + ".tmp"
+        self._remove_stale_tmp(tmp_path)
+        url, headers, payload = self._speak_request(text, resolved_model)
+
+        response = await async_http_client.post(
+            url,
+            upstream='deepgram',
+            headers=headers,
+            json=payload,
+            read_timeout=DEEPGRAM_READ_TIMEOUT,
+        )
+
+        if response.status_code != 200:
+            raise RuntimeError(f"Deepgram TTS failed with status {response.status_code}: {response.text}")
+
+        with open(tmp_path, "wb") as f:
+            f.write(response.content)
+
+        # Atomic move into place
+        os.replace(tmp_path, out_path)
+        return out_path, "audio/mpeg"
+
 
 # Singleton instance
 deepgram_tts_synth = DeepgramTTSSynthesizer()
@@ -0,0 +1,209 @@
+"""Shared keep-alive HTTP client for the upstream AI, image and TTS APIs.
+
+A single urllib3 connection pool (behind one `HTTPAdapter`) is shared by all
+threads, so repeated calls to the same host reuse TCP/TLS connections
+instead of handshaking every time. `requests.Session` objects are not
+guaranteed to be thread-safe, so each thread gets its own lightweight
+session that mounts the shared adapter.
+
+Every call records connect time (zero when a pooled connection is reused),
+time to first byte (response headers received) and total time per
+upstream.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from config import HTTP_CONNECT_TIMEOUT, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE
+from services.tracing import span
+
+_connect_timing = threading.local()
+
+
+def _record_connect(seconds: float) -> None:
+    _connect_timing.seconds = getattr(_connect_timing, 'seconds', 0.0) + seconds
+    _connect_timing.count = getattr(_connect_timing, 'count', 0) + 1
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(time.perf_counter() - started)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # Includes the TLS handshake
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(time.perf_counter() - started)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools time new connections."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class UpstreamStats:
+    """Latency counters for one upstream API."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+        self.connect_seconds = 0.0
+        self.ttfb_seconds = 0.0
+        self.total_seconds = 0.0
+        self.max_total_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        completed = self.requests - self.errors
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'connections_opened': self.connections_opened,
+            'connection_reuse_ratio': (
+                1 - self.connections_opened / self.requests if self.requests else 0.0
+            ),
+            'avg_connect_ms': self.connect_seconds / self.requests * 1000 if self.requests else 0.0,
+            'avg_ttfb_ms': self.ttfb_seconds / completed * 1000 if completed else 0.0,
+            'avg_total_ms': self.total_seconds / completed * 1000 if completed else 0.0,
+            'max_total_ms': self.max_total_seconds * 1000,
+        }
+
+
+class PooledHTTPClient:
+    """Thread-safe HTTP client with a shared keep-alive connection pool."""
+
+    def __init__(
+        self,
+        pool_connections: int = HTTP_POOL_CONNECTIONS,
+        pool_maxsize: int = HTTP_POOL_MAXSIZE,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+    ):
+        self.connect_timeout = connect_timeout
+        # pool_connections is the number of per-host pools kept, pool_maxsize
+        # the number of idle keep-alive connections kept per host
+        self._adapter = _TimedHTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0,
+        )
+        self._local = threading.local()
+        self._stats: Dict[str, UpstreamStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+            self._local.session = session
+        return session
+
+    def post(
+        self,
+        url: str,
+        *,
+        upstream: str,
+        read_timeout: float,
+        connect_timeout: Optional[float] = None,
+        stream: bool = False,
+        **kwargs,
+    ) -> requests.Response:
+        """POST to `url` over a pooled connection and record its latency.
+
+        With `stream=True` the body is left unread and the recorded total
+        time ends when the response headers arrive.
+        """
+        timeout = (connect_timeout or self.connect_timeout, read_timeout)
+        _connect_timing.seconds = 0.0
+        _connect_timing.count = 0
+        started = time.perf_counter()
+
+        with span('http', upstream=upstream, stream=stream) as current:
+            try:
+                response = self._session().post(url, timeout=timeout, stream=True, **kwargs)
+                ttfb = time.perf_counter() - started
+                if not stream:
+                    # Read the body now so the connection returns to the pool
+                    response.content
+            except requests.exceptions.RequestException:
+                self._record(upstream, error=True, elapsed=time.perf_counter() - started)
+                raise
+
+            self._record(upstream, ttfb=ttfb, elapsed=time.perf_counter() - started)
+            if current:
+                current.set(
+                    status=response.status_code,
+                    ttfb_ms=round(ttfb * 1000, 3),
+                    new_connections=_connect_timing.count,
+                )
+        return response
+
+    def _record(self, upstream: str, elapsed: float, ttfb: float = 0.0, error: bool = False) -> None:
+        self.record(
+            upstream,
+            elapsed,
+            ttfb=ttfb,
+            error=error,
+            connections=getattr(_connect_timing, 'count', 0),
+            connect_seconds=getattr(_connect_timing, 'seconds', 0.0),
+        )
+
+    def record(
+        self,
+        upstream: str,
+        elapsed: float,
+        ttfb: float = 0.0,
+        error: bool = False,
+        connections: int = 0,
+        connect_seconds: float = 0.0,
+    ) -> None:
+        """Record one upstream call; also used by the async client so both share stats."""
+        with self._stats_lock:
+            stats = self._stats.setdefault(upstream, UpstreamStats())
+            stats.requests += 1
+            stats.connections_opened += connections
+            stats.connect_seconds += connect_seconds
+            if error:
+                stats.errors += 1
+                return
+            stats.ttfb_seconds += ttfb
+            stats.total_seconds += elapsed
+            stats.max_total_seconds = max(stats.max_total_seconds, elapsed)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return latency counters keyed by upstream name."""
+        with self._stats_lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+
+# Singleton instance
+http_client = PooledHTTPClient()
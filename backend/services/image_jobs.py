@@ -0,0 +1,176 @@
+"""Background image generation so scene images do not delay story responses.
+
+Routes submit the image prompt and return the job id right away; clients
+fetch the result from `GET /api/game/image/<job_id>` (or receive it over
+SSE). Concurrency is capped by the worker pool and the number of jobs
+waiting for a worker is bounded, so a burst of turns cannot queue an
+unbounded backlog of upstream image calls.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import IMAGE_JOB_QUEUE_SIZE, IMAGE_JOB_TTL_SECONDS, IMAGE_JOB_WORKERS
+from services.image_service import image_service
+
+
+class ImageJob:
+    """A single queued image generation."""
+
+    def __init__(self, prompt: str):
+        self.job_id = str(uuid.uuid4())
+        self.prompt = prompt
+        self.status = 'queued'
+        self.image_url: Optional[str] = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'image_url': self.image_url,
+            'error': self.error,
+        }
+
+
+class ImageJobQueue:
+    """Bounded worker pool that runs image generations in the background."""
+
+    def __init__(
+        self,
+        generate: Callable[[str], Optional[str]],
+        max_workers: int = IMAGE_JOB_WORKERS,
+        max_queued: int = IMAGE_JOB_QUEUE_SIZE,
+        ttl_seconds: float = IMAGE_JOB_TTL_SECONDS,
+    ):
+        self._generate = generate
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max(0, max_queued)
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-job')
+        self._jobs: Dict[str, ImageJob] = {}
+        self._condition = threading.Condition()
+        self._queued = 0
+        self._running = 0
+        self._max_queue_depth = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def submit(self, prompt: str) -> Optional[str]:
+        """Queue an image generation and return its job id.
+
+        Returns None when the queue is full; callers should then respond
+        without an image rather than block.
+        """
+        if not prompt:
+            return None
+
+        with self._condition:
+            self._prune_expired()
+            if self._queued >= self.max_queued + max(self.max_workers - self._running, 0):
+                self._rejected += 1
+                print(f"Image job queue full ({self._queued} queued); skipping image generation")
+                return None
+
+            job = ImageJob(prompt)
+            self._jobs[job.job_id] = job
+            self._queued += 1
+            self._submitted += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queued)
+
+        self._executor.submit(self._run, job)
+        return job.job_id
+
+    def _run(self, job: ImageJob) -> None:
+        with self._condition:
+            self._queued -= 1
+            self._running += 1
+            job.status = 'running'
+            job.started_at = time.monotonic()
+
+        image_url = None
+        error = None
+        try:
+            image_url = self._generate(job.prompt)
+        except Exception as e:
+            error = str(e)
+
+        with self._condition:
+            self._running -= 1
+            job.finished_at = time.monotonic()
+            if error is None:
+                job.status = 'completed'
+                job.image_url = image_url
+                self._completed += 1
+            else:
+                job.status = 'failed'
+                job.error = error
+                self._failed += 1
+            self._wait_seconds += job.started_at - job.submitted_at
+            self._run_seconds += job.finished_at - job.started_at
+            self._condition.notify_all()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job's current status, or None if it is unknown or expired."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Block until the job finishes or `timeout` elapses, then return its status."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            job = self._jobs.get(job_id)
+            while job and not job.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return job.to_dict() if job else None
+
+    def _prune_expired(self) -> None:
+        """Forget finished jobs older than the TTL (caller holds the lock)."""
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and now - job.finished_at > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, concurrency and outcome counters."""
+        with self._condition:
+            finished = self._completed + self._failed
+            return {
+                'workers': self.max_workers,
+                'max_queued': self.max_queued,
+                'queue_depth': self._queued,
+                'max_queue_depth': self._max_queue_depth,
+                'running': self._running,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'tracked_jobs': len(self._jobs),
+                'avg_queue_wait_ms': self._wait_seconds / finished * 1000 if finished else 0.0,
+                'avg_run_ms': self._run_seconds / finished * 1000 if finished else 0.0,
+            }
+
+
+# Singleton instance
+image_jobs = ImageJobQueue(image_service.generate_image_url)
@@ -1,24 +1,175 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import threading
+import aiohttp
 import requests
 import random
-from typing import Optional
-from config import CLOUDFLARE_API_TOKEN, CLOUDFLARE_ACCOUNT_ID
+from typing import Any, Dict, Optional
+from config import (
+    CLOUDFLARE_API_TOKEN, CLOUDFLARE_ACCOUNT_ID, CLOUDFLARE_BASE_URL, CLOUDFLARE_READ_TIMEOUT, IMAGE_CACHE_DIR
+)
+from services.async_http_client import async_http_client
+from services.http_client import http_client
+from services.metrics import timed
+from services.singleflight import SingleFlight
+
+# Public path the images blueprint serves cached files under
+IMAGE_URL_PREFIX = '/api/images'
+
+# (magic bytes, file extension, mime type) for the formats the model returns
+_IMAGE_FORMATS = (
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'RIFF', 'webp', 'image/webp'),
+)
+_MIME_TYPES = {ext: mime for _, ext, mime in _IMAGE_FORMATS}
+_CACHED_NAME = re.compile(r'^([0-9a-f]{64})\.(jpg|png|webp)$')
 
 
 class ImageGenerationService:
     """Service for generating images using Cloudflare Workers AI."""
     
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None):
         self.api_token = CLOUDFLARE_API_TOKEN
         self.account_id = CLOUDFLARE_ACCOUNT_ID
+        self.model = "@cf/black-forest-labs/flux-1-schnell"
+        self.steps = 8  # max allowed for schnell
         self.base_url = (
-            f"https://api.cloudflare.com/client/v4/accounts/{self.account_id}/ai/run/@cf/black-forest-labs/flux-1-schnell"
+            f"{CLOUDFLARE_BASE_URL.rstrip('/')}/accounts/{self.account_id}/ai/run/{self.model}"
             if self.account_id else None
         )
+
+        # Generated images are stored content-addressed by prompt and model
+        # parameters, so a repeated prompt is served from disk
+        self.cache_dir = os.path.abspath(cache_dir or IMAGE_CACHE_DIR)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._inflight = SingleFlight('cloudflare')
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stored = 0
+
+    def _cache_key(self, prompt: str) -> str:
+        """Generate a cache key from the prompt and the model parameters."""
+        params = {"model": self.model, "steps": self.steps, "prompt": prompt}
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _find_cached(self, cache_key: str) -> Optional[str]:
+        """Return the cached file name for `cache_key`, if one exists."""
+        for _, ext, _ in _IMAGE_FORMATS:
+            filename = f"{cache_key}.{ext}"
+            path = os.path.join(self.cache_dir, filename)
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                return filename
+        return None
+
+    def _store(self, cache_key: str, image_base64: str) -> Optional[str]:
+        """Decode a base64 image and write it to the cache; return its file name."""
+        try:
+            image_bytes = base64.b64decode(image_base64, validate=True)
+        except (binascii.Error, ValueError) as e:
+            print(f"Error decoding generated image: {e}")
+            return None
+
+        ext = next((ext for magic, ext, _ in _IMAGE_FORMATS if image_bytes.startswith(magic)), 'png')
+        filename = f"{cache_key}.{ext}"
+        out_path = os.path.join(self.cache_dir, filename)
+        tmp_path = f"{out_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(image_bytes)
+            # Atomic move into place
+            os.replace(tmp_path, out_path)
+        except OSError as e:
+            print(f"Error writing image cache file: {e}")
+            return None
+        return filename
+
+    def image_url(self, filename: str) -> str:
+        """Return the URL a cached image file is served from."""
+        return f"{IMAGE_URL_PREFIX}/{filename}"
+
+    def cached_image(self, filename: str) -> Optional[Dict[str, str]]:
+        """Resolve a served file name to its path, ETag and mime type.
+
+        Returns None for names that are not cache entries or are missing.
+        """
+        match = _CACHED_NAME.match(filename or '')
+        if not match:
+            return None
+        path = os.path.join(self.cache_dir, filename)
+        if not os.path.exists(path):
+            return None
+        return {'path': path, 'etag': match.group(1), 'mimetype': _MIME_TYPES[match.group(2)]}
+
+    def _lookup(self, prompt: str):
+        """Return (cache_key, cached_url) and count the hit or miss."""
+        cache_key = self._cache_key(prompt)
+        filename = self._find_cached(cache_key)
+        with self._stats_lock:
+            if filename:
+                self._hits += 1
+            else:
+                self._misses += 1
+        return cache_key, self.image_url(filename) if filename else None
+
+    def _store_url(self, cache_key: str, image_base64: Optional[str]) -> Optional[str]:
+        """Cache a freshly generated image and return its URL."""
+        if not image_base64:
+            return None
+
+        filename = self._store(cache_key, image_base64)
+        if not filename:
+            return None
+        with self._stats_lock:
+            self._stored += 1
+        return self.image_url(filename)
+
+    def generate_image_url(self, prompt: str) -> Optional[str]:
+        """
+        Return the URL of the image for `prompt`, generating it on a cache miss.
+        Returns None if generation fails.
+        """
+        if not prompt:
+            return None
+
+        cache_key, cached_url = self._lookup(prompt)
+        if cached_url:
+            return cached_url
+        return self._store_url(cache_key, self.generate_image(prompt))
+
+    async def generate_image_url_async(self, prompt: str) -> Optional[str]:
+        """Coroutine version of `generate_image_url` for the async server."""
+        if not prompt:
+            return None
+
+        cache_key, cached_url = self._lookup(prompt)
+        if cached_url:
+            return cached_url
+        return self._store_url(cache_key, await self.generate_image_async(prompt))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return image cache hit/miss counters."""
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'stored': self._stored,
+                'hit_ratio': self._hits / lookups if lookups else 0.0,
+            }
     
+    @timed('generate_image')
     def generate_image(self, prompt: str) -> Optional[str]:
         """
         Generate an image based on the prompt using Cloudflare FLUX.1 [schnell].
         Returns the base64 encoded image string or None if generation fails.
+        Concurrent calls for the same prompt share one upstream request.
         """
         if not self.api_token or not self.account_id:
             print("Warning: Cloudflare credentials not configured. Skipping image generation.")
@@ -26,7 +177,23 @@ class ImageGenerationService:
         
         if not self.base_url:
             return None
-            
+
+        return self._inflight.do(self._cache_key(prompt), self._request_image, prompt)
+
+    @timed('generate_image')
+    async def generate_image_async(self, prompt: str) -> Optional[str]:
+        """Coroutine version of `generate_image` for the async server."""
+        if not self.api_token or not self.account_id:
+            print("Warning: Cloudflare credentials not configured. Skipping image generation.")
+            return None
+
+        if not self.base_url:
+            return None
+
+        return await self._inflight.do_async(self._cache_key(prompt), self._request_image_async, prompt)
+
+    def _image_request(self, prompt: str):
+        """Return the (headers, body) of an image generation request."""
         headers = {
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json",
@@ -35,27 +202,41 @@ class ImageGenerationService:
         # flux-1-schnell uses JSON format
         data = {
             "prompt": prompt,
-            "steps": 8,  # max allowed for schnell
+            "steps": self.steps,
         }
+        return headers, data
+
+    def _extract_image(self, response) -> Optional[str]:
+        """Pull the base64 image out of a Cloudflare response."""
+        if response.status_code != 200:
+            print(f"Error generating image: {response.status_code} - {response.text}")
+            return None
+            
+        result = response.json()
+        
+        if result.get("success") and "result" in result:
+            image_data = result["result"].get("image")
+            return image_data
+        elif "image" in result:
+            return result["image"]
+        else:
+            print(f"Unexpected response format: {result.keys()}")
+            return None
+
+    def _request_image(self, prompt: str) -> Optional[str]:
+        """Send one image generation request to Cloudflare."""
+        headers, data = self._image_request(prompt)
         
         try:
             print(f"Generating image for prompt: {prompt[:80]}...")
-            response = requests.post(self.base_url, headers=headers, json=data, timeout=60)
-            
-            if response.status_code != 200:
-                print(f"Error generating image: {response.status_code} - {response.text}")
-                return None
-                
-            result = response.json()
-            
-            if result.get("success") and "result" in result:
-                image_data = result["result"].get("image")
-                return image_data
-            elif "image" in result:
-                return result["image"]
-            else:
-                print(f"Unexpected response format: {result.keys()}")
-                return None
+            response = http_client.post(
+                self.base_url,
+                upstream='cloudflare',
+                headers=headers,
+                json=data,
+                read_timeout=CLOUDFLARE_READ_TIMEOUT,
+            )
+            return self._extract_image(response)
 
         except requests.exceptions.RequestException as e:
             print(f"Request error during image generation: {e}")
@@ -64,6 +245,28 @@ class ImageGenerationService:
             print(f"Unexpected error during image generation: {e}")
             return None
 
+    async def _request_image_async(self, prompt: str) -> Optional[str]:
+        """Send one image generation request without blocking the event loop."""
+        headers, data = self._image_request(prompt)
+
+        try:
+            print(f"Generating image for prompt: {prompt[:80]}...")
+            response = await async_http_client.post(
+                self.base_url,
+                upstream='cloudflare',
+                headers=headers,
+                json=data,
+                read_timeout=CLOUDFLARE_READ_TIMEOUT,
+            )
+            return self._extract_image(response)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Request error during image generation: {e}")
+            return None
+        except Exception as e:
+            print(f"Unexpected error during image generation: {e}")
+            return None
+
 
 # Singleton instance
 image_service = ImageGenerationService()
@@ -0,0 +1,93 @@
+"""Persistent cache of parsed LLM responses.
+
+Story continuations and generated choices are pure functions of the
+model, system prompt and rendered prompt, so replays from saves, retries
+and the default opening can reuse an earlier response instead of calling
+Perplexity again. Entries live in the `llm_response_cache` table, so they
+survive restarts and are shared by every worker process. Entries expire
+after a TTL, and the least recently used ones are evicted once the table
+holds more than `max_entries`. Only successfully parsed responses are
+stored; fallbacks are never cached.
+"""
+
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from config import LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS
+from database.db_manager import db_manager
+from services.singleflight import request_fingerprint
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace so formatting-only differences share an entry."""
+    return _WHITESPACE.sub(' ', text or '').strip()
+
+
+class LLMResponseCache:
+    """SQLite-backed response cache with a TTL and LRU eviction."""
+
+    def __init__(
+        self,
+        enabled: bool = LLM_CACHE_ENABLED,
+        ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+    ):
+        self.enabled = enabled and max_entries > 0
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._stored = 0
+
+    def key(self, model: str, system_prompt: str, prompt: str) -> str:
+        """Return the cache key for a completion request."""
+        return request_fingerprint(model, normalize_prompt(system_prompt), normalize_prompt(prompt))
+
+    def get(self, key: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """Return the cached response for `key`, or None on a miss or bypass."""
+        if not self.enabled:
+            return None
+        if not use_cache:
+            with self._lock:
+                self._bypassed += 1
+            return None
+
+        response = db_manager.get_llm_cache_entry(key, self.ttl_seconds)
+        with self._lock:
+            if response is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return response
+
+    def put(self, key: str, model: str, response: Optional[Dict[str, Any]]) -> None:
+        """Store a parsed response; empty responses are ignored."""
+        if not self.enabled or not response:
+            return
+        if db_manager.store_llm_cache_entry(key, model, response, self.ttl_seconds, self.max_entries):
+            with self._lock:
+                self._stored += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'ttl_seconds': self.ttl_seconds,
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'bypassed': self._bypassed,
+                'stored': self._stored,
+                'hit_ratio': self._hits / lookups if lookups else 0.0,
+            }
+
+
+# Singleton instance
+llm_cache = LLMResponseCache()
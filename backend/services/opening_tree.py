@@ -0,0 +1,232 @@
+"""Shared, precomputed opening turns for games that use the default start.
+
+Every default `/start` shows the same opening story and choices, so the
+first few turns are identical for every player who picks the same path.
+The opening tree stores those turns (story, choices and image) a few levels
+deep in the `opening_tree` table; sessions are served from it until they
+leave it, at zero upstream cost.
+
+Stories in the tree are written for the default character, so sessions
+with any other character (e.g. a custom `character_name`) are never served
+from it. Rebuild the tree offline, then restart the server to pick it up::
+
+    python -m services.opening_tree --depth 2 --images
+"""
+
+import argparse
+import threading
+from typing import Any, Dict, List, Optional
+
+from config import PERPLEXITY_API_KEY
+from database.db_manager import (
+    db_manager,
+    init_database,
+    DEFAULT_CHARACTER_INFO,
+    DEFAULT_OPENING_CHOICES,
+    DEFAULT_OPENING_IMAGE_PROMPT,
+    DEFAULT_OPENING_STORY,
+)
+from models.game_state import GameState
+from services.ai_service import ai_service
+from services.image_service import image_service
+
+
+def child_path(path: str, choice_index: int) -> str:
+    """Return the tree path reached by taking `choice_index` at `path`."""
+    return f"{path}.{choice_index}" if path else str(choice_index)
+
+
+def is_default_character(character_info: Optional[Dict[str, Any]]) -> bool:
+    """Whether the story prompt would describe `character_info` as the default character."""
+    character_info = character_info or DEFAULT_CHARACTER_INFO
+    return all(
+        (character_info.get(field) or DEFAULT_CHARACTER_INFO[field]) == DEFAULT_CHARACTER_INFO[field]
+        for field in ('name', 'traits', 'inventory')
+    )
+
+
+class OpeningTree:
+    """In-memory view of the persisted opening tree."""
+
+    def __init__(self):
+        self._nodes: Optional[Dict[str, Dict[str, Any]]] = None
+        self._depth = 0
+        self._lock = threading.Lock()
+        self._served = 0
+
+    def _get_nodes(self) -> Dict[str, Dict[str, Any]]:
+        # Loaded once, on first use; the tree only changes through the CLI
+        if self._nodes is None:
+            with self._lock:
+                if self._nodes is None:
+                    self._load()
+        return self._nodes
+
+    def _load(self) -> None:
+        nodes = {}
+        for node in db_manager.get_opening_tree():
+            # Images are served from the image cache; drop URLs whose file is
+            # missing so the route regenerates them from the prompt instead
+            image_url = node.get('image_url')
+            if image_url and not image_service.cached_image(image_url.rsplit('/', 1)[-1]):
+                node['image_url'] = None
+            nodes[node['path']] = node
+        self._depth = max((path.count('.') + 1 for path in nodes if path), default=0)
+        self._nodes = nodes
+
+    def reload(self) -> None:
+        """Re-read the tree from the database."""
+        with self._lock:
+            self._load()
+
+    def _path_of(self, game_state) -> Optional[str]:
+        """Return the tree path `game_state` is at, or None once it has left the tree."""
+        nodes = self._get_nodes()
+        node = nodes.get('')
+        history = game_state.choices_history
+        if not node or len(history) >= self._depth or not is_default_character(game_state.character_info):
+            return None
+
+        path = ''
+        for entry in history:
+            try:
+                choice_index = node['choices'].index(entry.get('choice'))
+            except ValueError:
+                return None
+            path = child_path(path, choice_index)
+            node = nodes.get(path)
+            if not node or node['story'] != entry.get('story_segment'):
+                return None
+
+        if node['story'] != game_state.current_story:
+            return None
+        return path
+
+    def next_turn(self, game_state, choice: str) -> Optional[Dict[str, Any]]:
+        """Return the precomputed turn for `choice`, or None if it is not in the tree."""
+        path = self._path_of(game_state)
+        if path is None:
+            return None
+        nodes = self._get_nodes()
+        try:
+            choice_index = nodes[path]['choices'].index(choice)
+        except ValueError:
+            return None
+        node = nodes.get(child_path(path, choice_index))
+        if not node:
+            return None
+
+        with self._lock:
+            self._served += 1
+        return {
+            'story': node['story'],
+            'choices': list(node['choices']),
+            'image_prompt': node['image_prompt'],
+            'image_url': node['image_url'],
+        }
+
+    def covers_next_turn(self, game_state) -> bool:
+        """Whether every choice of the displayed turn is in the tree."""
+        path = self._path_of(game_state)
+        if path is None:
+            return False
+        nodes = self._get_nodes()
+        return all(
+            child_path(path, choice_index) in nodes
+            for choice_index in range(len(nodes[path]['choices']))
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return tree size and how many turns it has served."""
+        nodes = self._get_nodes()
+        with self._lock:
+            return {
+                'nodes': len(nodes),
+                'depth': self._depth,
+                'served': self._served,
+            }
+
+
+def build_opening_tree(depth: int, include_images: bool = False) -> List[Dict[str, Any]]:
+    """Generate the opening tree `depth` turns below the default opening.
+
+    Each continuation is generated from the same context a live session
+    would have at that node. Raises RuntimeError if a generation falls back
+    to the canned response, so a broken upstream never gets persisted.
+    """
+    root_state = GameState()
+    root_state.character_info = dict(DEFAULT_CHARACTER_INFO)
+    root_state.apply_opening()
+    fallback_story = ai_service._get_fallback_response()['story']
+
+    root = {
+        'path': '',
+        'story': DEFAULT_OPENING_STORY,
+        'choices': list(DEFAULT_OPENING_CHOICES),
+        'image_prompt': DEFAULT_OPENING_IMAGE_PROMPT,
+        'image_url': image_service.generate_image_url(DEFAULT_OPENING_IMAGE_PROMPT) if include_images else None,
+    }
+    nodes = [root]
+    frontier = [(root, root_state)]
+
+    for level in range(depth):
+        next_frontier = []
+        for parent, parent_state in frontier:
+            for choice_index, choice in enumerate(parent['choices']):
+                path = child_path(parent['path'], choice_index)
+                print(f"Generating opening node {path} (level {level + 1}/{depth})...")
+                story, choices, image_prompt = ai_service.generate_story_continuation(
+                    parent_state.get_recent_context(), choice, parent_state.character_info
+                )
+                if story == fallback_story and PERPLEXITY_API_KEY:
+                    raise RuntimeError(f"Story generation fell back to the canned response at node {path}")
+
+                # Mirror how a live turn is applied to the game state
+                state = parent_state.clone()
+                state.add_choice_to_history(choice, story)
+                state.current_story = story
+                state.current_choices = choices
+                state.update_story_context()
+
+                node = {
+                    'path': path,
+                    'story': story,
+                    'choices': choices,
+                    'image_prompt': image_prompt,
+                    'image_url': image_service.generate_image_url(image_prompt) if include_images else None,
+                }
+                nodes.append(node)
+                next_frontier.append((node, state))
+        frontier = next_frontier
+
+    return nodes
+
+
+# Singleton instance
+opening_tree = OpeningTree()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the precomputed opening tree.")
+    parser.add_argument('--depth', type=int, default=2, help='Turns to precompute below the opening')
+    parser.add_argument('--images', action='store_true', help='Also generate and cache scene images')
+    parser.add_argument(
+        '--allow-fallback', action='store_true',
+        help='Build from the offline fallback story when no Perplexity API key is configured'
+    )
+    args = parser.parse_args()
+
+    if not PERPLEXITY_API_KEY and not args.allow_fallback:
+        parser.error("PERPLEXITY_API_KEY is not set; pass --allow-fallback to build from the offline story")
+
+    if not init_database():
+        raise SystemExit(1)
+
+    nodes = build_opening_tree(args.depth, include_images=args.images)
+    if not db_manager.replace_opening_tree(nodes):
+        raise SystemExit(1)
+    print(f"Stored {len(nodes)} opening tree nodes in {db_manager.db_path}; restart the server to serve them")
+
+
+if __name__ == '__main__':
+    main()
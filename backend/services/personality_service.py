@@ -43,6 +43,7 @@ class PersonalityService:
         if not cached or cached.get('status') != 'completed':
             return None
 
+        # Both fingerprints are stored strings; the history is not re-serialized
         current_fingerprint = game_state.get_history_fingerprint()
         profile = self._serialize_profile(cached)
         profile['is_stale'] = cached.get('history_fingerprint') != current_fingerprint
@@ -87,7 +88,7 @@ class PersonalityService:
         )
 
         try:
-            raw_response = self._request_analysis(game_state)
+            raw_response = self._request_analysis(game_state, force_refresh)
             normalized = self._normalize_analysis(raw_response, game_state)
 
             db_manager.upsert_personality_profile(
@@ -142,8 +143,12 @@ class PersonalityService:
 
             raise AIAnalysisUnavailableError('Personality analysis service unavailable') from exc
 
-    def _request_analysis(self, game_state: GameState) -> Dict[str, Any]:
-        """Request analysis from the AI provider or return a deterministic mock."""
+    def _request_analysis(self, game_state: GameState, force_refresh: bool = False) -> Dict[str, Any]:
+        """Request analysis from the AI provider or return a deterministic mock.
+
+        A forced refresh bypasses the LLM response cache as well as the
+        stored profile, so it always reaches the provider.
+        """
         if not ai_service.api_key or ai_service.api_key == 'your_api_key_here':
             return self._get_mock_analysis(game_state)
 
@@ -152,6 +157,7 @@ class PersonalityService:
             user_prompt=self._build_user_prompt(game_state),
             fallback=None,
             model=PERSONALITY_ANALYSIS_MODEL,
+            use_cache=not force_refresh,
         )
         if not isinstance(response, dict):
             raise AIAnalysisUnavailableError('Invalid AI response')
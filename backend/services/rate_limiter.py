@@ -0,0 +1,234 @@
+"""Client-side rate limiting and priority scheduling of outbound Perplexity calls.
+
+Interactive turns, custom-start choices, personality analyses and
+speculative pre-generation all draw on one Perplexity quota. A token
+bucket refilled at the configured rate admits calls, and waiting calls are
+served strictly by priority class (FIFO within a class):
+
+    interactive > custom_start > personality > speculative
+
+Each class has a bounded queue and a maximum wait. A call is dropped with
+`RateLimitExceeded` when its queue is full, when its wait runs out, or as
+soon as the bucket's refill rate shows it cannot be admitted before then,
+so callers fall back right away instead of holding a thread for nothing.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from config import (
+    PERPLEXITY_MAX_WAIT_CUSTOM_START,
+    PERPLEXITY_MAX_WAIT_INTERACTIVE,
+    PERPLEXITY_MAX_WAIT_PERSONALITY,
+    PERPLEXITY_MAX_WAIT_SPECULATIVE,
+    PERPLEXITY_QUEUE_SIZE,
+    PERPLEXITY_RATE_LIMIT_BURST,
+    PERPLEXITY_RATE_LIMIT_PER_MINUTE,
+)
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_CUSTOM_START = 'custom_start'
+PRIORITY_PERSONALITY = 'personality'
+PRIORITY_SPECULATIVE = 'speculative'
+
+# Highest priority first
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_CUSTOM_START, PRIORITY_PERSONALITY, PRIORITY_SPECULATIVE)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call is not admitted; `reason` is 'queue_full' or 'deadline'."""
+
+    def __init__(self, priority: str, reason: str):
+        super().__init__(f"{priority} request dropped ({reason})")
+        self.priority = priority
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ('priority', 'enqueued_at', 'deadline')
+
+    def __init__(self, priority: str, max_wait: float):
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + max_wait
+
+
+class _ClassStats:
+    """Queue-wait counters for one priority class."""
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def to_dict(self, queue_depth: int) -> Dict[str, Any]:
+        return {
+            'queue_depth': queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'admitted': self.admitted,
+            'rejected_queue_full': self.rejected,
+            'dropped_deadline': self.dropped,
+            'avg_wait_ms': self.wait_seconds / self.admitted * 1000 if self.admitted else 0.0,
+            'max_wait_ms': self.max_wait_seconds * 1000,
+        }
+
+
+class PriorityRateLimiter:
+    """Token bucket whose waiting callers are admitted in priority order."""
+
+    def __init__(
+        self,
+        name: str,
+        per_minute: float = PERPLEXITY_RATE_LIMIT_PER_MINUTE,
+        burst: int = PERPLEXITY_RATE_LIMIT_BURST,
+        max_queued: int = PERPLEXITY_QUEUE_SIZE,
+        max_wait: Optional[Dict[str, float]] = None,
+        poll_interval: float = 0.05,
+    ):
+        self.name = name
+        self.enabled = per_minute > 0
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_queued = max(0, max_queued)
+        self.max_wait = max_wait or {
+            PRIORITY_INTERACTIVE: PERPLEXITY_MAX_WAIT_INTERACTIVE,
+            PRIORITY_CUSTOM_START: PERPLEXITY_MAX_WAIT_CUSTOM_START,
+            PRIORITY_PERSONALITY: PERPLEXITY_MAX_WAIT_PERSONALITY,
+            PRIORITY_SPECULATIVE: PERPLEXITY_MAX_WAIT_SPECULATIVE,
+        }
+        self.poll_interval = poll_interval
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._queues: Dict[str, Deque[_Waiter]] = {priority: deque() for priority in PRIORITIES}
+        self._stats: Dict[str, _ClassStats] = {priority: _ClassStats() for priority in PRIORITIES}
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _ahead_of(self, waiter: _Waiter) -> int:
+        """Number of queued callers that will be admitted before `waiter`."""
+        ahead = 0
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            if priority == waiter.priority:
+                return ahead + queue.index(waiter)
+            ahead += len(queue)
+        return ahead
+
+    def _enqueue(self, priority: str, max_wait: Optional[float]) -> _Waiter:
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority}")
+        queue = self._queues[priority]
+        stats = self._stats[priority]
+        if len(queue) >= self.max_queued:
+            stats.rejected += 1
+            raise RateLimitExceeded(priority, 'queue_full')
+        waiter = _Waiter(priority, self.max_wait[priority] if max_wait is None else max_wait)
+        queue.append(waiter)
+        stats.max_queue_depth = max(stats.max_queue_depth, len(queue))
+        return waiter
+
+    def _remove(self, waiter: _Waiter) -> None:
+        try:
+            self._queues[waiter.priority].remove(waiter)
+        except ValueError:
+            return
+        self._condition.notify_all()
+
+    def _poll(self, waiter: _Waiter) -> Tuple[bool, float]:
+        """Admit `waiter` if it is next and a token is available (caller holds the lock).
+
+        Returns (admitted, seconds to wait before polling again). Raises
+        RateLimitExceeded once the waiter cannot be admitted before its deadline.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        ahead = self._ahead_of(waiter)
+
+        if ahead == 0 and self._tokens >= 1:
+            self._tokens -= 1
+            self._queues[waiter.priority].popleft()
+            waited = now - waiter.enqueued_at
+            stats = self._stats[waiter.priority]
+            stats.admitted += 1
+            stats.wait_seconds += waited
+            stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+            self._condition.notify_all()
+            return True, 0.0
+
+        # Earliest moment a token could be left for this waiter; callers of a
+        # higher class arriving later can only push it back
+        earliest = now + max(ahead + 1 - self._tokens, 0.0) / self.rate
+        if earliest > waiter.deadline:
+            self._stats[waiter.priority].dropped += 1
+            self._remove(waiter)
+            raise RateLimitExceeded(waiter.priority, 'deadline')
+        return False, max(earliest - now, 0.001)
+
+    def acquire(self, priority: str = PRIORITY_INTERACTIVE, max_wait: Optional[float] = None) -> None:
+        """Block until a call of `priority` may be sent.
+
+        `max_wait` overrides the class's configured maximum wait. Raises
+        RateLimitExceeded if the call is dropped.
+        """
+        with self._condition:
+            if not self.enabled:
+                self._stats[priority].admitted += 1
+                return
+            waiter = self._enqueue(priority, max_wait)
+            try:
+                while True:
+                    admitted, wait = self._poll(waiter)
+                    if admitted:
+                        return
+                    self._condition.wait(wait)
+            except BaseException:
+                self._remove(waiter)
+                raise
+
+    async def acquire_async(self, priority: str = PRIORITY_INTERACTIVE, max_wait: Optional[float] = None) -> None:
+        """Coroutine version of `acquire` that waits without holding a thread."""
+        with self._condition:
+            if not self.enabled:
+                self._stats[priority].admitted += 1
+                return
+            waiter = self._enqueue(priority, max_wait)
+        try:
+            while True:
+                with self._condition:
+                    admitted, wait = self._poll(waiter)
+                if admitted:
+                    return
+                await asyncio.sleep(min(wait, self.poll_interval))
+        except BaseException:
+            with self._condition:
+                self._remove(waiter)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Return bucket state and per-class queue-wait counters."""
+        with self._condition:
+            if self.enabled:
+                self._refill(time.monotonic())
+            return {
+                'enabled': self.enabled,
+                'per_minute': self.rate * 60,
+                'burst': self.burst,
+                'tokens': round(self._tokens, 2),
+                'classes': {
+                    priority: self._stats[priority].to_dict(len(self._queues[priority]))
+                    for priority in PRIORITIES
+                },
+            }
+
+
+# Singleton instance
+perplexity_limiter = PriorityRateLimiter('perplexity')
@@ -0,0 +1,432 @@
+"""Retries, hedged requests and a circuit breaker for upstream API calls.
+
+`ResilientUpstream.call` wraps one logical request:
+
+- Transient failures (connection errors, timeouts, 408/429/5xx) are
+  retried with full-jitter exponential backoff, as long as the next
+  attempt still fits in the total latency budget.
+- With hedging on, a second copy of a slow request is sent once it has
+  been running longer than the recent p95 latency; whichever answers
+  first wins. Hedges only go out when the rate limiter has a token to
+  spare, so they never queue behind real work.
+- A circuit breaker opens after consecutive failures and fails calls
+  immediately (`CircuitOpenError`) until a single probe after the reset
+  period succeeds, so a down upstream costs players no waiting.
+
+Every attempt, including retries and hedges, takes its own rate limiter
+token.
+"""
+
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import aiohttp
+import requests
+
+from config import (
+    PERPLEXITY_BREAKER_FAILURES,
+    PERPLEXITY_BREAKER_RESET_SECONDS,
+    PERPLEXITY_HEDGE_ENABLED,
+    PERPLEXITY_HEDGE_MIN_DELAY_SECONDS,
+    PERPLEXITY_HEDGE_PERCENTILE,
+    PERPLEXITY_HEDGE_WORKERS,
+    PERPLEXITY_LATENCY_BUDGET_SECONDS,
+    PERPLEXITY_MAX_RETRIES,
+    PERPLEXITY_READ_TIMEOUT,
+    PERPLEXITY_RETRY_BASE_SECONDS,
+    PERPLEXITY_RETRY_MAX_SECONDS,
+)
+from services.rate_limiter import PRIORITY_INTERACTIVE, PriorityRateLimiter, perplexity_limiter
+from services.tracing import span
+
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Do not start an attempt with less budget left than this
+_MIN_ATTEMPT_SECONDS = 1.0
+
+# Successful latencies needed before hedging starts
+_MIN_HEDGE_SAMPLES = 20
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed attempt is worth repeating."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRYABLE_STATUSES
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRYABLE_STATUSES
+    return isinstance(error, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        aiohttp.ClientError,
+        asyncio.TimeoutError,
+    ))
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether a failed attempt says the upstream itself is unhealthy.
+
+    Timeouts, connection errors, 408, 429 and 5xx responses count; other
+    4xx responses (a bad request or API key) are the caller's problem.
+    """
+    status = None
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+    elif isinstance(error, aiohttp.ClientResponseError):
+        status = error.status
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    return isinstance(error, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        aiohttp.ClientError,
+        asyncio.TimeoutError,
+    ))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold: int = PERPLEXITY_BREAKER_FAILURES,
+                 reset_seconds: float = PERPLEXITY_BREAKER_RESET_SECONDS):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._opens = 0
+        self._short_circuited = 0
+
+    def allow(self) -> bool:
+        """Return whether a call may go out now."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self._short_circuited += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self._opens += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self) -> None:
+        """Forget a permitted call that never reached the upstream."""
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'opens': self._opens,
+                'short_circuited': self._short_circuited,
+            }
+
+
+class ResilientUpstream:
+    """Retry, hedging and circuit-breaker policy for one upstream API."""
+
+    def __init__(
+        self,
+        name: str,
+        limiter: PriorityRateLimiter,
+        budget_seconds: float = PERPLEXITY_LATENCY_BUDGET_SECONDS,
+        attempt_timeout: float = PERPLEXITY_READ_TIMEOUT,
+        max_retries: int = PERPLEXITY_MAX_RETRIES,
+        backoff_base: float = PERPLEXITY_RETRY_BASE_SECONDS,
+        backoff_max: float = PERPLEXITY_RETRY_MAX_SECONDS,
+        hedge_enabled: bool = PERPLEXITY_HEDGE_ENABLED,
+        hedge_percentile: float = PERPLEXITY_HEDGE_PERCENTILE,
+        hedge_min_delay: float = PERPLEXITY_HEDGE_MIN_DELAY_SECONDS,
+        hedge_workers: int = PERPLEXITY_HEDGE_WORKERS,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.limiter = limiter
+        self.budget_seconds = budget_seconds
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_enabled = hedge_enabled and hedge_workers > 0
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        # Sync hedging runs both copies on this pool; the slots keep a
+        # saturated pool from queueing primaries behind other calls
+        self._executor = ThreadPoolExecutor(max_workers=max(1, hedge_workers), thread_name_prefix=f'{name}-hedge')
+        self._slots = threading.BoundedSemaphore(max(1, hedge_workers))
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._attempts = 0
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._budget_exhausted = 0
+        self._failures = 0
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a hedge is sent, or None while there is too little data."""
+        with self._lock:
+            if not self.hedge_enabled or len(self._latencies) < _MIN_HEDGE_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return max(self.hedge_min_delay, ordered[index])
+
+    def _backoff(self, retry: int) -> float:
+        # Full jitter keeps retries from a burst of failures from arriving together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    def _admit(self, priority: str, deadline: float, hedge: bool) -> None:
+        """Check the breaker, then take a rate limiter token (hedges never wait for one)."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        remaining = deadline - time.monotonic() - _MIN_ATTEMPT_SECONDS
+        max_wait = 0.0 if hedge else max(0.0, min(self.limiter.max_wait[priority], remaining))
+        try:
+            with span('rate_limit.wait', priority=priority):
+                self.limiter.acquire(priority, max_wait=max_wait)
+        except BaseException:
+            self.breaker.release()
+            raise
+        self._count('_attempts')
+        if hedge:
+            self._count('_hedges')
+
+    def _settle(self, started: float, error: Optional[BaseException]) -> None:
+        if error is None:
+            self.breaker.record_success()
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+        elif is_upstream_failure(error):
+            self.breaker.record_failure()
+        elif isinstance(error, Exception):
+            # The upstream answered; only the request was at fault
+            self.breaker.record_success()
+        else:
+            # Cancelled (a hedge lost the race): no verdict on the upstream
+            self.breaker.release()
+
+    def _attempt(self, send: Callable[[float], Any], priority: str, deadline: float, hedge: bool = False) -> Any:
+        """Make one admitted call with a read timeout capped by the remaining budget."""
+        with span('attempt', upstream=self.name, hedge=hedge):
+            self._admit(priority, deadline, hedge)
+            started = time.monotonic()
+            try:
+                result = send(max(0.1, min(self.attempt_timeout, deadline - started)))
+            except BaseException as e:
+                self._settle(started, e)
+                raise
+            self._settle(started, None)
+            return result
+
+    def _run_slot(self, *args) -> Any:
+        try:
+            return self._attempt(*args)
+        finally:
+            self._slots.release()
+
+    def _hedged(self, send: Callable[[float], Any], priority: str, deadline: float, hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None or not self._slots.acquire(blocking=False):
+            return self._attempt(send, priority, deadline)
+
+        # Copy the context so the attempts' spans join the caller's trace
+        primary = self._executor.submit(contextvars.copy_context().run, self._run_slot, send, priority, deadline)
+        pending = {primary}
+        done, _ = wait(pending, timeout=delay)
+        hedged = None
+        if not done and deadline - time.monotonic() > _MIN_ATTEMPT_SECONDS and self._slots.acquire(blocking=False):
+            hedged = self._executor.submit(
+                contextvars.copy_context().run, self._run_slot, send, priority, deadline, True
+            )
+            pending.add(hedged)
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is hedged:
+                        self._count('_hedge_wins')
+                    return future.result()
+                # A hedge that found no spare token simply did not happen
+                if future is hedged and not is_retryable(future.exception()):
+                    continue
+                error = error or future.exception()
+        raise error or requests.exceptions.Timeout(f"{self.name} latency budget exhausted")
+
+    def _retry_delay(self, error: Exception, retry: int, deadline: float) -> Optional[float]:
+        """Backoff before the next attempt, or None if the error is final."""
+        if isinstance(error, CircuitOpenError):
+            return None
+        if not is_retryable(error) or retry >= self.max_retries:
+            self._count('_failures')
+            return None
+        delay = self._backoff(retry)
+        if time.monotonic() + delay + _MIN_ATTEMPT_SECONDS > deadline:
+            self._count('_budget_exhausted')
+            self._count('_failures')
+            return None
+        self._count('_retries')
+        return delay
+
+    def call(self, send: Callable[[float], Any], priority: str = PRIORITY_INTERACTIVE, hedge: bool = True) -> Any:
+        """Run `send(read_timeout)` under the retry, hedging and breaker policy.
+
+        `send` must raise on failure (including HTTP error statuses). The
+        last error is re-raised once retries or the budget run out;
+        `CircuitOpenError` and `RateLimitExceeded` are raised immediately.
+        """
+        self._count('_calls')
+        deadline = time.monotonic() + self.budget_seconds
+        retry = 0
+        while True:
+            try:
+                return self._hedged(send, priority, deadline, hedge)
+            except Exception as e:
+                delay = self._retry_delay(e, retry, deadline)
+                if delay is None:
+                    raise
+            retry += 1
+            time.sleep(delay)
+
+    async def _attempt_async(self, send: Callable[[float], Awaitable[Any]], priority: str,
+                             deadline: float, hedge: bool = False) -> Any:
+        with span('attempt', upstream=self.name, hedge=hedge):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} circuit breaker is open")
+            remaining = deadline - time.monotonic() - _MIN_ATTEMPT_SECONDS
+            max_wait = 0.0 if hedge else max(0.0, min(self.limiter.max_wait[priority], remaining))
+            try:
+                with span('rate_limit.wait', priority=priority):
+                    await self.limiter.acquire_async(priority, max_wait=max_wait)
+            except BaseException:
+                self.breaker.release()
+                raise
+            self._count('_attempts')
+            if hedge:
+                self._count('_hedges')
+
+            started = time.monotonic()
+            try:
+                result = await send(max(0.1, min(self.attempt_timeout, deadline - started)))
+            except BaseException as e:
+                self._settle(started, e)
+                raise
+            self._settle(started, None)
+            return result
+
+    async def _hedged_async(self, send: Callable[[float], Awaitable[Any]], priority: str,
+                            deadline: float, hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None:
+            return await self._attempt_async(send, priority, deadline)
+
+        primary = asyncio.ensure_future(self._attempt_async(send, priority, deadline))
+        pending = {primary}
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        hedged = None
+        if not done and deadline - time.monotonic() > _MIN_ATTEMPT_SECONDS:
+            hedged = asyncio.ensure_future(self._attempt_async(send, priority, deadline, True))
+            pending.add(hedged)
+
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedged:
+                            self._count('_hedge_wins')
+                        return task.result()
+                    if task is hedged and not is_retryable(task.exception()):
+                        continue
+                    error = error or task.exception()
+        finally:
+            # The losing copy is cancelled rather than left running
+            for task in pending:
+                task.cancel()
+        raise error or asyncio.TimeoutError()
+
+    async def call_async(self, send: Callable[[float], Awaitable[Any]], priority: str = PRIORITY_INTERACTIVE,
+                         hedge: bool = True) -> Any:
+        """Coroutine version of `call`; `send` is a coroutine function."""
+        self._count('_calls')
+        deadline = time.monotonic() + self.budget_seconds
+        retry = 0
+        while True:
+            try:
+                return await self._hedged_async(send, priority, deadline, hedge)
+            except Exception as e:
+                delay = self._retry_delay(e, retry, deadline)
+                if delay is None:
+                    raise
+            retry += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return retry, hedge and breaker counters."""
+        hedge_delay = self.hedge_delay()
+        with self._lock:
+            counters = {
+                'calls': self._calls,
+                'attempts': self._attempts,
+                'retries': self._retries,
+                'hedges': self._hedges,
+                'hedge_wins': self._hedge_wins,
+                'budget_exhausted': self._budget_exhausted,
+                'failures': self._failures,
+            }
+        counters.update({
+            'budget_seconds': self.budget_seconds,
+            'hedge_enabled': self.hedge_enabled,
+            'hedge_delay_ms': hedge_delay * 1000 if hedge_delay is not None else None,
+            'breaker': self.breaker.stats(),
+        })
+        return counters
+
+
+# Singleton instance
+perplexity_resilience = ResilientUpstream('perplexity', perplexity_limiter)
@@ -0,0 +1,199 @@
+"""Per-session locks around the read-generate-write cycle of a turn.
+
+Without a lock, two concurrent choices for one session both load the same
+state, both pay for a generation and the last save wins. Holding the
+session's lock for the whole cycle serializes them.
+
+The 'memory' backend only serializes requests within one process. The
+'sqlite' backend additionally takes a lease row in `session_locks`, so
+several worker processes sharing the database also exclude each other; the
+lease expires after `SESSION_LOCK_LEASE_SECONDS` in case a worker dies
+while holding it.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from config import SESSION_LOCK_BACKEND, SESSION_LOCK_LEASE_SECONDS, SESSION_LOCK_TIMEOUT_SECONDS
+from database.db_manager import db_manager
+from services.tracing import span
+
+
+class SessionBusyError(Exception):
+    """Raised when a session's lock could not be acquired in time."""
+
+
+class SessionLockManager:
+    """Hands out one lock per session id, across processes with the sqlite backend."""
+
+    def __init__(
+        self,
+        backend: str = SESSION_LOCK_BACKEND,
+        timeout: float = SESSION_LOCK_TIMEOUT_SECONDS,
+        lease_seconds: float = SESSION_LOCK_LEASE_SECONDS,
+        poll_interval: float = 0.05,
+    ):
+        if backend not in ('memory', 'sqlite'):
+            raise ValueError(f"Unknown session lock backend: {backend}")
+        self.backend = backend
+        self.timeout = timeout
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        # session_id -> [lock, number of holders and waiters]
+        self._locks: Dict[str, list] = {}
+        self._guard = threading.Lock()
+        self._acquired = 0
+        self._contended = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+
+    @property
+    def shared(self) -> bool:
+        """Whether other processes may write sessions this manager locks.
+
+        The in-process session cache cannot see those writes, so state read
+        under a shared lock has to come from the database.
+        """
+        return self.backend == 'sqlite'
+
+    def _local_lock(self, session_id: str) -> threading.Lock:
+        with self._guard:
+            entry = self._locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _forget(self, session_id: str) -> None:
+        # Drop the lock once nobody holds or waits for it, so the map stays bounded
+        with self._guard:
+            entry = self._locks.get(session_id)
+            if entry:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._locks[session_id]
+
+    def _acquire_lease(self, session_id: str, owner: str, deadline: float) -> bool:
+        while True:
+            if db_manager.try_acquire_session_lock(session_id, owner, self.lease_seconds):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+
+    @contextmanager
+    def hold(self, session_id: str, timeout: Optional[float] = None) -> Iterator[None]:
+        """Hold the session's lock for the duration of a `with` block.
+
+        Raises SessionBusyError if it is not acquired within `timeout`
+        seconds (default `SESSION_LOCK_TIMEOUT_SECONDS`).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        lock = self._local_lock(session_id)
+
+        with span('session_lock.wait', backend=self.backend) as waiting:
+            contended = not lock.acquire(blocking=False)
+            if contended and not lock.acquire(timeout=max(timeout, 0)):
+                self._forget(session_id)
+                self._record(started, contended=True, timed_out=True)
+                raise SessionBusyError(f"Session {session_id} is busy")
+
+            owner = None
+            if self.backend == 'sqlite':
+                owner = uuid.uuid4().hex
+                if not self._acquire_lease(session_id, owner, deadline):
+                    lock.release()
+                    self._forget(session_id)
+                    self._record(started, contended=True, timed_out=True)
+                    raise SessionBusyError(f"Session {session_id} is busy")
+            if waiting:
+                waiting.set(contended=contended)
+
+        self._record(started, contended=contended or time.monotonic() - started > self.poll_interval)
+        try:
+            yield
+        finally:
+            if owner:
+                db_manager.release_session_lock(session_id, owner)
+            lock.release()
+            self._forget(session_id)
+
+    @asynccontextmanager
+    async def hold_async(self, session_id: str, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """Coroutine version of `hold` for the async server.
+
+        Takes the same per-session locks as `hold`, polling instead of
+        blocking so the event loop keeps running while it waits; database
+        calls run on the loop's default executor.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        lock = self._local_lock(session_id)
+        loop = asyncio.get_running_loop()
+
+        with span('session_lock.wait', backend=self.backend) as waiting:
+            contended = False
+            while not lock.acquire(blocking=False):
+                contended = True
+                if time.monotonic() >= deadline:
+                    self._forget(session_id)
+                    self._record(started, contended=True, timed_out=True)
+                    raise SessionBusyError(f"Session {session_id} is busy")
+                await asyncio.sleep(self.poll_interval)
+
+            owner = None
+            if self.backend == 'sqlite':
+                owner = uuid.uuid4().hex
+                while not await loop.run_in_executor(
+                    None, db_manager.try_acquire_session_lock, session_id, owner, self.lease_seconds
+                ):
+                    contended = True
+                    if time.monotonic() >= deadline:
+                        lock.release()
+                        self._forget(session_id)
+                        self._record(started, contended=True, timed_out=True)
+                        raise SessionBusyError(f"Session {session_id} is busy")
+                    await asyncio.sleep(self.poll_interval)
+            if waiting:
+                waiting.set(contended=contended)
+
+        self._record(started, contended=contended)
+        try:
+            yield
+        finally:
+            if owner:
+                await loop.run_in_executor(None, db_manager.release_session_lock, session_id, owner)
+            lock.release()
+            self._forget(session_id)
+
+    def _record(self, started: float, contended: bool, timed_out: bool = False) -> None:
+        with self._guard:
+            self._wait_seconds += time.monotonic() - started
+            if contended:
+                self._contended += 1
+            if timed_out:
+                self._timeouts += 1
+            else:
+                self._acquired += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return acquisition, contention and wait counters."""
+        with self._guard:
+            attempts = self._acquired + self._timeouts
+            return {
+                'backend': self.backend,
+                'acquired': self._acquired,
+                'contended': self._contended,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': self._wait_seconds / attempts * 1000 if attempts else 0.0,
+                'active_sessions': len(self._locks),
+            }
+
+
+# Singleton instance
+session_locks = SessionLockManager()
@@ -0,0 +1,145 @@
+"""Coalescing of identical in-flight upstream calls (singleflight).
+
+When several threads make the same call at once, say a double-clicked
+choice or two tabs narrating the same text, only the first one (the
+leader) runs it; the others wait for the leader and share its result or
+exception. Calls are matched by a fingerprint of their inputs, and only
+while the leader is still running: nothing is cached afterwards.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# Every group by name, for the health endpoint
+_groups: Dict[str, "SingleFlight"] = {}
+_groups_lock = threading.Lock()
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """Hash the inputs that determine an upstream call's result."""
+    serialized = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=repr)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    """One in-flight call that followers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        # Coroutine calls share outcomes through futures on the event loop
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._executions = 0
+        self._coalesced = 0
+        self._errors = 0
+        self._max_followers = 0
+        with _groups_lock:
+            _groups[name] = self
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call `fn(*args, **kwargs)`, or wait for an identical call already running.
+
+        Followers get a deep copy of the leader's result so callers can
+        mutate what they receive.
+        """
+        with self._lock:
+            self._requests += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self._coalesced += 1
+                self._max_followers = max(self._max_followers, call.followers)
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await `fn(*args, **kwargs)`, or an identical call already running on this loop."""
+        with self._lock:
+            self._requests += 1
+            future = self._async_calls.get(key)
+            if future is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                future = asyncio.get_running_loop().create_future()
+                self._async_calls[key] = future
+                self._executions += 1
+                leader = True
+
+        if not leader:
+            # Shielded so a cancelled follower does not cancel the shared call
+            return copy.deepcopy(await asyncio.shield(future))
+
+        try:
+            result = await fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved so an unobserved failure is not logged by asyncio
+            future.exception()
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call, execution and coalescing counters."""
+        with self._lock:
+            return {
+                'requests': self._requests,
+                'executions': self._executions,
+                'coalesced': self._coalesced,
+                'coalesced_ratio': self._coalesced / self._requests if self._requests else 0.0,
+                'max_followers': self._max_followers,
+                'in_flight': len(self._calls) + len(self._async_calls),
+                'errors': self._errors,
+            }
+
+
+def singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    """Return counters for every singleflight group, keyed by name."""
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
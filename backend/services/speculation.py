@@ -0,0 +1,235 @@
+"""Speculative pre-generation of the next turn's branch continuations.
+
+Every turn offers exactly three choices, so once a turn is shown the
+continuations of all of them can be generated in the background. Results are
+kept in a per-session branch cache keyed by the turn they were generated
+for; `/choice` takes the selected branch from the cache and skips the
+upstream call entirely on a hit.
+
+Speculation multiplies upstream usage, so it is off by default
+(`SPECULATIVE_ENABLED`) and bounded two ways: `SPECULATIVE_WORKERS` caps how
+many generations run at once and `SPECULATIVE_MAX_CALLS_PER_MINUTE` caps
+the upstream calls it may start per minute. Branches that cannot be
+afforded are simply not speculated and fall back to on-demand generation.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional
+
+from config import (
+    PERPLEXITY_READ_TIMEOUT,
+    SPECULATIVE_ENABLED,
+    SPECULATIVE_IMAGES,
+    SPECULATIVE_MAX_CALLS_PER_MINUTE,
+    SPECULATIVE_MAX_SESSIONS,
+    SPECULATIVE_TTL_SECONDS,
+    SPECULATIVE_WORKERS,
+)
+from services.ai_service import ai_service
+from services.image_service import image_service
+from services.opening_tree import opening_tree
+from services.rate_limiter import PRIORITY_SPECULATIVE
+
+
+class _SessionBranches:
+    """Speculated continuations for one displayed turn of a session."""
+
+    def __init__(self, history_fingerprint: str, current_story: str):
+        self.history_fingerprint = history_fingerprint
+        self.current_story = current_story
+        self.created_at = time.monotonic()
+        self.futures: Dict[str, Future] = {}
+
+
+class BranchSpeculator:
+    """Generates every branch of a turn ahead of the player's choice."""
+
+    def __init__(
+        self,
+        enabled: bool = SPECULATIVE_ENABLED,
+        include_images: bool = SPECULATIVE_IMAGES,
+        max_workers: int = SPECULATIVE_WORKERS,
+        max_calls_per_minute: int = SPECULATIVE_MAX_CALLS_PER_MINUTE,
+        max_sessions: int = SPECULATIVE_MAX_SESSIONS,
+        ttl_seconds: float = SPECULATIVE_TTL_SECONDS,
+    ):
+        self.enabled = enabled
+        self.include_images = include_images
+        self.max_workers = max(1, max_workers)
+        self.max_calls_per_minute = max_calls_per_minute
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._sessions: "OrderedDict[str, _SessionBranches]" = OrderedDict()
+        self._call_times: deque = deque()
+        self._lock = threading.Lock()
+        self._speculated = 0
+        self._hits = 0
+        self._inflight_hits = 0
+        self._misses = 0
+        self._skipped = 0
+        self._wasted = 0
+        self._errors = 0
+        self._upstream_calls = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created lazily so a disabled speculator never starts threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='speculate'
+            )
+        return self._executor
+
+    def _reserve_calls(self, calls: int) -> bool:
+        """Charge `calls` upstream calls against the per-minute budget (caller holds the lock)."""
+        if self.max_calls_per_minute <= 0:
+            return True
+        now = time.monotonic()
+        while self._call_times and now - self._call_times[0] > 60:
+            self._call_times.popleft()
+        if len(self._call_times) + calls > self.max_calls_per_minute:
+            return False
+        self._call_times.extend([now] * calls)
+        self._upstream_calls += calls
+        return True
+
+    def _discard(self, branches: _SessionBranches, keep: Optional[str] = None) -> None:
+        """Drop a session's branches, counting the unused ones as wasted (caller holds the lock)."""
+        for choice, future in branches.futures.items():
+            if choice == keep:
+                continue
+            if not future.cancel():
+                self._wasted += 1
+
+    def _generate(self, context: str, choice: str, character_info: Dict[str, Any]) -> Dict[str, Any]:
+        story, choices, image_prompt = ai_service.generate_story_continuation(
+            context, choice, character_info, priority=PRIORITY_SPECULATIVE
+        )
+        if story == ai_service._get_fallback_response()['story'] and not ai_service._uses_mock():
+            # Dropped by the rate limiter or failed upstream: let the real turn generate it
+            raise RuntimeError('no continuation was generated')
+        image_url = None
+        if self.include_images and image_prompt:
+            image_url = image_service.generate_image_url(image_prompt)
+        return {
+            'story': story,
+            'choices': choices,
+            'image_prompt': image_prompt,
+            'image_url': image_url,
+        }
+
+    def speculate(self, game_state) -> int:
+        """Start generating every branch of the turn `game_state` is showing.
+
+        Returns the number of branches scheduled; branches over the budget
+        or already in the opening tree are skipped.
+        """
+        if not self.enabled or self.max_sessions <= 0 or not game_state.current_choices:
+            return 0
+        # The opening tree already has these branches precomputed
+        if opening_tree.covers_next_turn(game_state):
+            return 0
+
+        context = game_state.get_recent_context()
+        character_info = copy.deepcopy(game_state.character_info)
+        branches = _SessionBranches(game_state.get_history_fingerprint(), game_state.current_story)
+        calls_per_branch = 2 if self.include_images else 1
+
+        with self._lock:
+            previous = self._sessions.pop(game_state.session_id, None)
+            if previous:
+                self._discard(previous)
+
+            for choice in dict.fromkeys(game_state.current_choices):
+                if not self._reserve_calls(calls_per_branch):
+                    self._skipped += 1
+                    continue
+                branches.futures[choice] = self._get_executor().submit(
+                    self._generate, context, choice, character_info
+                )
+                self._speculated += 1
+
+            if not branches.futures:
+                return 0
+            self._sessions[game_state.session_id] = branches
+            while len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                self._discard(evicted)
+            return len(branches.futures)
+
+    def take(self, game_state, choice: str, timeout: float = PERPLEXITY_READ_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """Return the speculated continuation for `choice`, or None on a miss.
+
+        A branch that is still generating is awaited, since it started
+        before an on-demand request could. The session's other branches are
+        dropped either way: the turn is moving on.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            branches = self._sessions.pop(game_state.session_id, None)
+            future = None
+            if branches:
+                fresh = self.ttl_seconds <= 0 or time.monotonic() - branches.created_at <= self.ttl_seconds
+                same_turn = (
+                    branches.history_fingerprint == game_state.get_history_fingerprint()
+                    and branches.current_story == game_state.current_story
+                )
+                if fresh and same_turn:
+                    future = branches.futures.get(choice)
+                self._discard(branches, keep=choice if future else None)
+            if future is None:
+                self._misses += 1
+                return None
+            inflight = not future.done()
+
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._wasted += 1
+                self._misses += 1
+            return None
+        except Exception as e:
+            print(f"Speculative generation failed: {e}")
+            with self._lock:
+                self._errors += 1
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+            if inflight:
+                self._inflight_hits += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit-rate, budget and waste counters."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'include_images': self.include_images,
+                'workers': self.max_workers,
+                'max_calls_per_minute': self.max_calls_per_minute,
+                'calls_last_minute': len(self._call_times),
+                'tracked_sessions': len(self._sessions),
+                'speculated': self._speculated,
+                'hits': self._hits,
+                'inflight_hits': self._inflight_hits,
+                'misses': self._misses,
+                'hit_ratio': self._hits / lookups if lookups else 0.0,
+                'skipped_over_budget': self._skipped,
+                'wasted': self._wasted,
+                'errors': self._errors,
+                'upstream_calls': self._upstream_calls,
+            }
+
+
+# Singleton instance
+branch_speculator = BranchSpeculator()
@@ -0,0 +1,158 @@
+"""Lightweight request-scoped tracing with slow-request logging.
+
+Every request gets a trace id (taken from an incoming `X-Request-ID` header
+when present) and a root span. Code on the request's path opens nested
+spans with `span(name, **attrs)`: database connections, upstream HTTP
+calls, JSON parsing, lock and rate limiter waits, and the timed stages of
+a turn. The current span lives in a context variable, so spans follow the
+request through coroutines and through thread pools that copy the
+context; with no active trace `span` is a no-op.
+
+When a request takes longer than `TRACE_SLOW_REQUEST_MS`, its whole span
+tree is written as one JSON line to the `story.slow_requests` logger
+(stderr, or `TRACE_LOG_PATH` when set).
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import TRACE_ENABLED, TRACE_LOG_PATH, TRACE_MAX_SPANS, TRACE_SLOW_REQUEST_MS
+
+_current: ContextVar[Optional['Span']] = ContextVar('trace_span', default=None)
+
+slow_request_log = logging.getLogger('story.slow_requests')
+slow_request_log.setLevel(logging.INFO)
+slow_request_log.propagate = False
+slow_request_log.addHandler(logging.FileHandler(TRACE_LOG_PATH) if TRACE_LOG_PATH else logging.StreamHandler())
+
+_stats_lock = threading.Lock()
+_stats = {'traces': 0, 'slow': 0, 'dropped_spans': 0}
+
+
+class Trace:
+    """One request's span tree."""
+
+    def __init__(self, trace_id: str, max_spans: int):
+        self.trace_id = trace_id
+        self.max_spans = max_spans
+        self.spans = 0
+        self.dropped_spans = 0
+        self.root: Optional[Span] = None
+
+
+class Span:
+    """A timed operation with attributes and child spans."""
+
+    __slots__ = ('name', 'attrs', 'start', 'end', 'children', 'trace')
+
+    def __init__(self, name: str, attrs: Dict[str, Any], trace: Trace):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List['Span'] = []
+        self.trace = trace
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(self.duration_ms, 3),
+            'attrs': self.attrs,
+            'children': [child.to_dict(origin) for child in list(self.children)],
+        }
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """Record a child of the current span for the duration of a `with` block.
+
+    Yields the span (to attach attributes known only later) or None when
+    no trace is active.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    trace = parent.trace
+    if trace.spans >= trace.max_spans:
+        trace.dropped_spans += 1
+        yield None
+        return
+    trace.spans += 1
+
+    current = Span(name, attrs, trace)
+    parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs['error'] = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current.reset(token)
+
+
+def begin_trace(name: str, trace_id: Optional[str] = None, **attrs: Any) -> Optional[Span]:
+    """Start a trace in the current context and return its root span."""
+    if not TRACE_ENABLED:
+        return None
+    trace = Trace(trace_id or uuid.uuid4().hex, TRACE_MAX_SPANS)
+    root = Span(name, attrs, trace)
+    trace.root = root
+    _current.set(root)
+    return root
+
+
+def finish_trace(root: Optional[Span], **attrs: Any) -> None:
+    """End a trace and log its span tree if it was slow."""
+    if root is None or root.end is not None:
+        return
+    root.end = time.perf_counter()
+    root.attrs.update(attrs)
+    if _current.get() is root:
+        _current.set(None)
+
+    duration_ms = root.duration_ms
+    slow = duration_ms >= TRACE_SLOW_REQUEST_MS
+    with _stats_lock:
+        _stats['traces'] += 1
+        _stats['dropped_spans'] += root.trace.dropped_spans
+        if slow:
+            _stats['slow'] += 1
+    if slow:
+        slow_request_log.info(json.dumps({
+            'event': 'slow_request',
+            'trace_id': root.trace.trace_id,
+            'duration_ms': round(duration_ms, 3),
+            'threshold_ms': TRACE_SLOW_REQUEST_MS,
+            'dropped_spans': root.trace.dropped_spans,
+            'span': root.to_dict(root.start),
+        }, default=str))
+
+
+def current_trace_id() -> Optional[str]:
+    """Return the active trace id, if any."""
+    current = _current.get()
+    return current.trace.trace_id if current else None
+
+
+def tracing_stats() -> Dict[str, Any]:
+    """Return trace counters for the health endpoint."""
+    with _stats_lock:
+        return dict(_stats, enabled=TRACE_ENABLED, slow_request_ms=TRACE_SLOW_REQUEST_MS)
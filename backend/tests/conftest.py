@@ -0,0 +1,8 @@
+"""Point the backend at a scratch database before any app module is imported."""
+
+import os
+import tempfile
+
+os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='story-test-'), 'test.sqlite')
+os.environ.setdefault('DEEPGRAM_API_KEY', 'test')
+os.environ['PERPLEXITY_API_KEY'] = ''
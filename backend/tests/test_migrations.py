@@ -0,0 +1,75 @@
+"""Upgrading a database created before the versioned migrations."""
+
+import hashlib
+import json
+import os
+import sqlite3
+
+import services.personality_service as personality_module
+from database.db_manager import DatabaseManager
+from database.migrations import run_migrations
+from models.game_state import GameState
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'init.sql')
+
+# game_sessions as created before migration 1
+LEGACY_GAME_SESSIONS = """
+    CREATE TABLE game_sessions (
+        id TEXT PRIMARY KEY,
+        story_context TEXT NOT NULL DEFAULT '',
+        current_story TEXT NOT NULL DEFAULT '',
+        choices_history TEXT NOT NULL DEFAULT '[]',
+        character_info TEXT NOT NULL DEFAULT '{}',
+        current_choices TEXT NOT NULL DEFAULT '[]',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+HISTORY = [
+    {'choice': 'Follow the light', 'story_segment': 'The light leads to a crystal spire.',
+     'timestamp': '2025-01-01T10:00:00'},
+    {'choice': 'Touch the crystal', 'story_segment': 'The crystal hums under your hand.',
+     'timestamp': '2025-01-01T10:01:00'},
+]
+
+
+def _legacy_fingerprint(history):
+    """The flat fingerprint personality profiles were stored with before the hash chain."""
+    serialized = json.dumps(history, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def test_fresh_personality_profile_stays_fresh_after_migration(tmp_path, monkeypatch):
+    path = str(tmp_path / 'legacy.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_GAME_SESSIONS)
+    with open(SCHEMA) as f:
+        conn.executescript(f.read())
+    conn.execute(
+        "INSERT INTO game_sessions (id, story_context, current_story, choices_history, current_choices) "
+        "VALUES (?, ?, ?, ?, ?)",
+        ('legacy', 'ctx', HISTORY[-1]['story_segment'], json.dumps(HISTORY), json.dumps(['a', 'b', 'c'])),
+    )
+    conn.execute(
+        "INSERT INTO personality_profiles "
+        "(session_id, history_fingerprint, choices_analyzed, archetype, summary) VALUES (?, ?, ?, ?, ?)",
+        ('legacy', _legacy_fingerprint(HISTORY), len(HISTORY), 'The Seeker', 'Curious about everything.'),
+    )
+    conn.commit()
+
+    run_migrations(conn)
+    conn.close()
+
+    db = DatabaseManager(path)
+    try:
+        session = db.get_game_session('legacy')
+        assert session['choices_history'] == HISTORY
+        game_state = GameState.from_dict(dict(session, session_id=session['id']))
+
+        monkeypatch.setattr(personality_module, 'db_manager', db)
+        profile = personality_module.personality_service.get_cached_profile(game_state)
+        assert profile is not None
+        assert profile['is_stale'] is False
+    finally:
+        db.pool.close()
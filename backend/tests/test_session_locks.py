@@ -0,0 +1,63 @@
+"""Turns taken under a shared (sqlite) session lock across worker processes.
+
+Each worker process has its own session cache, so two `SessionCache`
+instances over one database stand in for two workers here.
+"""
+
+import pytest
+
+import models.game_state as game_state_module
+from database.db_manager import init_database
+from models.game_state import GameState
+from models.session_cache import SessionCache
+from routes.game import _load_choice_state
+from services.session_locks import session_locks
+
+
+@pytest.fixture(scope='module', autouse=True)
+def database():
+    init_database()
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    """Return a function that runs a callable as worker 'a' or 'b'."""
+    caches = {'a': SessionCache(), 'b': SessionCache()}
+
+    def run(worker, fn, *args):
+        monkeypatch.setattr(game_state_module, 'session_cache', caches[worker])
+        return fn(*args)
+
+    return run
+
+
+def _take_turn(session_id, choice_index, story):
+    with session_locks.hold(session_id):
+        game_state, selected_choice, error = _load_choice_state(session_id, choice_index)
+        assert error is None
+        game_state.add_choice_to_history(selected_choice, story)
+        game_state.current_choices = [f'{story} option {i}' for i in range(1, 4)]
+        game_state.update_story_context()
+        assert game_state.save_to_database()
+
+
+def test_sqlite_lock_reads_turns_committed_by_another_worker(workers, monkeypatch):
+    monkeypatch.setattr(session_locks, 'backend', 'sqlite')
+    game_state = GameState()
+    assert workers('a', game_state.save_to_database)
+    session_id = game_state.session_id
+
+    # Both workers have the session cached before either takes a turn
+    workers('a', GameState.load_from_database, session_id)
+    workers('b', GameState.load_from_database, session_id)
+
+    workers('b', _take_turn, session_id, 0, 'Turn from worker b')
+    workers('a', _take_turn, session_id, 1, 'Turn from worker a')
+
+    stored = GameState.load_from_database(session_id, use_cache=False)
+    assert [entry['story_segment'] for entry in stored.choices_history] == [
+        'Turn from worker b',
+        'Turn from worker a',
+    ]
+    assert stored.choices_history[1]['choice'] == 'Turn from worker b option 2'
+
@@ -1,5 +1,10 @@
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL ?? '/api'
 
+// Resolve a server-relative URL (e.g. a cached image path) against the API origin
+export function resolveApiUrl(url: string): string {
+  return new URL(url, new URL(API_BASE_URL, window.location.origin)).toString()
+}
+
 export async function apiGet<T>(path: string, init?: RequestInit): Promise<T> {
   const res = await fetch(`${API_BASE_URL}${path}`, {
     ...init,
@@ -7,6 +7,7 @@ import type {
   HistoryResponse,
   GetPersonalityResponse,
   AnalyzePersonalityResponse,
+  ImageJobResponse,
 } from '@/types'
 
 export interface GameSession {
@@ -27,8 +28,15 @@ export const GameAPI = {
   start(character_name: string, initial_story?: string) {
     return apiPost<StartGameResponse>('/game/start', { character_name, initial_story })
   },
-  makeChoice(session_id: string, choice_index: number) {
-    return apiPost<MakeChoiceResponse>('/game/choice', { session_id, choice_index })
+  makeChoice(session_id: string, choice_index: number, idempotency_key?: string) {
+    return apiPost<MakeChoiceResponse>(
+      '/game/choice',
+      { session_id, choice_index },
+      idempotency_key ? { headers: { 'Idempotency-Key': idempotency_key } } : undefined,
+    )
+  },
+  imageJob(job_id: string) {
+    return apiGet<ImageJobResponse>(`/game/image/${job_id}`)
   },
   getState(session_id: string) {
     return apiGet<GameStateResponse>(`/game/state/${session_id}`)
@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from 'react'
+import { useEffect, useMemo, useRef, useState } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
 import { GameAPI } from '@/api/game'
 import type { CharacterInfo, ChoiceHistoryEntry } from '@/types'
@@ -37,6 +37,28 @@ export function App() {
 
   const canInteract = useMemo(() => !!sessionId && !isLoading, [sessionId, isLoading])
   const { toasts, push } = useToast()
+  const imageJobRef = useRef<string | null>(null)
+  // One key per displayed turn, so a retried choice replays instead of advancing twice
+  const turnKey = useMemo(() => crypto.randomUUID(), [choices])
+
+  const pollSceneImage = async (jobId: string) => {
+    imageJobRef.current = jobId
+    const deadline = Date.now() + 90_000
+    while (imageJobRef.current === jobId && Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, 1000))
+      try {
+        const job = await GameAPI.imageJob(jobId)
+        if (imageJobRef.current !== jobId) return
+        if (!job.success || job.status === 'failed') return
+        if (job.status === 'completed') {
+          setSceneImage(job.image_url || null)
+          return
+        }
+      } catch {
+        return
+      }
+    }
+  }
 
   useEffect(() => {
     const stored = localStorage.getItem(sessionStorageKey)
@@ -48,7 +70,7 @@ export function App() {
           setStory(data.current_story)
           setChoices(data.choices)
           setCharacter(data.character_info)
-          setSceneImage(data.image || null)
+          setSceneImage(data.image_url || null)
           setPersonalityProfile(null)
           setPersonalityWarning(null)
           setPersonalityOpen(false)
@@ -87,7 +109,8 @@ export function App() {
         setStory(data.current_story)
         setChoices(data.choices)
         setCharacter(data.character_info)
-        setSceneImage(data.image || null)
+        setSceneImage(data.image_url || null)
+        imageJobRef.current = null
         setPersonalityProfile(null)
         setPersonalityWarning(null)
         setPersonalityOpen(false)
@@ -108,12 +131,14 @@ export function App() {
     if (!sessionId || isLoading) return
     setIsLoading(true)
     try {
-      const data = await GameAPI.makeChoice(sessionId, choiceIndex)
+      const data = await GameAPI.makeChoice(sessionId, choiceIndex, `${turnKey}:${choiceIndex}`)
       if (data.success) {
         setStory(data.story)
         setChoices(data.choices)
         setCharacter(data.character_info)
-        setSceneImage(data.image || null)
+        setSceneImage(data.image_url || null)
+        imageJobRef.current = null
+        if (data.image_job_id) void pollSceneImage(data.image_job_id)
         setPersonalityProfile(null)
         setPersonalityWarning(null)
         setPersonalityOpen(false)
@@ -157,7 +182,8 @@ export function App() {
         setStory(data.current_story)
         setChoices(data.choices)
         setCharacter(data.character_info)
-        setSceneImage(data.image || null)
+        setSceneImage(data.image_url || null)
+        imageJobRef.current = null
         setPersonalityProfile(null)
         setPersonalityWarning(null)
         setPersonalityOpen(false)
@@ -179,6 +205,7 @@ export function App() {
   }
 
   const onNew = () => {
+    imageJobRef.current = null
     setSessionId(null)
     setStory('')
     setChoices([])
@@ -200,7 +227,8 @@ export function App() {
         setStory(data.current_story)
         setChoices(data.choices)
         setCharacter(data.character_info)
-        setSceneImage(data.image || null)
+        setSceneImage(data.image_url || null)
+        imageJobRef.current = null
         setPersonalityProfile(null)
         setPersonalityWarning(null)
         setPersonalityOpen(false)
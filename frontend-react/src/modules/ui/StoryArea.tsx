@@ -1,5 +1,6 @@
 import { motion, AnimatePresence } from 'framer-motion'
 import { Loader2 } from 'lucide-react'
+import { resolveApiUrl } from '@/api/client'
 
 interface StoryAreaProps {
   story: string
@@ -40,7 +41,7 @@ export function StoryArea({ story, isLoading, image }: StoryAreaProps) {
                 className="relative rounded-lg overflow-hidden shadow-2xl border border-gray-700/50"
               >
                 <img
-                  src={`data:image/png;base64,${image}`}
+                  src={resolveApiUrl(image)}
                   alt="Scene illustration"
                   className="w-full h-64 md:h-80 object-cover"
                 />
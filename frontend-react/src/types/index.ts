@@ -17,7 +17,7 @@ export type GameStateResponse = {
   choices: string[]
   character_info: CharacterInfo
   choices_history?: ChoiceHistoryEntry[]
-  image?: string | null
+  image_url?: string | null
 }
 
 export type StartGameResponse = GameStateResponse
@@ -29,7 +29,16 @@ export type MakeChoiceResponse = {
   character_info: CharacterInfo
   session_id: string
   error?: string
-  image?: string | null
+  image_url?: string | null
+  image_job_id?: string | null
+}
+
+export type ImageJobResponse = {
+  success: boolean
+  job_id?: string
+  status?: 'queued' | 'running' | 'completed' | 'failed'
+  image_url?: string | null
+  error?: string | null
 }
 
 export type SavedGameSummary = {